@@ -1,110 +1,140 @@
+import re
+import time
 import logging
 
 from logging.handlers import RotatingFileHandler
-from config import CONFIG, WATING_MESSAGE, INITIAL_MESSAGE, SYSTEM_MESSAGE
-from slack_bolt import App
+from config import CONFIG, WATING_MESSAGE, INITIAL_MESSAGE, INTERRUPTED_MESSAGE
+from slack_bolt import App, BoltResponse
 from slack_bolt.adapter.socket_mode import SocketModeHandler
-from open_ai import format_conversation, check_token_price_this_month, send, num_tokens_from_messages, create_image, \
-    translate_to_eng
-from extract_logs import user_stats, rank_stats
-from utils import user_data_to_ascii_table
-from context import LoggingManager
-from cache import RedisManager
+from slack_sdk import WebClient
+from open_ai import format_conversation, check_token_price, stream_with_retry, INTERRUPTED, \
+    num_tokens_from_message, context_token_counts, CompletionTokenCounter, summarize_conversation, cached_create_image, \
+    translate_to_eng, start_prewarm
+from utils import user_data_to_ascii_table, date_to_str, now, date_range, usage_range, retry_after
+from context import LoggingManager, add_usage_hook
+from stream import StreamBuffer
+from window import ContextWindow
+from usage import UsageRollup
+from cache import RedisManager, Codec, LocalCache
+from metrics import instrument, register_cache_stats, start_metrics_server, add_health_check, HandlerErrorCounter
+from jobs import JobQueue
+from views import view_digest, home_view, usage_menu_view, draw_image_view, image_result_blocks, waiting_view, total_usage_view, \
+    rank_usage_view, selected_usage_range
 
 ## Slack Bolt
-bolt_app = App(token=CONFIG['BOT_TOKEN'])
+bolt_app = App(client=WebClient(token=CONFIG['BOT_TOKEN'], base_url=CONFIG['SLACK_API_URL']))
+# 이후에 등록하는 모든 핸들러와 Slack API 호출의 지연 시간을 자동으로 측정합니다
+instrument(bolt_app)
 
 logger = logging.getLogger(__name__)
-file_handler = RotatingFileHandler('logs/error.log',
+file_handler = RotatingFileHandler(f'logs/error{CONFIG["LOG_SUFFIX"]}.log',
                                    maxBytes=1024 * 1024 * 100,
                                    backupCount=20,
                                    encoding='utf-8')
 file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
 file_handler.setLevel(logging.ERROR)
 logger.addHandler(file_handler)
+logger.addHandler(HandlerErrorCounter())
 
-redis_manager = RedisManager(host=CONFIG['REDIS']['HOST'], port=CONFIG['REDIS']['PORT'], db=CONFIG['REDIS']['DB'])
+local_cache = None
+if CONFIG['REDIS']['LOCAL_CACHE_SIZE']:
+    local_cache = LocalCache(CONFIG['REDIS']['LOCAL_CACHE_SIZE'], CONFIG['REDIS']['LOCAL_CACHE_TTL'])
+    register_cache_stats("redis_local_cache_requests_total", "In-process cache lookups in front of Redis",
+                         local_cache)
+redis_manager = RedisManager(host=CONFIG['REDIS']['HOST'], port=CONFIG['REDIS']['PORT'], db=CONFIG['REDIS']['DB'],
+                             max_connections=CONFIG['REDIS']['MAX_CONNECTIONS'],
+                             lock_ttl=CONFIG['REDIS']['LOCK_TTL'],
+                             codec=Codec(CONFIG['REDIS']['CODEC'], CONFIG['REDIS']['COMPRESSION'],
+                                         CONFIG['REDIS']['COMPRESS_THRESHOLD']),
+                             local_cache=local_cache, worker_id=CONFIG['WORKERS']['ID'])
+usage_rollup = UsageRollup(host=CONFIG['REDIS']['HOST'], port=CONFIG['REDIS']['PORT'],
+                           db=CONFIG['REDIS']['USAGE_DB'])
+add_usage_hook(usage_rollup.record)
 
 
-@bolt_app.event("app_home_opened")
-def update_home_tab(client, event, ack):
-    try:
-        user_id = event["user"]
-        # App Home 화면 구성
-
-        blocks = [
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"안녕하세요 <@{user_id}>님! 사용 가능한 명령어 목록입니다 :smile:"
-                },
-                "accessory": {
-                    "type": "image",
-                    "image_url": "https://pbs.twimg.com/profile_images/625633822235693056/lNGUneLX_400x400.jpg",
-                    "alt_text": "cute cat"
-                }
-            },
-            {
-                "type": "divider"
-            },
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": """ `/대화시작` :  대화를 시작합니다. (_채널에서 사용가능_) \n\n `/대화끝` :  대화를 종료합니다. (_채널에서 사용가능_) \n\n `/대화초기화` :  대화를 처음부터 다시 시작합니다. (_채널에서 사용가능_) """
-                }
-            },
-            {
-                "type": "divider"
-            }
-        ]
-        user_date_list, user_total_token, user_total_process_time = user_stats(user_id)
-        user_table = user_data_to_ascii_table(user_date_list)
-        blocks.append(
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"• 이번 달 : 예상 `{user_total_token * 0.0000027}$` (`{user_total_token}토큰`), `{round(user_total_process_time, 2)}초`"
-                }
-            }
-        )
+def deduplicate_events(body, next):
+    # 워커가 여러 개면 Slack 재전송이나 다른 연결로 같은 이벤트가 다시 올 수 있으므로, 먼저 가져간 워커만 처리합니다
+    if not redis_manager.claim_event(body, CONFIG['WORKERS']['DEDUPE_TTL']):
+        return BoltResponse(status=200, body="")
+    next()
 
-        blocks.append(
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"```{user_table}```"
-                }
-            }
-        )
 
+bolt_app.use(deduplicate_events)
+
+
+def invalidate_home_view(usage):
+    # 사용량이 바뀐 유저의 App Home view 캐시를 지웁니다
+    redis_manager.delete(prefix="home", key=f"{usage.user_id}:{date_to_str(now())}:view")
+
+
+add_usage_hook(invalidate_home_view)
+
+
+def publish_home(client, user_id):
+    # 렌더링된 view 는 사용량이나 기간 선택이 바뀔 때까지 캐시합니다 (날짜가 바뀌면 새로 만듭니다)
+    view_key = f"{user_id}:{date_to_str(now())}:view"
+    keys = [view_key, f"{user_id}:published", f"{user_id}:range"]
+    view, published, range_name = redis_manager.mget(prefix="home", keys=keys)
+    range_name = range_name or "this_month"
+    if view is None:
+        # 사용량 집계 모듈(NumPy)은 처음 렌더링할 때 불러옵니다
+        from usage_engine import range_user_stats
+
+        user_date_list, user_total_token, user_total_process_time = range_user_stats(user_id, range_name,
+                                                                                     usage_rollup)
+        user_table = user_data_to_ascii_table(user_date_list)
+        view = home_view(user_id, user_table, user_total_token, user_total_process_time, range_name)
+        redis_manager.set(prefix="home", key=view_key, value=view, expire=CONFIG["HOME_CACHE_TTL"])
+
+    # 마지막으로 전송한 view 와 같으면 views_publish 를 생략합니다
+    digest = view_digest(view)
+    if digest != published:
         # App Home 화면 전송
         client.views_publish(
             user_id=user_id,
-            view={
-                "type": "home",
-                "blocks": blocks
-            }
+            view=view
         )
+        redis_manager.set(prefix="home", key=f"{user_id}:published", value=digest, expire=86400 * 31)
+
+
+@bolt_app.event("app_home_opened")
+def update_home_tab(client, event, ack):
+    try:
+        publish_home(client, event["user"])
         ack()
 
     except Exception as e:
         logger.error(f"Error handling message: {e}")
 
 
+@bolt_app.action("home_usage_range")
+def change_home_usage_range(ack, body, client):
+    try:
+        ack()
+        user_id = body["user"]["id"]
+        range_name = body["actions"][0]["selected_option"]["value"]
+        redis_manager.set(prefix="home", key=f"{user_id}:range", value=range_name, expire=86400 * 31)
+        redis_manager.delete(prefix="home", key=f"{user_id}:{date_to_str(now())}:view")
+        publish_home(client, user_id)
+    except Exception as e:
+        logger.error(f"Error handling message: {e}")
+
+
 @bolt_app.command("/대화시작")
 def start_conversation(body, ack, say):
     try:
         if body["channel_id"].startswith("D"):
             ack(":no_entry_sign: 해당 명령어는 채널에서만 사용 가능합니다.")
         else:
-            say("안녕하세요! 지피티선생님입니다. 무엇이든 물어보세요. :smile:")
-            redis_manager.set(prefix="channel", key=body['channel_id'],
-                              value={"messages": [INITIAL_MESSAGE]})
-            redis_manager.set(prefix="channel", key=f"{body['channel_id']}_waiting", value=False)
+            lock = redis_manager.lock(prefix="channel", key=body['channel_id'])
+            if not lock.acquire():
+                # 응답 중인 대화는 스트리밍이 끝난 뒤에 다시 시작할 수 있습니다
+                say(WATING_MESSAGE)
+            else:
+                say("안녕하세요! 지피티선생님입니다. 무엇이든 물어보세요. :smile:")
+                redis_manager.save_conversation(prefix="channel", key=body['channel_id'],
+                                                context={"messages": [INITIAL_MESSAGE]})
+                lock.release()
             ack()
     except Exception as e:
         logger.error(f"Error handling message: {e}")
@@ -116,9 +146,14 @@ def end_conversation(body, ack, say):
         if body["channel_id"].startswith("D"):
             ack(":no_entry_sign: 해당 명령어는 채널에서만 사용 가능합니다.")
         else:
-            say("감사합니다. 대화를 종료합니다! :wave:")
-            redis_manager.delete(prefix="channel", key=body['channel_id'])
-            redis_manager.delete(prefix="channel", key=f"{body['channel_id']}_waiting")
+            lock = redis_manager.lock(prefix="channel", key=body['channel_id'])
+            if not lock.acquire():
+                # 응답 중인 턴의 end_turn 이 지운 대화를 다시 저장하지 않도록 스트리밍이 끝난 뒤에 종료합니다
+                say(WATING_MESSAGE)
+            else:
+                say("감사합니다. 대화를 종료합니다! :wave:")
+                redis_manager.delete(prefix="channel", key=body['channel_id'])
+                lock.release()
             ack()
     except Exception as e:
         logger.error(f"Error handling message: {e}")
@@ -130,10 +165,15 @@ def reset_conversation(body, ack, say):
         if body["channel_id"].startswith("D"):
             ack(":no_entry_sign: 해당 명령어는 채널에서만 사용 가능합니다.")
         else:
-            say("대화를 처음부터 다시 시작합니다! 무엇이든 물어보세요. :smile:")
-            redis_manager.set(prefix="channel", key=body['channel_id'],
-                              value={"messages": [INITIAL_MESSAGE]})
-            redis_manager.set(prefix="channel", key=f"{body['channel_id']}_waiting", value=False)
+            lock = redis_manager.lock(prefix="channel", key=body['channel_id'])
+            if not lock.acquire():
+                # 응답 중인 대화는 스트리밍이 끝난 뒤에 다시 시작할 수 있습니다
+                say(WATING_MESSAGE)
+            else:
+                say("대화를 처음부터 다시 시작합니다! 무엇이든 물어보세요. :smile:")
+                redis_manager.save_conversation(prefix="channel", key=body['channel_id'],
+                                                context={"messages": [INITIAL_MESSAGE]})
+                lock.release()
         ack()
     except Exception as e:
         logger.error(f"Error handling message: {e}")
@@ -145,64 +185,7 @@ def show_usage(body, ack, client):
         ack()
         client.views_open(
             trigger_id=body["trigger_id"],
-            # A simple view payload for a modal
-            view={
-                "type": "modal",
-                "close": {
-                    "type": "plain_text",
-                    "text": "닫기",
-                },
-                "title": {
-                    "type": "plain_text",
-                    "text": "사용량 확인",
-                },
-                "blocks": [
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": f"*안녕하세요 <@{body['user_id']}>님!* 원하시는 메뉴를 골라주세요"
-                        }
-                    },
-                    {
-                        "type": "divider"
-                    },
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": ":dollar: *전체 사용량*\n이번 달 총 사용량을 확인합니다"
-                        },
-                        "accessory": {
-                            "type": "button",
-                            "text": {
-                                "type": "plain_text",
-                                "text": "선택",
-                                "emoji": True
-                            },
-                            "style": "primary",
-                            "action_id": "total_usage"
-                        }
-                    },
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": ":bar_chart: *사용량 순위*\n전체 유저의 사용량 순위를 확인합니다"
-                        },
-                        "accessory": {
-                            "type": "button",
-                            "text": {
-                                "type": "plain_text",
-                                "text": "선택",
-                                "emoji": True
-                            },
-                            "style": "primary",
-                            "action_id": "rank_usage"
-                        }
-                    }
-                ]
-            }
+            view=usage_menu_view(body['user_id'])
         )
     except Exception as e:
         logger.error(f"Error handling message: {e}")
@@ -214,126 +197,71 @@ def draw_image(body, ack, client):
         ack()
         client.views_open(
             trigger_id=body["trigger_id"],
-            # A simple view payload for a modal
-            view={
-                "type": "modal",
-                "callback_id": "draw_image",
-                "title": {
-                    "type": "plain_text",
-                    "text": "달리 선생님의 미술 교실"
-                },
-                "submit": {
-                    "type": "plain_text",
-                    "text": "그리기"
-                },
-                "close": {
-                    "type": "plain_text",
-                    "text": "닫기"
-                },
-                "blocks": [
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": f"*안녕하세요 <@{body['user_id']}>님!* 원하시는 그림이 있으신가요?"
-                        }
-                    },
-                    {
-                        "type": "divider"
-                    },
-                    {
-                        "type": "input",
-                        "block_id": "input_check",
-                        "label": {
-                            "type": "plain_text",
-                            "text": "원하시는 기능을 선택해주세요:sparkles:",
-                            "emoji": True
-                        },
-                        "element": {
-                            "type": "checkboxes",
-                            "options": [
-                                {
-                                    "text": {
-                                        "type": "mrkdwn",
-                                        "text": "*번역 기능*"
-                                    },
-                                    "description": {
-                                        "type": "mrkdwn",
-                                        "text": "한글로 작성하신 경우 체크해주세요\n(체크 시 토큰이 추가적으로 사용됩니다.)"
-                                    },
-                                }
-                            ],
-                            "action_id": "is_translate",
-                        },
-                        "optional": True
-                    },
-                    {
-                        "type": "divider"
-                    },
-                    {
-                        "type": "input",
-                        "block_id": "input_text",
-                        "label": {
-                            "type": "plain_text",
-                            "text": "원하시는 그림에 대해서 설명해주세요:pray:",
-                            "emoji": True
-                        },
-                        "element": {
-                            "type": "plain_text_input",
-                            "action_id": "image_description",
-                            "multiline": True
-                        }
-                    }
-                ]
-            }
+            view=draw_image_view(body['user_id'])
         )
     except Exception as e:
         logger.error(f"Error handling message: {e}")
 
 
-@bolt_app.view("draw_image")
-def draw_image(ack, body, client, view):
-    user_id = body["user"]["id"]
+def run_image_job(job):
+    # 작업 큐 워커에서 실행됩니다 (Bolt 리스너를 점유하지 않습니다)
+    user_id = job["user_id"]
+    client = bolt_app.client
     try:
-        with LoggingManager(user_id=user_id) as usage:
-            ack()
-            is_translate = view["state"]["values"]["input_check"]["is_translate"]["selected_options"]
-            image_description = view["state"]["values"]["input_text"]["image_description"]['value']
+        with LoggingManager(user_id=user_id, feature="image") as usage:
             client.chat_postMessage(channel=user_id, text="그림을 그리는 중입니다... 잠시만 기다려주세요")
-            if is_translate:
-                translate_description, translate_tokens = translate_to_eng(image_description)
+            if job["translate"]:
+                translate_description, translate_tokens = translate_to_eng(job["description"], kind="image")
                 usage.tokens += translate_tokens
             else:
-                translate_description = image_description
-            response = create_image(translate_description)
+                translate_description = job["description"]
+            response, is_cached = cached_create_image(translate_description)
             image_url = response['data'][0]['url']
             client.chat_postMessage(channel=user_id,
                                     text="그림이 완성되었습니다! :tada:",
-                                    blocks=[
-                                        {
-                                            "type": "section",
-                                            "text": {
-                                                "type": "mrkdwn",
-                                                "text": f"*{translate_description}*"
-                                            }
-                                        },
-                                        {
-                                            "type": "image",
-                                            "title": {
-                                                "type": "plain_text",
-                                                "text": "그림",
-                                                "emoji": True
-                                            },
-                                            "image_url": image_url,
-                                            "alt_text": "marg"
-                                        }
-                                    ])
-            usage.tokens += 9
+                                    blocks=image_result_blocks(translate_description, image_url))
+            if not is_cached:
+                usage.tokens += 9
+    except Exception as e:
+        client.chat_postMessage(channel=user_id, text=str(e))
+        logger.error(f"Error handling message: {e}")
+        raise
+
+
+image_jobs = JobQueue(host=CONFIG['REDIS']['HOST'], port=CONFIG['REDIS']['PORT'], db=CONFIG['REDIS']['JOB_DB'],
+                      name="job:image", handler=run_image_job, workers=CONFIG['IMAGE_JOBS']['WORKERS'],
+                      max_depth=CONFIG['IMAGE_JOBS']['MAX_DEPTH'], worker_id=CONFIG['WORKERS']['ID'])
+
+
+@bolt_app.view("draw_image")
+def draw_image(ack, body, client, view):
+    user_id = body["user"]["id"]
+    try:
+        ack()
+        is_translate = view["state"]["values"]["input_check"]["is_translate"]["selected_options"]
+        image_description = view["state"]["values"]["input_text"]["image_description"]['value']
+        job_id, position = image_jobs.submit({
+            "user_id": user_id,
+            "description": image_description,
+            "translate": bool(is_translate),
+        })
+        if job_id is None:
+            client.chat_postMessage(channel=user_id,
+                                    text=f"지금은 그림 요청이 너무 많습니다. (대기 {position}건) 잠시 후 다시 시도해주세요 :cry:")
+        else:
+            client.chat_postMessage(channel=user_id,
+                                    text=f"그림 요청이 접수되었습니다. 대기 순번 {position}번입니다. :art:")
     except Exception as e:
         client.chat_postMessage(channel=user_id, text=str(e))
         logger.error(f"Error handling message: {e}")
 
 
+@bolt_app.action("usage_range")
+def select_usage_range(ack):
+    # 선택한 기간은 모달 state 에 남으므로 ack 만 합니다
+    ack()
+
+
 @bolt_app.action("total_usage")
 def show_total_usage(ack, body, client):
     try:
@@ -341,204 +269,180 @@ def show_total_usage(ack, body, client):
         response = client.views_update(
             view_id=body["view"]["id"],
             hash=body["view"]["hash"],
-            view={
-                "type": "modal",
-                "title": {
-                    "type": "plain_text",
-                    "text": "잠시만 기다려주세요",
-                },
-                "blocks": [
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": WATING_MESSAGE
-                        }
-                    }
-                ]
-            }
+            view=waiting_view()
         )
 
-        total_stats = check_token_price_this_month()
-
-        blocks = [
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": "*이번달 총 사용량입니다.*"
-                }
-            },
-            {
-                "type": "context",
-                "elements": [
-                    {
-                        "type": "plain_text",
-                        "emoji": True,
-                        "text": f"요금 - {total_stats[1]}$ (토큰 :{total_stats[0]}개)"
-                    }
-                ]
-            },
-        ]
+        range_name = selected_usage_range(body["view"])
+        total_stats = check_token_price(date_range(*usage_range(range_name)))
+
         client.views_update(
             view_id=response["view"]["id"],
             hash=response["view"]["hash"],
-            view={
-                "type": "modal",
-                "close": {
-                    "type": "plain_text",
-                    "text": "닫기",
-                },
-                "title": {
-                    "type": "plain_text",
-                    "text": "전체 사용량 확인",
-                },
-                "blocks": blocks
-            }
+            view=total_usage_view(total_stats, range_name)
         )
     except Exception as e:
         logger.error(f"Error handling message: {e}")
 
 
-@bolt_app.action("rank_usage")
-def show_rank_usage(ack, body, client):
-    ack()
-    user_stat_list = rank_stats()
-    number_to_word = ["one", "two", "three", "four", "five", "six", "seven", "eight", "nine"]
-
-    blocks = [
-        {
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": "*이번달 사용량 순위입니다.*"
-            }
-        }
-    ]
-
-    for i, user_stat in enumerate(user_stat_list):
-        try:
-            word = number_to_word[i]
-        except IndexError:
-            word = "keycap_star"
-        blocks += [
-            {
-                "type": "divider"
-            },
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f":{word}: *<@{user_stat['user_id']}>님 사용량*\n"
-                },
-            },
-            {
-                "type": "context",
-                "elements": [
-                    {
-                        "type": "plain_text",
-                        "emoji": True,
-                        "text": f"요금 - {round(user_stat['total_token'] * 0.0000027, 4)}$ (토큰 : {user_stat['total_token']}개), 사용 시간 - {user_stat['total_process_time']}초"
-                    }
-                ]
-            }
-        ]
+def update_rank_usage(client, view, user_id, offset):
+    # 대기 화면으로 먼저 바꾼 뒤, 새 hash 로 순위 화면을 전송합니다 (조회 중에 hash 가 바뀌지 않도록)
+    response = client.views_update(
+        view_id=view["id"],
+        hash=view["hash"],
+        view=waiting_view()
+    )
+    # 이번 달은 Redis sorted set 에서, 다른 기간은 로그를 열 단위로 집계해서 필요한 페이지와 내 순위만 조회합니다
+    from usage_engine import range_leaderboard
+
+    range_name = selected_usage_range(view)
+    page, total, my_rank = range_leaderboard(user_id, range_name, offset, CONFIG["RANK_PAGE_SIZE"], usage_rollup)
 
     client.views_update(
-        view_id=body["view"]["id"],
-        hash=body["view"]["hash"],
-        view={
-            "type": "modal",
-            "close": {
-                "type": "plain_text",
-                "text": "닫기",
-            },
-            "title": {
-                "type": "plain_text",
-                "text": "사용량 순위 확인",
-            },
-            "blocks": blocks
-        }
+        view_id=response["view"]["id"],
+        hash=response["view"]["hash"],
+        view=rank_usage_view(page, offset=offset, total=total, my_rank=my_rank, page_size=CONFIG["RANK_PAGE_SIZE"],
+                             range_name=range_name)
     )
 
 
+@bolt_app.action("rank_usage")
+def show_rank_usage(ack, body, client):
+    try:
+        ack()
+        update_rank_usage(client, body["view"], body["user"]["id"], 0)
+    except Exception as e:
+        logger.error(f"Error handling message: {e}")
+
+
+@bolt_app.action(re.compile("^rank_usage_(prev|next)$"))
+def page_rank_usage(ack, body, client):
+    try:
+        ack()
+        update_rank_usage(client, body["view"], body["user"]["id"], int(body["actions"][0]["value"]))
+    except Exception as e:
+        logger.error(f"Error handling message: {e}")
+
+
+def update_answer(client, channel, ts, text, attempts=1):
+    # 답변 메시지 갱신이 실패해도 (Slack 429 등) 스트리밍은 계속합니다. 실패하면 False 를 돌려주고,
+    # 다음 갱신이 그때까지의 전체 텍스트를 다시 보냅니다. 429 면 Retry-After 만큼 기다렸다 다시 시도합니다.
+    for attempt in range(attempts):
+        try:
+            client.chat_update(channel=channel, ts=ts, text=text)
+            return True
+        except Exception as e:
+            logger.warning(f"Error updating message: {e}")
+            if attempt + 1 < attempts:
+                time.sleep(retry_after(e))
+    return False
+
+
 @bolt_app.event("message")
 def handle_message(event, say, ack, client):
     channel_type = event["channel_type"]
     user_id = event["user"]
     if channel_type in ["im", "mpim"]:
-        # 개인 메시지
+        # 개인 메시지 (대화가 없으면 새로 만듭니다)
         prefix = "user"
         key = user_id
-        context = redis_manager.get(prefix=prefix, key=key)
-        if context is None:
-            context = {"messages": [INITIAL_MESSAGE]}
-            redis_manager.set(prefix=prefix, key=key, value=context)
-            redis_manager.set(prefix=prefix, key=key + "_waiting", value=False)
+        default = {"messages": [INITIAL_MESSAGE]}
     elif channel_type in ["channel", "group"]:
-        # 채널 메시지
+        # 채널 메시지 (/대화시작 으로 시작된 대화만 응답합니다)
         prefix = "channel"
         key = event["channel"]
-        context = redis_manager.get(prefix=prefix, key=key)
-        if context is None:
-            ack()
-            return
+        default = None
     else:
         ack()
         return
 
-    is_waiting = redis_manager.get(prefix=prefix, key=key + "_waiting")
+    # 대화 조회 + 대화 락 획득(SET NX)을 한 번의 왕복으로 처리합니다
+    context, lock = redis_manager.begin_turn(prefix=prefix, key=key, default=default)
+    if context is None:
+        ack()
+        return
 
-    if is_waiting:
+    if not lock.acquired:
         say(WATING_MESSAGE)
     else:
+        bot_m = None
+        buffer = None
         try:
-            with LoggingManager(user_id) as usage:
-                redis_manager.set(prefix=prefix, key=key + "_waiting", value=True)
-                conversations = context["messages"]
-                conversations.append(format_conversation(event["text"]))
-                prompt_tokens = num_tokens_from_messages([SYSTEM_MESSAGE] + conversations)
-                report = []
+            # OpenAI 스케줄러는 채널 대화를 채널 단위로 공정하게 분배합니다
+            with LoggingManager(user_id, owner=f"{prefix}:{key}", channel=event["channel"]) as usage:
+                lock.start_keep_alive()
+                window = ContextWindow()
+                user_message = format_conversation(event["text"])
+                context["messages"].append(user_message)
+                context_token_counts(context).append(num_tokens_from_message(user_message))
+                evicted = window.fit(context)
+                if evicted and window.summarize:
+                    summary, summary_tokens = summarize_conversation(context.get("summary"), evicted)
+                    window.fold(context, summary)
+                    usage.tokens += summary_tokens
+                usage.saved_tokens = window.saved_tokens
+                prompt_messages = window.messages(context)
+                prompt_tokens = window.prompt_tokens(context)
                 bot_m = client.chat_postMessage(
                     channel=event["channel"],
                     text=":hourglass_flowing_sand:"
                 )
-                send_cnt = 0
-                result = ""
-                for chunk in send(
-                        messages=[SYSTEM_MESSAGE] + conversations,
-                        stream=True
+                buffer = StreamBuffer()
+                answer = posted = None
+                counter = CompletionTokenCounter()
+                # 재시도 / 첫 토큰 제한 / 멈춤 감지는 stream_with_retry 가 처리합니다
+                for chunk in stream_with_retry(
+                        messages=prompt_messages,
+                        prompt_tokens=prompt_tokens
                 ):
-                    content = chunk["choices"][0].get("delta", {}).get("content")
+                    content = counter.feed(chunk)
                     is_finish = chunk["choices"][0].get("finish_reason", None)
-                    result = "".join(report).strip()
                     if content is not None:
-                        send_cnt += 1
-                        report.append(content)
-                        if send_cnt % 2 == 0:
-                            client.chat_update(
-                                channel=event["channel"],
-                                ts=bot_m["ts"],
-                                text=result
-                            )
-                    if is_finish is not None:
-                        client.chat_update(
-                            channel=event["channel"],
-                            ts=bot_m["ts"],
-                            text=result
-                        )
-                completion_tokens = num_tokens_from_messages(result)
-                conversations.append(format_conversation(result, "assistant"))
-                while len(conversations) > 6:
-                    del conversations[0]
-                usage.tokens = completion_tokens + prompt_tokens
-                redis_manager.set(prefix=prefix, key=key, value={"messages": context["messages"]})
-                redis_manager.set(prefix=prefix, key=key + "_waiting", value=False)
+                        buffer.append(content)
+                    text = buffer.poll(finish=is_finish is not None)
+                    if is_finish == INTERRUPTED:
+                        # 스트림이 끊겨도 이미 보여준 답변은 남기고 안내만 덧붙입니다
+                        text = f"{buffer.text}\n\n{INTERRUPTED_MESSAGE}"
+                    if text is not None:
+                        answer = text
+                        if update_answer(client, event["channel"], bot_m["ts"], text):
+                            posted = text
+                if answer != posted:
+                    # 마지막 갱신이 실패했으면 지금까지 받은 답변을 한 번 더 올립니다
+                    update_answer(client, event["channel"], bot_m["ts"], answer, attempts=3)
+                result = buffer.text
+                context["messages"].append(format_conversation(result, "assistant"))
+                context["tokens"].append(counter.message_tokens)
+                usage.tokens += counter.completion_tokens + prompt_tokens
+                usage.prompt_tokens += prompt_tokens
+                usage.completion_tokens += counter.completion_tokens
+                redis_manager.end_turn(prefix=prefix, key=key, context=context, lock=lock)
         except Exception as e:
-            say("대화 중 알 수 없는 오류가 발생했습니다. :cry:")
+            lock.release()
+            if bot_m is not None:
+                # 모래시계 메시지를 오류 안내로 바꿉니다 (이미 받은 답변이 있으면 남기고 안내를 덧붙입니다)
+                notice = "대화 중 알 수 없는 오류가 발생했습니다. :cry:"
+                if buffer is not None and buffer.text:
+                    notice = f"{buffer.text}\n\n{notice}"
+                update_answer(client, event["channel"], bot_m["ts"], notice, attempts=3)
+            else:
+                try:
+                    say("대화 중 알 수 없는 오류가 발생했습니다. :cry:")
+                except Exception as say_error:
+                    logger.warning(f"Error reporting failure: {say_error}")
             logger.error(f"Error handling message: {e}")
     ack()
 
 
+def start_background_workers():
+    # 토크나이저 prewarm, 그림 작업 워커와 메트릭 서버를 띄웁니다 (SocketModeHandler 시작 전에 호출)
+    start_prewarm()
+    image_jobs.start()
+    if CONFIG["METRICS"]["PORT"]:
+        start_metrics_server(CONFIG["METRICS"]["HOST"], CONFIG["METRICS"]["PORT"])
+
+
 if __name__ == "__main__":
-    SocketModeHandler(bolt_app, CONFIG["APP_TOKEN"]).start()
+    start_background_workers()
+    handler = SocketModeHandler(bolt_app, CONFIG["APP_TOKEN"])
+    add_health_check(handler.client.is_connected)
+    handler.start()
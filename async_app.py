@@ -0,0 +1,466 @@
+import re
+import asyncio
+import logging
+
+from logging.handlers import RotatingFileHandler
+from config import CONFIG, WATING_MESSAGE, INITIAL_MESSAGE, INTERRUPTED_MESSAGE
+from slack_bolt import BoltResponse
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from slack_sdk.web.async_client import AsyncWebClient
+from open_ai import format_conversation, check_token_price, async_stream_with_retry, INTERRUPTED, \
+    num_tokens_from_message, context_token_counts, CompletionTokenCounter, async_summarize_conversation, \
+    async_cached_create_image, async_translate_to_eng, start_prewarm, async_load_encodings
+from utils import user_data_to_ascii_table, date_to_str, now, date_range, usage_range, retry_after
+from context import LoggingManager, add_usage_hook
+from stream import StreamBuffer
+from window import ContextWindow
+from usage import UsageRollup
+from cache import AsyncRedisManager, Codec, LocalCache
+from metrics import instrument, register_cache_stats, start_metrics_server, add_health_check, HandlerErrorCounter
+from jobs import AsyncJobQueue
+from views import view_digest, home_view, usage_menu_view, draw_image_view, image_result_blocks, waiting_view, total_usage_view, \
+    rank_usage_view, selected_usage_range
+
+## Slack Bolt (asyncio)
+# 모든 핸들러가 하나의 이벤트 루프에서 동작하므로 OpenAI 스트리밍이 리스너 스레드를 점유하지 않습니다.
+bolt_app = AsyncApp(client=AsyncWebClient(token=CONFIG['BOT_TOKEN'], base_url=CONFIG['SLACK_API_URL']))
+# 이후에 등록하는 모든 핸들러와 Slack API 호출의 지연 시간을 자동으로 측정합니다
+instrument(bolt_app)
+
+logger = logging.getLogger(__name__)
+file_handler = RotatingFileHandler(f'logs/error{CONFIG["LOG_SUFFIX"]}.log',
+                                   maxBytes=1024 * 1024 * 100,
+                                   backupCount=20,
+                                   encoding='utf-8')
+file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
+file_handler.setLevel(logging.ERROR)
+logger.addHandler(file_handler)
+logger.addHandler(HandlerErrorCounter())
+
+local_cache = None
+if CONFIG['REDIS']['LOCAL_CACHE_SIZE']:
+    local_cache = LocalCache(CONFIG['REDIS']['LOCAL_CACHE_SIZE'], CONFIG['REDIS']['LOCAL_CACHE_TTL'])
+    register_cache_stats("redis_local_cache_requests_total", "In-process cache lookups in front of Redis",
+                         local_cache)
+redis_manager = AsyncRedisManager(host=CONFIG['REDIS']['HOST'], port=CONFIG['REDIS']['PORT'],
+                                  db=CONFIG['REDIS']['DB'], max_connections=CONFIG['REDIS']['MAX_CONNECTIONS'],
+                                  lock_ttl=CONFIG['REDIS']['LOCK_TTL'],
+                                  codec=Codec(CONFIG['REDIS']['CODEC'], CONFIG['REDIS']['COMPRESSION'],
+                                              CONFIG['REDIS']['COMPRESS_THRESHOLD']),
+                                  local_cache=local_cache, worker_id=CONFIG['WORKERS']['ID'])
+usage_rollup = UsageRollup(host=CONFIG['REDIS']['HOST'], port=CONFIG['REDIS']['PORT'],
+                           db=CONFIG['REDIS']['USAGE_DB'])
+
+
+async def deduplicate_events(body, next):
+    # 워커가 여러 개면 Slack 재전송이나 다른 연결로 같은 이벤트가 다시 올 수 있으므로, 먼저 가져간 워커만 처리합니다
+    if not await redis_manager.claim_event(body, CONFIG['WORKERS']['DEDUPE_TTL']):
+        return BoltResponse(status=200, body="")
+    await next()
+
+
+bolt_app.use(deduplicate_events)
+
+
+async def record_usage(usage):
+    # 사용량 카운터(UsageRollup)는 동기 Redis 클라이언트라 이벤트 루프를 막지 않도록 스레드에서 누적하고,
+    # 누적이 끝난 뒤에 사용량이 바뀐 유저의 App Home view 캐시를 지웁니다
+    try:
+        await asyncio.to_thread(usage_rollup.record, usage)
+    except Exception as e:
+        logger.warning(f"Error recording usage: {e}")
+    await redis_manager.delete(prefix="home", key=f"{usage.user_id}:{date_to_str(now())}:view")
+
+
+def schedule_record_usage(usage):
+    # LoggingManager 는 이벤트 루프 위에서 끝나므로 hook 에서는 작업만 예약합니다
+    asyncio.get_running_loop().create_task(record_usage(usage))
+
+
+add_usage_hook(schedule_record_usage)
+
+
+async def publish_home(client, user_id):
+    # 렌더링된 view 는 사용량이나 기간 선택이 바뀔 때까지 캐시합니다 (날짜가 바뀌면 새로 만듭니다)
+    view_key = f"{user_id}:{date_to_str(now())}:view"
+    keys = [view_key, f"{user_id}:published", f"{user_id}:range"]
+    view, published, range_name = await redis_manager.mget(prefix="home", keys=keys)
+    range_name = range_name or "this_month"
+    if view is None:
+        # 사용량 집계 모듈(NumPy)은 처음 렌더링할 때 불러옵니다
+        from usage_engine import range_user_stats
+
+        user_date_list, user_total_token, user_total_process_time = await asyncio.to_thread(
+            range_user_stats, user_id, range_name, usage_rollup)
+        user_table = user_data_to_ascii_table(user_date_list)
+        view = home_view(user_id, user_table, user_total_token, user_total_process_time, range_name)
+        await redis_manager.set(prefix="home", key=view_key, value=view, expire=CONFIG["HOME_CACHE_TTL"])
+
+    # 마지막으로 전송한 view 와 같으면 views_publish 를 생략합니다
+    digest = view_digest(view)
+    if digest != published:
+        # App Home 화면 전송
+        await client.views_publish(
+            user_id=user_id,
+            view=view
+        )
+        await redis_manager.set(prefix="home", key=f"{user_id}:published", value=digest, expire=86400 * 31)
+
+
+@bolt_app.event("app_home_opened")
+async def update_home_tab(client, event, ack):
+    try:
+        await publish_home(client, event["user"])
+        await ack()
+
+    except Exception as e:
+        logger.error(f"Error handling message: {e}")
+
+
+@bolt_app.action("home_usage_range")
+async def change_home_usage_range(ack, body, client):
+    try:
+        await ack()
+        user_id = body["user"]["id"]
+        range_name = body["actions"][0]["selected_option"]["value"]
+        await redis_manager.set(prefix="home", key=f"{user_id}:range", value=range_name, expire=86400 * 31)
+        await redis_manager.delete(prefix="home", key=f"{user_id}:{date_to_str(now())}:view")
+        await publish_home(client, user_id)
+    except Exception as e:
+        logger.error(f"Error handling message: {e}")
+
+
+@bolt_app.command("/대화시작")
+async def start_conversation(body, ack, say):
+    try:
+        if body["channel_id"].startswith("D"):
+            await ack(":no_entry_sign: 해당 명령어는 채널에서만 사용 가능합니다.")
+        else:
+            lock = redis_manager.lock(prefix="channel", key=body['channel_id'])
+            if not await lock.acquire():
+                # 응답 중인 대화는 스트리밍이 끝난 뒤에 다시 시작할 수 있습니다
+                await say(WATING_MESSAGE)
+            else:
+                await say("안녕하세요! 지피티선생님입니다. 무엇이든 물어보세요. :smile:")
+                await redis_manager.save_conversation(prefix="channel", key=body['channel_id'],
+                                                      context={"messages": [INITIAL_MESSAGE]})
+                await lock.release()
+            await ack()
+    except Exception as e:
+        logger.error(f"Error handling message: {e}")
+
+
+@bolt_app.command("/대화끝")
+async def end_conversation(body, ack, say):
+    try:
+        if body["channel_id"].startswith("D"):
+            await ack(":no_entry_sign: 해당 명령어는 채널에서만 사용 가능합니다.")
+        else:
+            lock = redis_manager.lock(prefix="channel", key=body['channel_id'])
+            if not await lock.acquire():
+                # 응답 중인 턴의 end_turn 이 지운 대화를 다시 저장하지 않도록 스트리밍이 끝난 뒤에 종료합니다
+                await say(WATING_MESSAGE)
+            else:
+                await say("감사합니다. 대화를 종료합니다! :wave:")
+                await redis_manager.delete(prefix="channel", key=body['channel_id'])
+                await lock.release()
+            await ack()
+    except Exception as e:
+        logger.error(f"Error handling message: {e}")
+
+
+@bolt_app.command("/대화초기화")
+async def reset_conversation(body, ack, say):
+    try:
+        if body["channel_id"].startswith("D"):
+            await ack(":no_entry_sign: 해당 명령어는 채널에서만 사용 가능합니다.")
+        else:
+            lock = redis_manager.lock(prefix="channel", key=body['channel_id'])
+            if not await lock.acquire():
+                # 응답 중인 대화는 스트리밍이 끝난 뒤에 다시 시작할 수 있습니다
+                await say(WATING_MESSAGE)
+            else:
+                await say("대화를 처음부터 다시 시작합니다! 무엇이든 물어보세요. :smile:")
+                await redis_manager.save_conversation(prefix="channel", key=body['channel_id'],
+                                                      context={"messages": [INITIAL_MESSAGE]})
+                await lock.release()
+        await ack()
+    except Exception as e:
+        logger.error(f"Error handling message: {e}")
+
+
+@bolt_app.command("/사용량")
+async def show_usage(body, ack, client):
+    try:
+        await ack()
+        await client.views_open(
+            trigger_id=body["trigger_id"],
+            view=usage_menu_view(body['user_id'])
+        )
+    except Exception as e:
+        logger.error(f"Error handling message: {e}")
+
+
+@bolt_app.command("/그림그리기")
+async def draw_image(body, ack, client):
+    try:
+        await ack()
+        await client.views_open(
+            trigger_id=body["trigger_id"],
+            view=draw_image_view(body['user_id'])
+        )
+    except Exception as e:
+        logger.error(f"Error handling message: {e}")
+
+
+async def run_image_job(job):
+    # 작업 큐 워커에서 실행됩니다 (Bolt 리스너를 점유하지 않습니다)
+    user_id = job["user_id"]
+    client = bolt_app.client
+    try:
+        with LoggingManager(user_id=user_id, feature="image") as usage:
+            await client.chat_postMessage(channel=user_id, text="그림을 그리는 중입니다... 잠시만 기다려주세요")
+            if job["translate"]:
+                translate_description, translate_tokens = await async_translate_to_eng(job["description"], kind="image")
+                usage.tokens += translate_tokens
+            else:
+                translate_description = job["description"]
+            response, is_cached = await async_cached_create_image(translate_description)
+            image_url = response['data'][0]['url']
+            await client.chat_postMessage(channel=user_id,
+                                          text="그림이 완성되었습니다! :tada:",
+                                          blocks=image_result_blocks(translate_description, image_url))
+            if not is_cached:
+                usage.tokens += 9
+    except Exception as e:
+        await client.chat_postMessage(channel=user_id, text=str(e))
+        logger.error(f"Error handling message: {e}")
+        raise
+
+
+image_jobs = AsyncJobQueue(host=CONFIG['REDIS']['HOST'], port=CONFIG['REDIS']['PORT'], db=CONFIG['REDIS']['JOB_DB'],
+                           name="job:image", handler=run_image_job, workers=CONFIG['IMAGE_JOBS']['WORKERS'],
+                           max_depth=CONFIG['IMAGE_JOBS']['MAX_DEPTH'], worker_id=CONFIG['WORKERS']['ID'])
+
+
+@bolt_app.view("draw_image")
+async def draw_image(ack, body, client, view):
+    user_id = body["user"]["id"]
+    try:
+        await ack()
+        is_translate = view["state"]["values"]["input_check"]["is_translate"]["selected_options"]
+        image_description = view["state"]["values"]["input_text"]["image_description"]['value']
+        job_id, position = await image_jobs.submit({
+            "user_id": user_id,
+            "description": image_description,
+            "translate": bool(is_translate),
+        })
+        if job_id is None:
+            await client.chat_postMessage(channel=user_id,
+                                          text=f"지금은 그림 요청이 너무 많습니다. (대기 {position}건) 잠시 후 다시 시도해주세요 :cry:")
+        else:
+            await client.chat_postMessage(channel=user_id,
+                                          text=f"그림 요청이 접수되었습니다. 대기 순번 {position}번입니다. :art:")
+    except Exception as e:
+        await client.chat_postMessage(channel=user_id, text=str(e))
+        logger.error(f"Error handling message: {e}")
+
+
+@bolt_app.action("usage_range")
+async def select_usage_range(ack):
+    # 선택한 기간은 모달 state 에 남으므로 ack 만 합니다
+    await ack()
+
+
+@bolt_app.action("total_usage")
+async def show_total_usage(ack, body, client):
+    try:
+        await ack()
+        response = await client.views_update(
+            view_id=body["view"]["id"],
+            hash=body["view"]["hash"],
+            view=waiting_view()
+        )
+
+        range_name = selected_usage_range(body["view"])
+        total_stats = await asyncio.to_thread(check_token_price, date_range(*usage_range(range_name)))
+
+        await client.views_update(
+            view_id=response["view"]["id"],
+            hash=response["view"]["hash"],
+            view=total_usage_view(total_stats, range_name)
+        )
+    except Exception as e:
+        logger.error(f"Error handling message: {e}")
+
+
+async def update_rank_usage(client, view, user_id, offset):
+    # 대기 화면으로 먼저 바꾼 뒤, 새 hash 로 순위 화면을 전송합니다 (조회 중에 hash 가 바뀌지 않도록)
+    response = await client.views_update(
+        view_id=view["id"],
+        hash=view["hash"],
+        view=waiting_view()
+    )
+    # 이번 달은 Redis sorted set 에서, 다른 기간은 로그를 열 단위로 집계해서 필요한 페이지와 내 순위만 조회합니다
+    from usage_engine import range_leaderboard
+
+    range_name = selected_usage_range(view)
+    page, total, my_rank = await asyncio.to_thread(range_leaderboard, user_id, range_name, offset,
+                                                   CONFIG["RANK_PAGE_SIZE"], usage_rollup)
+
+    await client.views_update(
+        view_id=response["view"]["id"],
+        hash=response["view"]["hash"],
+        view=rank_usage_view(page, offset=offset, total=total, my_rank=my_rank, page_size=CONFIG["RANK_PAGE_SIZE"],
+                             range_name=range_name)
+    )
+
+
+@bolt_app.action("rank_usage")
+async def show_rank_usage(ack, body, client):
+    try:
+        await ack()
+        await update_rank_usage(client, body["view"], body["user"]["id"], 0)
+    except Exception as e:
+        logger.error(f"Error handling message: {e}")
+
+
+@bolt_app.action(re.compile("^rank_usage_(prev|next)$"))
+async def page_rank_usage(ack, body, client):
+    try:
+        await ack()
+        await update_rank_usage(client, body["view"], body["user"]["id"], int(body["actions"][0]["value"]))
+    except Exception as e:
+        logger.error(f"Error handling message: {e}")
+
+
+async def update_answer(client, channel, ts, text, attempts=1):
+    # 답변 메시지 갱신이 실패해도 (Slack 429 등) 스트리밍은 계속합니다. 실패하면 False 를 돌려주고,
+    # 다음 갱신이 그때까지의 전체 텍스트를 다시 보냅니다. 429 면 Retry-After 만큼 기다렸다 다시 시도합니다.
+    for attempt in range(attempts):
+        try:
+            await client.chat_update(channel=channel, ts=ts, text=text)
+            return True
+        except Exception as e:
+            logger.warning(f"Error updating message: {e}")
+            if attempt + 1 < attempts:
+                await asyncio.sleep(retry_after(e))
+    return False
+
+
+@bolt_app.event("message")
+async def handle_message(event, say, ack, client):
+    channel_type = event["channel_type"]
+    user_id = event["user"]
+    if channel_type in ["im", "mpim"]:
+        # 개인 메시지 (대화가 없으면 새로 만듭니다)
+        prefix = "user"
+        key = user_id
+        default = {"messages": [INITIAL_MESSAGE]}
+    elif channel_type in ["channel", "group"]:
+        # 채널 메시지 (/대화시작 으로 시작된 대화만 응답합니다)
+        prefix = "channel"
+        key = event["channel"]
+        default = None
+    else:
+        await ack()
+        return
+
+    # 대화 조회 + 대화 락 획득(SET NX)을 한 번의 왕복으로 처리합니다
+    context, lock = await redis_manager.begin_turn(prefix=prefix, key=key, default=default)
+    if context is None:
+        await ack()
+        return
+
+    if not lock.acquired:
+        await say(WATING_MESSAGE)
+    else:
+        bot_m = None
+        buffer = None
+        try:
+            # OpenAI 스케줄러는 채널 대화를 채널 단위로 공정하게 분배합니다
+            with LoggingManager(user_id, owner=f"{prefix}:{key}", channel=event["channel"]) as usage:
+                lock.start_keep_alive()
+                # 토크나이저가 아직 로딩 중이면 이벤트 루프를 막지 않고 기다립니다
+                await async_load_encodings()
+                window = ContextWindow()
+                user_message = format_conversation(event["text"])
+                context["messages"].append(user_message)
+                context_token_counts(context).append(num_tokens_from_message(user_message))
+                evicted = window.fit(context)
+                if evicted and window.summarize:
+                    summary, summary_tokens = await async_summarize_conversation(context.get("summary"), evicted)
+                    window.fold(context, summary)
+                    usage.tokens += summary_tokens
+                usage.saved_tokens = window.saved_tokens
+                prompt_messages = window.messages(context)
+                prompt_tokens = window.prompt_tokens(context)
+                bot_m = await client.chat_postMessage(
+                    channel=event["channel"],
+                    text=":hourglass_flowing_sand:"
+                )
+                buffer = StreamBuffer()
+                answer = posted = None
+                counter = CompletionTokenCounter()
+                # 재시도 / 첫 토큰 제한 / 멈춤 감지는 async_stream_with_retry 가 처리합니다
+                async for chunk in async_stream_with_retry(
+                        messages=prompt_messages,
+                        prompt_tokens=prompt_tokens
+                ):
+                    content = counter.feed(chunk)
+                    is_finish = chunk["choices"][0].get("finish_reason", None)
+                    if content is not None:
+                        buffer.append(content)
+                    text = buffer.poll(finish=is_finish is not None)
+                    if is_finish == INTERRUPTED:
+                        # 스트림이 끊겨도 이미 보여준 답변은 남기고 안내만 덧붙입니다
+                        text = f"{buffer.text}\n\n{INTERRUPTED_MESSAGE}"
+                    if text is not None:
+                        answer = text
+                        if await update_answer(client, event["channel"], bot_m["ts"], text):
+                            posted = text
+                if answer != posted:
+                    # 마지막 갱신이 실패했으면 지금까지 받은 답변을 한 번 더 올립니다
+                    await update_answer(client, event["channel"], bot_m["ts"], answer, attempts=3)
+                result = buffer.text
+                context["messages"].append(format_conversation(result, "assistant"))
+                context["tokens"].append(counter.message_tokens)
+                usage.tokens += counter.completion_tokens + prompt_tokens
+                usage.prompt_tokens += prompt_tokens
+                usage.completion_tokens += counter.completion_tokens
+                await redis_manager.end_turn(prefix=prefix, key=key, context=context, lock=lock)
+        except Exception as e:
+            await lock.release()
+            if bot_m is not None:
+                # 모래시계 메시지를 오류 안내로 바꿉니다 (이미 받은 답변이 있으면 남기고 안내를 덧붙입니다)
+                notice = "대화 중 알 수 없는 오류가 발생했습니다. :cry:"
+                if buffer is not None and buffer.text:
+                    notice = f"{buffer.text}\n\n{notice}"
+                await update_answer(client, event["channel"], bot_m["ts"], notice, attempts=3)
+            else:
+                try:
+                    await say("대화 중 알 수 없는 오류가 발생했습니다. :cry:")
+                except Exception as say_error:
+                    logger.warning(f"Error reporting failure: {say_error}")
+            logger.error(f"Error handling message: {e}")
+    await ack()
+
+
+async def main():
+    # 토크나이저는 이벤트 루프를 막지 않도록 별도 스레드에서 미리 불러옵니다
+    start_prewarm()
+    await redis_manager.initialize()
+    await image_jobs.start()
+    if CONFIG["METRICS"]["PORT"]:
+        start_metrics_server(CONFIG["METRICS"]["HOST"], CONFIG["METRICS"]["PORT"])
+    handler = AsyncSocketModeHandler(bolt_app, CONFIG["APP_TOKEN"])
+    # aiohttp 클라이언트의 is_connected 는 코루틴이라 /healthz 스레드에서는 같은 조건을 직접 확인합니다
+    client = handler.client
+    add_health_check(lambda: not client.closed and not client.stale and client.current_session is not None
+                     and not client.current_session.closed)
+    await handler.start_async()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""Compares stored bytes and encode/decode time of the conversation codecs on realistic histories.
+
+    python -m benchmarks.codec [--messages 6 12 24] [--repeat 2000]
+"""
+import argparse
+import json
+import random
+import timeit
+
+from cache import Codec
+
+KOREAN = "안녕하세요 지피티선생님 오늘은 파이썬의 비동기 프로그래밍에 대해서 질문이 있습니다 이벤트 루프가 어떻게 동작하나요"
+CODE = '''def handle(event):
+    for chunk in send(messages, stream=True):
+        content = chunk["choices"][0].get("delta", {}).get("content")
+        if content is not None:
+            buffer.append(content)
+'''
+CODECS = [
+    ("json", None),
+    ("json", "zlib"),
+    ("json", "zstd"),
+    ("msgpack", None),
+    ("msgpack", "zlib"),
+    ("msgpack", "zstd"),
+]
+
+
+def make_history(n, seed=0):
+    # 한국어 질문/답변과 붙여넣은 코드가 섞인 대화
+    rnd = random.Random(seed)
+    messages = []
+    for i in range(n):
+        role = "user" if i % 2 == 0 else "assistant"
+        words = KOREAN.split()
+        content = " ".join(rnd.choice(words) for _ in range(rnd.randint(20, 120)))
+        if rnd.random() < 0.3:
+            content += "\n```python\n" + CODE * rnd.randint(1, 4) + "```"
+        messages.append({"role": role, "content": content})
+    return {"messages": messages, "tokens": [rnd.randint(20, 400) for _ in range(n)]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, nargs="+", default=[6, 12, 24])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = []
+    for n in args.messages:
+        history = make_history(n)
+        for serializer, compression in CODECS:
+            try:
+                codec = Codec(serializer, compression, threshold=0)
+            except ValueError as e:
+                results.append({"messages": n, "codec": f"{serializer}/{compression}", "skipped": str(e)})
+                continue
+            data = codec.encode(history)
+            assert codec.decode(data) == history
+            encode = timeit.timeit(lambda: codec.encode(history), number=args.repeat) / args.repeat
+            decode = timeit.timeit(lambda: codec.decode(data), number=args.repeat) / args.repeat
+            results.append({
+                "messages": n,
+                "codec": f"{serializer}/{compression}",
+                "bytes": len(data),
+                "encode_us": round(encode * 1e6, 1),
+                "decode_us": round(decode * 1e6, 1),
+            })
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Local stand-ins for the services the bot talks to, so benchmarks run without network access.
+
+- FakeOpenAI: /v1/chat/completions (SSE streaming at a configurable tokens/sec after a first-token latency),
+  /v1/images/generations and /v1/usage?date= (per-date token counts, failing dates answer 500)
+- FakeSlack: /api/<method> with per (method, channel) rate limits that answer 429 + Retry-After like Slack
+- start_redis(): fakeredis over TCP (Lua scripts need the `lupa` package), or a real redis-server via --redis-host
+"""
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+WORDS = "안녕하세요 파이썬 비동기 이벤트 루프 는 하나의 스레드 에서 여러 작업 을 번갈아 실행 합니다 .".split()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class _FakeService:
+    handler = None
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.server = _Server((host, port), self.handler)
+        self.server.service = self
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] = self.stats.get(name, 0) + amount
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+class _OpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        service = self.server.service
+        url = urlsplit(self.path)
+        if not url.path.endswith("/usage"):
+            self._json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+        date = parse_qs(url.query).get("date", [""])[0]
+        service.count(f"usage:{date}")
+        if date in service.failing_dates:
+            self._json(500, {"error": {"message": "server error", "type": "server_error"}})
+            return
+        tokens = service.usage.get(date, 0)
+        self._json(200, {"object": "list", "data": [
+            {"n_context_tokens_total": tokens // 2, "n_generated_tokens_total": tokens - tokens // 2}]})
+
+    def do_POST(self):
+        service = self.server.service
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.endswith("/images/generations"):
+            service.count("images")
+            time.sleep(service.image_latency)
+            self._json(200, {"created": int(time.time()), "data": [{"url": "https://example.com/image.png"}]})
+            return
+        if not self.path.endswith("/chat/completions"):
+            self._json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+
+        service.count("chat_completions")
+        tokens = min(body.get("max_tokens") or service.completion_tokens, service.completion_tokens)
+        prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // 2
+        time.sleep(service.first_token_latency)
+        if not body.get("stream"):
+            time.sleep(tokens / service.tokens_per_sec)
+            self._json(200, {
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": " ".join(WORDS[:tokens])}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": tokens,
+                          "total_tokens": prompt_tokens + tokens},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        interval = 1 / service.tokens_per_sec
+        self._event({"role": "assistant"}, None, body)
+        for i in range(tokens):
+            self._event({"content": WORDS[i % len(WORDS)] + " "}, None, body)
+            time.sleep(interval)
+        self._event({}, "stop", body)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _event(self, delta, finish_reason, body):
+        chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                 "model": body.get("model"), "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+        self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+
+class FakeOpenAI(_FakeService):
+    handler = _OpenAIHandler
+
+    def __init__(self, tokens_per_sec=50, first_token_latency=0.3, completion_tokens=60, image_latency=1.0, usage=None,
+                 failing_dates=(), **kwargs):
+        super().__init__(**kwargs)
+        self.tokens_per_sec = tokens_per_sec
+        self.first_token_latency = first_token_latency
+        self.completion_tokens = completion_tokens
+        self.image_latency = image_latency
+        # /v1/usage: 날짜("YYYY-MM-DD") -> 토큰 수, 오류(500)를 돌려줄 날짜
+        self.usage = dict(usage or {})
+        self.failing_dates = set(failing_dates)
+
+    @property
+    def api_base(self):
+        return f"{self.url}/v1"
+
+
+class _SlackHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        service = self.server.service
+        method = self.path.rsplit('/', 1)[-1]
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode('utf-8')
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            args = json.loads(raw or "{}")
+        else:
+            args = {k: v[0] for k, v in parse_qs(raw).items()}
+
+        retry_after = service.take(method, args.get("channel"))
+        if retry_after:
+            service.count(f"{method}:rate_limited")
+            self.send_response(429)
+            self.send_header("Retry-After", str(retry_after))
+            self.send_header("Content-Type", "application/json")
+            data = b'{"ok": false, "error": "ratelimited"}'
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        service.count(method)
+        time.sleep(service.latency)
+        body = {"ok": True}
+        if method == "auth.test":
+            body.update({"team_id": "T0", "user_id": "UBOT", "bot_id": "B0", "url": "https://fake.slack.com/"})
+        elif method in ("chat.postMessage", "chat.update"):
+            body.update({"channel": args.get("channel"), "ts": args.get("ts") or f"{time.time():.6f}"})
+        elif method in ("views.publish", "views.open", "views.update"):
+            body["view"] = {"id": "V0", "hash": f"{time.time():.6f}"}
+        for listener in service.listeners:
+            listener(method, args, body)
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeSlack(_FakeService):
+    handler = _SlackHandler
+
+    # 분당 호출 한도 (method, channel 별). Slack 의 chat.postMessage 는 채널당 초당 1건 수준입니다.
+    DEFAULT_LIMITS = {"chat.postMessage": 60, "chat.update": 50}
+
+    def __init__(self, limits=None, latency=0.02, **kwargs):
+        super().__init__(**kwargs)
+        self.limits = dict(self.DEFAULT_LIMITS, **(limits or {}))
+        self.latency = latency
+        self._buckets = {}
+        # listener(method, args, response) 는 성공한 호출마다 불립니다 (예: 첫 chat.update 시각 기록)
+        self.listeners = []
+
+    def take(self, method, channel):
+        """Returns 0 if the call is allowed, otherwise the Retry-After seconds."""
+        per_minute = self.limits.get(method)
+        if not per_minute:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            level, updated = self._buckets.get((method, channel), (per_minute, now))
+            level = min(per_minute, level + (now - updated) * per_minute / 60)
+            if level < 1:
+                self._buckets[(method, channel)] = (level, now)
+                return max(1, int((1 - level) * 60 / per_minute + 0.999))
+            self._buckets[(method, channel)] = (level - 1, now)
+            return 0
+
+
+def start_redis(host=None, port=6379):
+    """Returns (host, port, stop) for a real Redis at host:port, or a fakeredis TCP server on a free port."""
+    if host:
+        return host, port, lambda: None
+    from fakeredis import TcpFakeServer
+
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+
+    return host, port, stop
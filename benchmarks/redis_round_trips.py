@@ -0,0 +1,79 @@
+"""Counts Redis round trips per message turn, before (key per value) and after (one hash per conversation).
+
+    python -m benchmarks.redis_round_trips            # fakeredis
+    python -m benchmarks.redis_round_trips --host localhost --port 6379 --db 15
+"""
+import argparse
+import json
+
+import redis
+
+from cache import RedisManager
+
+CONTEXT = {"messages": [{"role": "assistant", "content": "안녕하세요! 지피티선생님입니다."}] * 6, "tokens": [20] * 6}
+
+
+def counting_pool(pool):
+    # 커넥션을 꺼낼 때마다 한 번의 왕복으로 셉니다 (pipeline / script 호출도 한 번)
+    counter = {"round_trips": 0}
+    get_connection = pool.get_connection
+
+    def _get_connection(*args, **kwargs):
+        counter["round_trips"] += 1
+        return get_connection(*args, **kwargs)
+
+    pool.get_connection = _get_connection
+    return counter
+
+
+def legacy_turn(manager, key):
+    # 이전 handle_message: context get, waiting get, waiting set, context set, waiting set
+    context = manager.get(prefix="legacy", key=key)
+    manager.get(prefix="legacy", key=key + "_waiting")
+    manager.set(prefix="legacy", key=key + "_waiting", value=True)
+    manager.set(prefix="legacy", key=key, value=context)
+    manager.set(prefix="legacy", key=key + "_waiting", value=False)
+
+
+def hash_turn(manager, key):
+    context, lock = manager.begin_turn(prefix="user", key=key, default=CONTEXT)
+    manager.end_turn(prefix="user", key=key, context=context, lock=lock)
+
+
+def measure(manager, counter, turn, turns):
+    turn(manager, "U0")  # warm-up (script 등록 등)
+    counter["round_trips"] = 0
+    for i in range(turns):
+        turn(manager, f"U{i % 10}")
+    return counter["round_trips"] / turns
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--db", type=int, default=15)
+    parser.add_argument("--turns", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.host:
+        pool = redis.ConnectionPool(host=args.host, port=args.port, db=args.db)
+    else:
+        import fakeredis
+        pool = fakeredis.FakeStrictRedis().connection_pool
+
+    counter = counting_pool(pool)
+    manager = RedisManager(host=None, port=None, db=None, connection_pool=pool)
+    for i in range(10):
+        manager.set(prefix="legacy", key=f"U{i}", value=CONTEXT)
+        manager.save_conversation(prefix="user", key=f"U{i}", context=CONTEXT)
+
+    result = {
+        "before": measure(manager, counter, legacy_turn, args.turns),
+        "after": measure(manager, counter, hash_turn, args.turns),
+    }
+    print(json.dumps({"round_trips_per_message": result}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
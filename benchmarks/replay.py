@@ -0,0 +1,401 @@
+"""Replays Slack Socket Mode envelopes into bolt_app (bypassing SocketModeHandler) against the local stand-ins in
+benchmarks.fakes, and reports ack latency, time to first visible token and error rates per stage.
+
+    python -m benchmarks.replay --rates 5 10 20 40 --duration 30 --output replay.json
+    python -m benchmarks.replay --mode async --rates 20 50 100 --concurrency 200
+    python -m benchmarks.replay --trace monday.jsonl --speed 2
+
+A trace is a JSONL file of {"offset": seconds, "body": <envelope payload>} lines, where the body is what Socket Mode
+delivers in envelope["payload"]. Without --trace every stage replays a synthetic mix (Poisson arrivals) of im/channel
+messages, slash commands, app_home_opened and draw_image submissions at the stage's rate.
+
+Latencies are measured from the scheduled send time (open loop), so queueing in front of a saturated app counts.
+"""
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import threading
+import concurrent.futures
+
+from benchmarks.fakes import FakeOpenAI, FakeSlack, start_redis
+from benchmarks.suite import QUESTIONS, prepare, summarize, git_commit, preload_scripts
+
+# 합성 트래픽 비율
+MIX = {
+    "im_message": 60,
+    "channel_message": 15,
+    "command": 10,
+    "app_home_opened": 10,
+    "draw_image": 5,
+}
+# 트레이스 종류 -> 에러를 집계할 핸들러 이름 (metrics.instrument 의 라벨)
+HANDLERS = {
+    "event:message": "event:handle_message",
+    "event:app_home_opened": "event:update_home_tab",
+    "command:/사용량": "command:show_usage",
+    "command:/대화시작": "command:start_conversation",
+    "view:draw_image": "view:draw_image",
+}
+
+
+def event_body(event):
+    return {
+        "token": "benchmark", "team_id": "T0", "api_app_id": "A0", "type": "event_callback",
+        "event_id": f"Ev{uuid.uuid4().hex[:10]}", "event_time": int(time.time()), "event": event,
+        "authorizations": [{"team_id": "T0", "user_id": "UBOT", "is_bot": True}],
+    }
+
+
+def message_body(user_id, channel, channel_type, text):
+    return event_body({"type": "message", "channel_type": channel_type, "user": user_id, "channel": channel,
+                       "text": text, "ts": f"{time.time():.6f}", "client_msg_id": str(uuid.uuid4())})
+
+
+def command_body(command, user_id, channel):
+    return {"token": "benchmark", "team_id": "T0", "api_app_id": "A0", "command": command, "text": "",
+            "user_id": user_id, "channel_id": channel, "trigger_id": uuid.uuid4().hex,
+            "response_url": "https://hooks.slack.com/commands/T0/0/benchmark"}
+
+
+def draw_image_body(user_id, description):
+    return {
+        "type": "view_submission", "team": {"id": "T0"}, "user": {"id": user_id, "team_id": "T0"},
+        "api_app_id": "A0", "trigger_id": uuid.uuid4().hex,
+        "view": {"id": "V0", "type": "modal", "hash": "0", "callback_id": "draw_image", "state": {"values": {
+            "input_check": {"is_translate": {"type": "checkboxes", "selected_options": []}},
+            "input_text": {"image_description": {"type": "plain_text_input", "value": description}},
+        }}},
+    }
+
+
+def synthetic_trace(rate, duration, users, channels, rng):
+    kinds, weights = zip(*MIX.items())
+    trace = []
+    offset = rng.expovariate(rate)
+    while offset < duration:
+        kind = rng.choices(kinds, weights)[0]
+        user_id = f"U{rng.randrange(users):04d}"
+        question = rng.choice(QUESTIONS)
+        if kind == "im_message":
+            body = message_body(user_id, f"D{user_id}", "im", question)
+        elif kind == "channel_message":
+            body = message_body(user_id, f"C{rng.randrange(channels):04d}", "channel", question)
+        elif kind == "command":
+            body = command_body("/사용량", user_id, f"D{user_id}")
+        elif kind == "app_home_opened":
+            body = event_body({"type": "app_home_opened", "user": user_id, "channel": f"D{user_id}", "tab": "home"})
+        else:
+            body = draw_image_body(user_id, "우주를 여행하는 고양이")
+        trace.append((offset, body))
+        offset += rng.expovariate(rate)
+    return trace
+
+
+def load_trace(path):
+    with open(path, encoding="utf-8") as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    return [(item["offset"], item["body"]) for item in items]
+
+
+def kind_of(body):
+    if "command" in body:
+        return f"command:{body['command']}"
+    if body.get("type") == "event_callback":
+        return f"event:{body['event']['type']}"
+    if body.get("type") == "view_submission":
+        return f"view:{body['view']['callback_id']}"
+    return body.get("type", "unknown")
+
+
+class VisibleTokenTracker:
+    # 메시지 이벤트를 보낸 시각부터 그 답변의 첫 chat.update 가 Slack 에 도착할 때까지의 시간을 잽니다.
+    # handle_message 는 모래시계 메시지를 먼저 보내므로, 채널별로 보낸 순서대로 모래시계 메시지와 짝을 짓습니다.
+    def __init__(self, waiting_message):
+        self.waiting_message = waiting_message
+        self.samples = []
+        self.waiting = 0
+        self._pending = {}  # channel -> [scheduled time]
+        self._messages = {}  # (channel, ts) -> scheduled time
+        self._lock = threading.Lock()
+
+    def sent(self, channel, scheduled):
+        with self._lock:
+            self._pending.setdefault(channel, []).append(scheduled)
+
+    def __call__(self, method, args, response):
+        channel = args.get("channel")
+        with self._lock:
+            if method == "chat.postMessage" and self._pending.get(channel):
+                if args.get("text") == ":hourglass_flowing_sand:":
+                    self._messages[(channel, response["ts"])] = self._pending[channel].pop(0)
+                elif args.get("text") == self.waiting_message:
+                    # 이전 답변이 스트리밍 중이라 대기 안내만 받은 메시지
+                    self._pending[channel].pop(0)
+                    self.waiting += 1
+            elif method == "chat.update":
+                scheduled = self._messages.pop((channel, args.get("ts")), None)
+                if scheduled is not None:
+                    self.samples.append(time.monotonic() - scheduled)
+
+    def outstanding(self):
+        with self._lock:
+            return sum(len(v) for v in self._pending.values()) + len(self._messages)
+
+    def reset(self):
+        with self._lock:
+            self.samples = []
+            self.waiting = 0
+            self._pending = {}
+            self._messages = {}
+
+
+class Replayer:
+    def __init__(self, args, slack):
+        from config import WATING_MESSAGE
+        from metrics import HANDLER_ERRORS, ACTIVE_STREAMS
+
+        self.args = args
+        self.slack = slack
+        self.errors = HANDLER_ERRORS
+        self.streams = ACTIVE_STREAMS
+        self.tracker = VisibleTokenTracker(WATING_MESSAGE)
+        slack.listeners.append(self.tracker)
+        self._lock = threading.Lock()
+
+    def _record(self, results, body, scheduled, started, response=None, error=None):
+        finished = time.monotonic()
+        with self._lock:
+            results.append({
+                "kind": kind_of(body),
+                "ack": finished - scheduled,
+                "lag": started - scheduled,
+                "ok": error is None and response is not None and response.status == 200,
+            })
+
+    def _before_send(self, body, scheduled):
+        event = body.get("event", {})
+        if event.get("type") == "message":
+            self.tracker.sent(event["channel"], scheduled)
+
+    def setup(self, channels):
+        # 채널 메시지는 /대화시작 으로 시작된 대화에만 응답하므로 미리 시작해둡니다
+        return [command_body("/대화시작", "U0000", f"C{i:04d}") for i in range(channels)]
+
+    def busy(self):
+        # 아직 첫 답변이 보이지 않은 메시지나 스트리밍 중인 답변이 남아 있는지
+        return self.tracker.outstanding() or self.streams.value()
+
+    def drain(self):
+        deadline = time.monotonic() + self.args.drain
+        while self.busy() and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+    def report(self, rate, trace, results, elapsed, errors_before, slack_before):
+        by_kind = {}
+        for result in results:
+            by_kind.setdefault(result["kind"], []).append(result)
+        failed = sum(not result["ok"] for result in results)
+        handler_errors = {kind: self.errors.value(handler=handler) - errors_before.get(kind, 0)
+                          for kind, handler in HANDLERS.items()}
+        rate_limited = {key: value - slack_before.get(key, 0) for key, value in self.slack.stats.items()
+                        if key.endswith(":rate_limited")}
+        return {
+            "rate": rate,
+            "events": len(trace),
+            "elapsed_s": elapsed,
+            "achieved_rate": len(results) / elapsed if elapsed else 0,
+            "ack": summarize([result["ack"] for result in results]),
+            "dispatch_lag": summarize([result["lag"] for result in results]),
+            "ack_by_kind": {kind: summarize([r["ack"] for r in items]) for kind, items in by_kind.items()},
+            "time_to_first_visible_token": summarize(self.tracker.samples),
+            "waiting_replies": self.tracker.waiting,
+            "no_visible_token": self.tracker.outstanding(),
+            "errors": {
+                "dispatch": failed,
+                "handlers": handler_errors,
+                "rate": (failed + sum(handler_errors.values())) / len(results) if results else 0,
+            },
+            "slack_rate_limited": rate_limited,
+        }
+
+    def snapshot(self):
+        return ({kind: self.errors.value(handler=handler) for kind, handler in HANDLERS.items()},
+                dict(self.slack.stats))
+
+
+class SyncReplayer(Replayer):
+    def __init__(self, args, slack):
+        import app
+        from slack_bolt.request import BoltRequest
+
+        super().__init__(args, slack)
+        self.app = app
+        self.request = BoltRequest
+        preload_scripts(app.redis_manager)
+        app.start_background_workers()
+
+    def dispatch(self, results, body, scheduled):
+        started = time.monotonic()
+        try:
+            response = self.app.bolt_app.dispatch(self.request(body=body, mode="socket_mode"))
+            self._record(results, body, scheduled, started, response)
+        except Exception as e:
+            self._record(results, body, scheduled, started, error=e)
+
+    def run(self, rate, trace):
+        self.tracker.reset()
+        errors_before, slack_before = self.snapshot()
+        results = []
+        with concurrent.futures.ThreadPoolExecutor(self.args.concurrency) as executor:
+            start = time.monotonic()
+            for offset, body in trace:
+                scheduled = start + offset / self.args.speed
+                delay = scheduled - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self._before_send(body, scheduled)
+                executor.submit(self.dispatch, results, body, scheduled)
+        elapsed = time.monotonic() - start
+        self.drain()
+        return self.report(rate, trace, results, elapsed, errors_before, slack_before)
+
+    def close(self):
+        self.app.image_jobs.stop()
+
+
+class AsyncReplayer(Replayer):
+    def __init__(self, args, slack):
+        import async_app
+        from slack_bolt.request.async_request import AsyncBoltRequest
+
+        super().__init__(args, slack)
+        self.app = async_app
+        self.request = AsyncBoltRequest
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self._start())
+
+    async def _start(self):
+        await self.app.redis_manager.initialize()
+        preload_scripts(self.app.redis_manager)
+        await self.app.image_jobs.start()
+
+    async def dispatch(self, semaphore, results, body, scheduled):
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                response = await self.app.bolt_app.async_dispatch(self.request(body=body, mode="socket_mode"))
+                self._record(results, body, scheduled, started, response)
+            except Exception as e:
+                self._record(results, body, scheduled, started, error=e)
+
+    async def _run(self, trace):
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        results = []
+        tasks = []
+        start = time.monotonic()
+        for offset, body in trace:
+            scheduled = start + offset / self.args.speed
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._before_send(body, scheduled)
+            tasks.append(asyncio.create_task(self.dispatch(semaphore, results, body, scheduled)))
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - start
+        # 리스너는 ack 이후에도 이벤트 루프에서 계속 실행되므로 루프를 돌리면서 기다립니다
+        deadline = time.monotonic() + self.args.drain
+        while self.busy() and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        return results, elapsed
+
+    def run(self, rate, trace):
+        self.tracker.reset()
+        errors_before, slack_before = self.snapshot()
+        results, elapsed = self.loop.run_until_complete(self._run(trace))
+        return self.report(rate, trace, results, elapsed, errors_before, slack_before)
+
+    async def _stop(self):
+        await self.app.image_jobs.stop()
+        # 스트리밍을 마무리하는 리스너가 남아 있으면 끝날 때까지 기다린 뒤 루프를 닫습니다
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if pending:
+            await asyncio.wait(pending, timeout=self.args.drain)
+
+    def close(self):
+        self.loop.run_until_complete(self._stop())
+        self.loop.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default="replay_results.json")
+    parser.add_argument("--mode", choices=("sync", "async"), default="sync")
+    parser.add_argument("--trace", help="JSONL trace to replay instead of the synthetic mix")
+    parser.add_argument("--speed", type=float, default=1.0, help="trace time multiplier (2 = twice as fast)")
+    parser.add_argument("--rates", type=float, nargs="+", default=[5, 10, 20],
+                        help="events/sec of each synthetic stage")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per synthetic stage")
+    parser.add_argument("--concurrency", type=int, default=64, help="max in-flight dispatch calls")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--channels", type=int, default=10)
+    parser.add_argument("--drain", type=float, default=60, help="seconds to wait for replies after a stage")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tokens-per-sec", type=float, default=50)
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--completion-tokens", type=int, default=60)
+    parser.add_argument("--image-latency", type=float, default=1.0)
+    parser.add_argument("--slack-latency", type=float, default=0.02)
+    parser.add_argument("--redis-host")
+    parser.add_argument("--redis-port", type=int, default=6379)
+    parser.add_argument("--redis-db", type=int, default=15)
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    trace_path = os.path.abspath(args.trace) if args.trace else None
+
+    slack = FakeSlack(latency=args.slack_latency).start()
+    openai_server = FakeOpenAI(tokens_per_sec=args.tokens_per_sec, first_token_latency=args.first_token_latency,
+                               completion_tokens=args.completion_tokens, image_latency=args.image_latency).start()
+    redis_host, redis_port, stop_redis = start_redis(args.redis_host, args.redis_port)
+    workdir = prepare(args, slack, openai_server, redis_host, redis_port)
+
+    result = {
+        "meta": {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "redis": f"{args.redis_host}:{args.redis_port}" if args.redis_host else "fakeredis",
+            "workdir": workdir,
+            "args": vars(args),
+        },
+        "stages": [],
+    }
+    replayer = (AsyncReplayer if args.mode == "async" else SyncReplayer)(args, slack)
+    try:
+        replayer.run(0, [(0, body) for body in replayer.setup(args.channels)])
+        if trace_path:
+            stages = [(None, load_trace(trace_path))]
+        else:
+            rng = random.Random(args.seed)
+            stages = [(rate, synthetic_trace(rate, args.duration, args.users, args.channels, rng))
+                      for rate in args.rates]
+        for rate, trace in stages:
+            stage = replayer.run(rate, trace)
+            result["stages"].append(stage)
+            print(f"rate={rate} events={stage['events']} ack_p99={stage['ack'].get('p99_ms', 0):.1f}ms "
+                  f"ttfvt_p95={stage['time_to_first_visible_token'].get('p95_ms', 0):.0f}ms "
+                  f"error_rate={stage['errors']['rate']:.3f}", flush=True)
+    finally:
+        replayer.close()
+        slack.stop()
+        openai_server.stop()
+        stop_redis()
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
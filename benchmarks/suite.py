@@ -0,0 +1,398 @@
+"""Offline benchmark suite: runs the bot against local stand-ins for Slack, OpenAI and Redis (see benchmarks.fakes)
+and writes the results as JSON.
+
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --only tokens logs redis          # skip the end-to-end section
+    python -m benchmarks.suite --mode async --users 16 --messages 10
+    python -m benchmarks.suite --redis-host localhost --redis-db 15   # real redis-server
+
+Sections:
+- startup: import time of the app module and prewarm time (openai + tokenizer), each in a fresh interpreter
+- handle_message: end-to-end message throughput / latency (fake OpenAI streaming, rate limited fake Slack)
+- tokens: num_tokens_from_messages vs stored per-message counts over history length
+- logs: stats_for_this_month (cold / warm / incremental poll) over usage log size
+- redis: RedisManager operation latency
+
+Without network access the tiktoken encoding (cl100k_base) must already be in TIKTOKEN_CACHE_DIR.
+Everything runs in a temporary working directory, so logs/ of the repository is not touched.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import statistics
+import concurrent.futures
+
+from benchmarks.fakes import FakeOpenAI, FakeSlack, start_redis
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECTIONS = ("startup", "handle_message", "tokens", "logs", "redis")
+QUESTIONS = [
+    "파이썬의 비동기 프로그래밍에 대해서 설명해주세요",
+    "이벤트 루프가 어떻게 동작하나요?",
+    "asyncio.gather 와 TaskGroup 의 차이는 무엇인가요",
+    "def handle(event):\n    return send(event['text'])\n이 코드에서 예외 처리는 어떻게 하나요?",
+]
+
+
+def summarize(samples):
+    # 초 단위 측정값 -> ms 단위 요약
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.mean(ordered) * 1000,
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def prepare(args, slack, openai_server, redis_host, redis_port):
+    # config.py 는 import 시점에 환경 변수를 읽으므로 앱 모듈을 import 하기 전에 설정합니다
+    os.environ.update({
+        "BOT_TOKEN": "xoxb-benchmark",
+        "API_KEY": "sk-benchmark",
+        "SLACK_API_URL": f"{slack.url}/api/",
+        "OPENAI_API_BASE": openai_server.api_base,
+        "REDIS_HOST": redis_host,
+        "REDIS_PORT": str(redis_port),
+        "REDIS_DB": str(args.redis_db),
+        "REDIS_USAGE_DB": str(args.redis_db),
+        "REDIS_JOB_DB": str(args.redis_db),
+        "METRICS_PORT": "0",
+    })
+    # 로그 파일은 임시 디렉토리의 logs/ 에 씁니다
+    workdir = tempfile.mkdtemp(prefix="chatgpt-slack-bench-")
+    os.makedirs(os.path.join(workdir, "logs"))
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    return workdir
+
+
+def message_event(user_id, text):
+    return {"type": "message", "channel_type": "im", "user": user_id, "channel": f"D{user_id}", "text": text,
+            "ts": f"{time.time():.6f}"}
+
+
+def bench_handle_message(args):
+    import app
+    from metrics import HANDLER_ERRORS
+
+    client = app.bolt_app.client
+    latencies = []
+    preload_scripts(app.redis_manager)
+
+    def ack():
+        pass
+
+    def run_user(index):
+        user_id = f"U{index:04d}"
+
+        def say(text):
+            client.chat_postMessage(channel=f"D{user_id}", text=text)
+
+        # 같은 유저의 메시지는 대화 락 때문에 순서대로 보냅니다 (유저끼리는 동시에)
+        for i in range(args.messages):
+            started = time.perf_counter()
+            app.handle_message(event=message_event(user_id, QUESTIONS[i % len(QUESTIONS)]), say=say, ack=ack,
+                               client=client)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(args.users) as executor:
+        list(executor.map(run_user, range(args.users)))
+    elapsed = time.perf_counter() - started
+    return elapsed, latencies, HANDLER_ERRORS.value(handler="event:handle_message")
+
+
+def preload_scripts(manager):
+    # fakeredis TCP 서버는 에러(NOSCRIPT 등)를 보낸 뒤 연결을 끊으므로 Lua 스크립트를 미리 올려둡니다
+    import redis
+    from redis.commands.core import Script, AsyncScript
+
+    client = redis.StrictRedis(host=os.environ["REDIS_HOST"], port=int(os.environ["REDIS_PORT"]))
+    for script in vars(manager).values():
+        if isinstance(script, (Script, AsyncScript)):
+            client.script_load(script.script)
+
+
+def bench_async_handle_message(args):
+    import async_app
+    from metrics import HANDLER_ERRORS
+
+    client = async_app.bolt_app.client
+    latencies = []
+    preload_scripts(async_app.redis_manager)
+
+    async def ack():
+        pass
+
+    async def run_user(index):
+        user_id = f"U{index:04d}"
+
+        async def say(text):
+            await client.chat_postMessage(channel=f"D{user_id}", text=text)
+
+        for i in range(args.messages):
+            started = time.perf_counter()
+            await async_app.handle_message(event=message_event(user_id, QUESTIONS[i % len(QUESTIONS)]), say=say,
+                                           ack=ack, client=client)
+            latencies.append(time.perf_counter() - started)
+
+    async def run():
+        await async_app.redis_manager.initialize()
+        started = time.perf_counter()
+        await asyncio.gather(*[run_user(index) for index in range(args.users)])
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(run())
+    return elapsed, latencies, HANDLER_ERRORS.value(handler="event:handle_message")
+
+
+def handle_message_section(args, slack, openai_server):
+    if args.mode == "async":
+        elapsed, latencies, errors = bench_async_handle_message(args)
+    else:
+        elapsed, latencies, errors = bench_handle_message(args)
+    return {
+        "mode": args.mode,
+        "users": args.users,
+        "messages": len(latencies),
+        "elapsed_s": elapsed,
+        "messages_per_s": len(latencies) / elapsed,
+        "latency": summarize(latencies),
+        "errors": errors,
+        "slack_calls": dict(slack.stats),
+        "openai_calls": dict(openai_server.stats),
+    }
+
+
+STARTUP_SCRIPT = '''
+import json
+import time
+
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter() - started
+
+import open_ai
+
+started = time.perf_counter()
+open_ai.prewarm()
+print(json.dumps({{"import": imported, "prewarm": time.perf_counter() - started}}))
+'''
+
+
+def startup_section(args):
+    # 이미 import 된 모듈의 영향을 받지 않도록 매번 새 인터프리터에서 잽니다
+    module = "async_app" if args.mode == "async" else "app"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    runs = []
+    for _ in range(args.startup_runs):
+        output = subprocess.check_output([sys.executable, "-c", STARTUP_SCRIPT.format(module=module)], env=env,
+                                         text=True)
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "module": module,
+        "import": summarize([run["import"] for run in runs]),
+        "prewarm": summarize([run["prewarm"] for run in runs]),
+    }
+
+
+def make_history(length, seed=0):
+    rng = random.Random(seed)
+    messages = []
+    for i in range(length):
+        role = "user" if i % 2 == 0 else "assistant"
+        content = " ".join(rng.choice(QUESTIONS) for _ in range(1 if role == "user" else 4))
+        messages.append({"role": role, "content": content})
+    return messages
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def tokens_section(args):
+    from config import SYSTEM_MESSAGE
+    from open_ai import num_tokens_from_messages, num_prompt_tokens, context_token_counts
+
+    results = []
+    for length in args.history:
+        messages = [SYSTEM_MESSAGE] + make_history(length)
+        context = {"messages": messages[1:]}
+        context_token_counts(context)
+        results.append({
+            "history": length,
+            # 매 턴 전체 히스토리를 다시 인코딩하는 경우
+            "num_tokens_from_messages": timed(lambda: num_tokens_from_messages(messages), args.repeat),
+            # context["tokens"] 에 저장된 메시지별 토큰 수를 쓰는 경우 (handle_message 경로)
+            "num_prompt_tokens": timed(lambda: num_prompt_tokens(SYSTEM_MESSAGE, context_token_counts(context)),
+                                       args.repeat),
+        })
+    return results
+
+
+def write_usage_log(path, lines, users=50, seed=0):
+    from utils import now, date_to_str
+    from context import USAGE_SCHEMA_VERSION
+
+    rng = random.Random(seed)
+    today = now()
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            date = date_to_str(today.replace(day=rng.randint(1, today.day)))
+            f.write(json.dumps(usage_record(rng, date, USAGE_SCHEMA_VERSION, users), separators=(",", ":")) + "\n")
+
+
+def usage_record(rng, date, version, users):
+    tokens = rng.randint(100, 3000)
+    # context.LoggingManager.record 와 같은 모양 (값이 0 인 필드는 생략)
+    return {"v": version, "date": date, "user": f"U{rng.randrange(users):04d}", "tokens": tokens,
+            "process_time": round(rng.uniform(1, 20), 3), "feature": "chat", "channel": "D0",
+            "model": "gpt-3.5-turbo-0301", "prompt_tokens": tokens - 200, "completion_tokens": 200,
+            "first_token_time": 0.4}
+
+
+def logs_section(args):
+    import extract_logs
+    from utils import now, date_to_str
+    from context import USAGE_SCHEMA_VERSION
+
+    results = []
+    path = os.path.join("logs", "usage.log")
+    for lines in args.log_lines:
+        write_usage_log(path, lines)
+        extract_logs._tailer = extract_logs.UsageLogTailer()
+        cold = timed(extract_logs.stats_for_this_month, 1)
+        warm = timed(extract_logs.stats_for_this_month, args.repeat)
+        # 새로 100줄이 추가된 뒤의 poll
+        rng = random.Random(lines)
+        with open(path, "a", encoding="utf-8") as f:
+            for _ in range(100):
+                record = usage_record(rng, date_to_str(now()), USAGE_SCHEMA_VERSION, 50)
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        incremental = timed(extract_logs.stats_for_this_month, 1)
+        results.append({
+            "lines": lines,
+            "bytes": os.path.getsize(path),
+            "cold": cold,
+            "warm": warm,
+            "incremental_100_lines": incremental,
+        })
+    os.remove(path)
+    extract_logs._tailer = extract_logs.UsageLogTailer()
+    return results
+
+
+def redis_section(args, redis_host, redis_port):
+    from cache import RedisManager
+
+    manager = RedisManager(host=redis_host, port=redis_port, db=args.redis_db)
+    preload_scripts(manager)
+    context = {"messages": make_history(12), "tokens": [40] * 12}
+    keys = [f"U{i:04d}" for i in range(100)]
+    # 대화는 hash (begin_turn / end_turn), 그 외 값은 문자열 키 (get / set / mget) 로 저장됩니다
+    for key in keys:
+        manager.save_conversation(prefix="user", key=key, context=context)
+        manager.set(prefix="bench", key=key, value=context)
+
+    def turn():
+        key = random.choice(keys)
+        current, lock = manager.begin_turn(prefix="user", key=key)
+        manager.end_turn(prefix="user", key=key, context=current, lock=lock)
+
+    return {
+        "get": timed(lambda: manager.get(prefix="bench", key=random.choice(keys)), args.repeat),
+        "set": timed(lambda: manager.set(prefix="bench", key=random.choice(keys), value=context), args.repeat),
+        "mget_10": timed(lambda: manager.mget(prefix="bench", keys=random.sample(keys, 10)), args.repeat),
+        "turn": timed(turn, args.repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--only", nargs="+", choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument("--mode", choices=("sync", "async"), default="sync")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--messages", type=int, default=5, help="messages per user")
+    parser.add_argument("--tokens-per-sec", type=float, default=50)
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--completion-tokens", type=int, default=60)
+    parser.add_argument("--slack-latency", type=float, default=0.02)
+    parser.add_argument("--history", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--log-lines", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--startup-runs", type=int, default=5)
+    parser.add_argument("--redis-host")
+    parser.add_argument("--redis-port", type=int, default=6379)
+    parser.add_argument("--redis-db", type=int, default=15)
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+
+    slack = FakeSlack(latency=args.slack_latency).start()
+    openai_server = FakeOpenAI(tokens_per_sec=args.tokens_per_sec, first_token_latency=args.first_token_latency,
+                               completion_tokens=args.completion_tokens).start()
+    redis_host, redis_port, stop_redis = start_redis(args.redis_host, args.redis_port)
+    workdir = prepare(args, slack, openai_server, redis_host, redis_port)
+
+    result = {
+        "meta": {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "redis": f"{args.redis_host}:{args.redis_port}" if args.redis_host else "fakeredis",
+            "workdir": workdir,
+            "args": vars(args),
+        },
+    }
+    try:
+        if "startup" in args.only:
+            result["startup"] = startup_section(args)
+        if "handle_message" in args.only:
+            result["handle_message"] = handle_message_section(args, slack, openai_server)
+        if "tokens" in args.only:
+            result["tokens"] = tokens_section(args)
+        if "logs" in args.only:
+            result["logs"] = logs_section(args)
+        if "redis" in args.only:
+            result["redis"] = redis_section(args, redis_host, redis_port)
+    finally:
+        slack.stop()
+        openai_server.stop()
+        stop_redis()
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
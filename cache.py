@@ -1,32 +1,685 @@
 import json
+import uuid
+import zlib
+import hashlib
+import unicodedata
+import asyncio
+import threading
+import time
+from collections import OrderedDict
 import redis
+import redis.asyncio as aioredis
+from metrics import REDIS_LATENCY, register_stats
 
 
-class RedisManager:
-    def __init__(self, host, port, db):
-        self.rd = redis.StrictRedis(host=host, port=port, db=db)
-        self.rd.flushdb()
+def _encode(value):
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False).encode('utf-8')
+    elif isinstance(value, str):
+        value = value.encode('utf-8')
+    elif isinstance(value, bool):
+        value = int(value)
+    return value
 
+
+def _decode(result):
+    if result is not None:
+        if isinstance(result, bytes):
+            result = result.decode('utf-8')
+        try:
+            result = json.loads(result)
+        except json.JSONDecodeError:
+            pass
+    return result
+
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 저장 포맷의 첫 바이트 (버전 바이트). 헤더가 없는 값은 이전 포맷(JSON / utf-8 문자열)으로 읽습니다.
+# 제어 문자(0x01~0x08)만 사용하므로 기존 JSON, 문자열 값의 첫 바이트와 겹치지 않습니다.
+_FORMATS = {
+    ("json", "zlib"): 0x01,
+    ("json", "zstd"): 0x02,
+    ("msgpack", None): 0x03,
+    ("msgpack", "zlib"): 0x04,
+    ("msgpack", "zstd"): 0x05,
+}
+_FORMAT_BY_BYTE = {byte: fmt for fmt, byte in _FORMATS.items()}
+
+
+class Codec:
+    # Redis 에 저장되는 값의 직렬화/압축 방식입니다.
+    # serializer: json | msgpack, compression: None | zlib | zstd (threshold 바이트 이상일 때만 압축)
+    # json + 비압축은 이전 포맷 그대로 저장하므로 구버전 워커와 함께 배포할 수 있습니다.
+    def __init__(self, serializer="json", compression=None, threshold=1024, level=3):
+        if (serializer, compression) not in _FORMATS and (serializer, compression) != ("json", None):
+            raise ValueError(f"Unsupported codec: {serializer}/{compression}")
+        if serializer == "msgpack" and msgpack is None:
+            raise ValueError("msgpack codec requires the `msgpack` package")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression requires the `zstandard` package")
+        self.serializer = serializer
+        self.compression = compression
+        self.threshold = threshold
+        self.level = level
+
+    def _serialize(self, value):
+        if self.serializer == "msgpack":
+            return msgpack.packb(value, use_bin_type=True)
+        return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+    def encode(self, value):
+        data = self._serialize(value)
+        compression = self.compression if len(data) >= self.threshold else None
+        if compression == "zlib":
+            data = zlib.compress(data, self.level)
+        elif compression == "zstd":
+            data = zstandard.ZstdCompressor(level=self.level).compress(data)
+        elif self.serializer == "json":
+            return _encode(value)
+        return bytes([_FORMATS[(self.serializer, compression)]]) + data
+
+    @staticmethod
+    def decode(data):
+        # 포맷이 섞여 있어도 (마이그레이션 중) 첫 바이트로 구분해서 읽습니다
+        if not isinstance(data, bytes) or not data or data[0] not in _FORMAT_BY_BYTE:
+            return _decode(data)
+        serializer, compression = _FORMAT_BY_BYTE[data[0]]
+        data = data[1:]
+        if compression == "zlib":
+            data = zlib.decompress(data)
+        elif compression == "zstd":
+            data = zstandard.ZstdDecompressor().decompress(data)
+        if serializer == "msgpack":
+            return msgpack.unpackb(data, raw=False)
+        return json.loads(data)
+
+
+# 대화 하나는 {prefix}:{key} 해시 하나에 저장되고, 응답 중인 대화는 lock:{prefix}:{key} 락으로 표시됩니다.
+# 해시의 version 필드는 context 를 쓸 때마다 새로 만드는 임의의 토큰입니다.
+# 대화 조회(없으면 생성)와 락 획득(SET NX PX)을 한 번의 왕복으로 처리합니다.
+# 호출자가 로컬 캐시에 가진 version(ARGV[5])이 현재 값과 같으면 context 본문은 보내지 않습니다.
+# 반환값: {대화 존재 여부, 락 획득 여부, version, context 또는 ''}
+_BEGIN_TURN_SCRIPT = """
+local current = redis.call('HMGET', KEYS[1], 'context', 'version')
+local context, version = current[1], current[2]
+if not context then
+    if ARGV[1] == '' then
+        return {0, 0, '', ''}
+    end
+    context, version = ARGV[1], ARGV[6]
+    redis.call('HSET', KEYS[1], 'context', context, 'version', version)
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+version = version or ''
+if version ~= '' and version == ARGV[5] then
+    context = ''
+end
+if redis.call('SET', KEYS[2], ARGV[3], 'NX', 'PX', ARGV[4]) then
+    return {1, 1, version, context}
+end
+return {1, 0, version, context}
+"""
+
+# 락을 가진 경우에만 context 를 저장하고 락을 해제합니다 (lease 를 잃었다면 다른 응답을 덮어쓰지 않습니다)
+_END_TURN_SCRIPT = """
+if redis.call('GET', KEYS[2]) ~= ARGV[2] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'context', ARGV[1], 'version', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('DEL', KEYS[2])
+return 1
+"""
+
+# 락은 owner token 이 일치할 때만 해제/연장합니다
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_RENEW_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# 락 경합 카운터 (프로세스 누적)
+lock_stats = {
+    "acquired": 0,
+    "contended": 0,
+    "renewed": 0,
+    "lost": 0,
+    "released": 0,
+}
+register_stats("redis_conversation_locks_total", "Conversation lock outcomes", lock_stats)
+
+
+def event_keys(body):
+    # Slack 재전송은 같은 event_id 로, 같은 유저 메시지는 같은 client_msg_id 로 들어옵니다
+    keys = []
+    if body.get("event_id"):
+        keys.append(f"id:{body['event_id']}")
+    client_msg_id = (body.get("event") or {}).get("client_msg_id")
+    if client_msg_id:
+        keys.append(f"msg:{client_msg_id}")
+    return keys
+
+
+class ConversationLock:
+    # 대화별 lease 락입니다. 프로세스가 죽으면 ttl(초) 후 자동으로 풀리고,
+    # 스트리밍 중에는 start_keep_alive 가 ttl/3 마다 lease 를 연장합니다 (release 시 중단).
+    # 락 값은 "{worker_id}:{uuid}" 라서 여러 워커 중 누가 대화를 맡고 있는지 확인할 수 있습니다.
+    def __init__(self, manager, name, ttl, token=None):
+        self.manager = manager
+        self.name = name
+        self.ttl = ttl
+        self.token = token or ":".join(filter(None, [manager.worker_id, uuid.uuid4().hex]))
+        self.acquired = False
+        self.lost = False
+        self._stop = None
+
+    def acquire(self):
+        self.acquired = bool(self.manager.rd.set(self.name, self.token, nx=True, px=int(self.ttl * 1000)))
+        lock_stats["acquired" if self.acquired else "contended"] += 1
+        return self.acquired
+
+    def renew(self):
+        if self.manager._renew_lock(keys=[self.name], args=[self.token, int(self.ttl * 1000)]):
+            lock_stats["renewed"] += 1
+            return True
+        self.lost = True
+        lock_stats["lost"] += 1
+        return False
+
+    def release(self):
+        self.stop_keep_alive()
+        if not self.acquired:
+            return
+        self.acquired = False
+        lock_stats["released"] += 1
+        self.manager._release_lock(keys=[self.name], args=[self.token])
+
+    def _keep_alive(self, stop):
+        while not stop.wait(self.ttl / 3):
+            if not self.renew():
+                break
+
+    def start_keep_alive(self):
+        self._stop = threading.Event()
+        threading.Thread(target=self._keep_alive, args=(self._stop,), daemon=True).start()
+
+    def stop_keep_alive(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+
+
+class AsyncConversationLock(ConversationLock):
+    async def acquire(self):
+        self.acquired = bool(await self.manager.rd.set(self.name, self.token, nx=True, px=int(self.ttl * 1000)))
+        lock_stats["acquired" if self.acquired else "contended"] += 1
+        return self.acquired
+
+    async def renew(self):
+        if await self.manager._renew_lock(keys=[self.name], args=[self.token, int(self.ttl * 1000)]):
+            lock_stats["renewed"] += 1
+            return True
+        self.lost = True
+        lock_stats["lost"] += 1
+        return False
+
+    async def release(self):
+        self.stop_keep_alive()
+        if not self.acquired:
+            return
+        self.acquired = False
+        lock_stats["released"] += 1
+        await self.manager._release_lock(keys=[self.name], args=[self.token])
+
+    async def _keep_alive(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            if not await self.renew():
+                break
+
+    def start_keep_alive(self):
+        self._stop = asyncio.get_running_loop().create_task(self._keep_alive())
+
+    def stop_keep_alive(self):
+        if self._stop is not None:
+            self._stop.cancel()
+            self._stop = None
+
+
+class LocalCache:
+    # 프로세스 내 LRU + TTL 캐시입니다 (RedisManager 앞단).
+    # Redis 에서 읽은 것과 같은 bytes 를 저장하고, 읽을 때마다 decode 해서 호출자가 수정해도 안전합니다.
+    def __init__(self, maxsize=1024, ttl=60, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.stats = {}  # prefix -> {"hits", "misses"}
+        self._data = OrderedDict()  # name -> (expires_at, raw)
+        self._lock = threading.Lock()
+
+    def _count(self, prefix, hit):
+        stat = self.stats.setdefault(prefix, {"hits": 0, "misses": 0})
+        stat["hits" if hit else "misses"] += 1
+
+    def get(self, prefix, name, count=True):
+        """Returns (hit, raw)."""
+        with self._lock:
+            item = self._data.get(name)
+            if item is not None and item[0] > self.clock():
+                self._data.move_to_end(name)
+                if count:
+                    self._count(prefix, True)
+                return True, item[1]
+            if item is not None:
+                del self._data[name]
+            if count:
+                self._count(prefix, False)
+            return False, None
+
+    def put(self, name, raw, ttl=None):
+        if raw is None:
+            return self.invalidate(name)
+        if not isinstance(raw, bytes):
+            raw = str(raw).encode('utf-8')
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._data[name] = (self.clock() + ttl, raw)
+            self._data.move_to_end(name)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, name):
+        with self._lock:
+            self._data.pop(name, None)
+
+    def get_versioned(self, prefix, name):
+        """Returns (version, raw) stored by put_versioned, or (b"", None). Hits are counted by the caller."""
+        hit, item = self.get(prefix, name, count=False)
+        if not hit:
+            return b"", None
+        version, raw = item.split(b":", 1)
+        return version, raw
+
+    def put_versioned(self, name, version, raw, ttl=None):
+        # 대화 context 처럼 Redis 가 version 으로 최신 여부를 확인해주는 값 (version 은 ':' 없는 토큰)
+        self.put(name, version + b":" + raw, ttl)
+
+    def count(self, prefix, hit):
+        with self._lock:
+            self._count(prefix, hit)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def hit_ratio(self):
+        return {prefix: stat["hits"] / max(stat["hits"] + stat["misses"], 1) for prefix, stat in self.stats.items()}
+
+
+class ResultCache:
+    # 입력 내용(정규화한 텍스트)의 해시를 키로 쓰는 결과 캐시입니다 (번역, 이미지 생성 결과).
+    # LocalCache 의 LRU + TTL 을 그대로 쓰며, 같은 키를 동시에 계산하려는 요청은 먼저 들어온 요청을 기다립니다.
+    def __init__(self, maxsize=1024, ttl=86400, stripes=64):
+        self.local = LocalCache(maxsize, ttl)
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._async_locks = None
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(unicodedata.normalize("NFC", str(text)).split())
+
+    def key(self, namespace, *parts):
+        digest = hashlib.sha256("\x1f".join(self.normalize(part) for part in parts).encode('utf-8')).hexdigest()
+        return f"{namespace}:{digest}"
+
+    def get(self, namespace, *parts, count=True):
+        hit, raw = self.local.get(namespace, self.key(namespace, *parts), count)
+        return json.loads(raw) if hit else None
+
+    def put(self, namespace, *parts, value, ttl=None):
+        self.local.put(self.key(namespace, *parts), json.dumps(value, ensure_ascii=False).encode('utf-8'), ttl)
+
+    def _stripe(self, name):
+        return int(name.rsplit(':', 1)[1][:8], 16) % len(self._locks)
+
+    def get_or_compute(self, compute, namespace, *parts):
+        """Returns (value, hit); compute() runs at most once per key at a time."""
+        value = self.get(namespace, *parts)
+        if value is not None:
+            return value, True
+        with self._locks[self._stripe(self.key(namespace, *parts))]:
+            # 기다리는 동안 먼저 들어온 요청이 채웠을 수 있습니다 (통계는 첫 조회만 집계)
+            value = self.get(namespace, *parts, count=False)
+            if value is not None:
+                return value, True
+            value = compute()
+            self.put(namespace, *parts, value=value)
+            return value, False
+
+    async def async_get_or_compute(self, compute, namespace, *parts):
+        value = self.get(namespace, *parts)
+        if value is not None:
+            return value, True
+        if self._async_locks is None:
+            self._async_locks = [asyncio.Lock() for _ in self._locks]
+        async with self._async_locks[self._stripe(self.key(namespace, *parts))]:
+            value = self.get(namespace, *parts, count=False)
+            if value is not None:
+                return value, True
+            value = await compute()
+            self.put(namespace, *parts, value=value)
+            return value, False
+
+
+# 다른 워커에게 로컬 캐시 무효화를 알리는 채널 (메시지: "{origin}|{prefix}:{key}")
+INVALIDATE_CHANNEL = "cache:invalidate"
+
+
+def new_version():
+    return uuid.uuid4().hex
+
+
+class _ConversationCache:
+    # 로컬 캐시가 있으면 대화 context 를 version 과 함께 기억합니다.
+    # begin_turn 은 Redis 에서 version 을 확인하므로 다른 워커가 쓴 context 를 오래된 값으로 읽지 않고,
+    # 바뀌지 않았으면 context 본문을 다시 받지 않습니다 (긴 대화일수록 왕복 크기가 줄어듭니다).
+    def _cached_context(self, prefix, name):
+        if self.local_cache is None:
+            return b"", None
+        return self.local_cache.get_versioned(prefix, name)
+
+    def _fresh_context(self, prefix, name, cached, version, context, expire):
+        if self.local_cache is None:
+            return context
+        hit = context == b"" and cached is not None
+        self.local_cache.count(prefix, hit)
+        if hit:
+            return cached
+        if version:
+            self.local_cache.put_versioned(name, version, context, expire)
+        return context
+
+    def _cache_context(self, name, version, raw, expire):
+        if self.local_cache is not None:
+            self.local_cache.put_versioned(name, version.encode('utf-8'), raw, expire)
+
+
+class RedisManager(_ConversationCache):
+    def __init__(self, host, port, db, max_connections=None, connection_pool=None, lock_ttl=30, codec=None,
+                 local_cache=None, worker_id=None):
+        self.codec = codec or Codec()
+        self.worker_id = worker_id
+        self.pool = connection_pool or redis.ConnectionPool(host=host, port=port, db=db,
+                                                            max_connections=max_connections)
+        self.rd = redis.StrictRedis(connection_pool=self.pool)
+        self.lock_ttl = lock_ttl
+        self._begin_turn = self.rd.register_script(_BEGIN_TURN_SCRIPT)
+        self._end_turn = self.rd.register_script(_END_TURN_SCRIPT)
+        self._release_lock = self.rd.register_script(_RELEASE_LOCK_SCRIPT)
+        self._renew_lock = self.rd.register_script(_RENEW_LOCK_SCRIPT)
+
+        # 선택적인 로컬 캐시 계층 (다른 워커의 쓰기는 pub/sub 으로 무효화)
+        self.local_cache = local_cache
+        self.origin = uuid.uuid4().hex
+        if local_cache is not None:
+            self._pubsub = self.rd.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(**{INVALIDATE_CHANNEL: self._on_invalidate})
+            self._pubsub_thread = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def _on_invalidate(self, message):
+        origin, name = message["data"].decode('utf-8').split('|', 1)
+        if origin != self.origin:
+            self.local_cache.invalidate(name)
+
+    def _write(self, pipe, name, raw=None, expire=None):
+        # 쓰기는 Redis 와 로컬 캐시에 함께 반영하고(write-through), 다른 워커에 무효화를 알립니다
+        if self.local_cache is not None:
+            self.local_cache.put(name, raw, expire)
+            pipe.publish(INVALIDATE_CHANNEL, f"{self.origin}|{name}")
+        pipe.execute()
+
+    @REDIS_LATENCY.timed(op="get")
     def get(self, prefix, key):
-        result = self.rd.get(f"{prefix}:{key}")
-        if result is not None:
-            if isinstance(result, bytes):
-                result = result.decode('utf-8')
-            try:
-                result = json.loads(result)
-            except json.JSONDecodeError:
-                pass
+        name = f"{prefix}:{key}"
+        if self.local_cache is not None:
+            hit, raw = self.local_cache.get(prefix, name)
+            if hit:
+                return self.codec.decode(raw)
+        raw = self.rd.get(name)
+        if self.local_cache is not None and raw is not None:
+            self.local_cache.put(name, raw)
+        return self.codec.decode(raw)
 
-        return result
+    @REDIS_LATENCY.timed(op="mget")
+    def mget(self, prefix, keys):
+        if self.local_cache is None:
+            return [self.codec.decode(result) for result in self.rd.mget([f"{prefix}:{key}" for key in keys])]
+        results = {}
+        for key in keys:
+            hit, raw = self.local_cache.get(prefix, f"{prefix}:{key}")
+            if hit:
+                results[key] = raw
+        missing = [key for key in keys if key not in results]
+        if missing:
+            for key, raw in zip(missing, self.rd.mget([f"{prefix}:{key}" for key in missing])):
+                if raw is not None:
+                    self.local_cache.put(f"{prefix}:{key}", raw)
+                results[key] = raw
+        return [self.codec.decode(results[key]) for key in keys]
 
+    @REDIS_LATENCY.timed(op="set")
     def set(self, prefix, key, value, expire=300):
-        if isinstance(value, (dict, list)):
-            value = json.dumps(value, ensure_ascii=False).encode('utf-8')
-        elif isinstance(value, str):
-            value = value.encode('utf-8')
-        elif isinstance(value, bool):
-            value = int(value)
-        self.rd.set(f"{prefix}:{key}", value, expire)
+        raw = self.codec.encode(value)
+        pipe = self.pipeline()
+        pipe.set(f"{prefix}:{key}", raw, expire)
+        self._write(pipe, f"{prefix}:{key}", raw, expire)
 
+    @REDIS_LATENCY.timed(op="delete")
     def delete(self, prefix, key):
-        self.rd.delete(f"{prefix}:{key}")
+        pipe = self.pipeline()
+        pipe.delete(f"{prefix}:{key}")
+        self._write(pipe, f"{prefix}:{key}")
+
+    def pipeline(self, transaction=False):
+        return self.rd.pipeline(transaction=transaction)
+
+    def lock(self, prefix, key):
+        return ConversationLock(self, f"lock:{prefix}:{key}", self.lock_ttl)
+
+    def claim_event(self, body, ttl):
+        """Returns False if any worker already claimed this event (same event_id or client_msg_id) within ttl."""
+        keys = event_keys(body)
+        if not keys:
+            return True
+        pipe = self.pipeline()
+        for key in keys:
+            pipe.set(f"event:{key}", self.worker_id or "", nx=True, ex=ttl)
+        return all(pipe.execute())
+
+    @REDIS_LATENCY.timed(op="begin_turn")
+    def begin_turn(self, prefix, key, default=None, expire=300):
+        """Returns (context, lock) in one round trip; lock.acquired is False if another turn holds it.
+
+        If the conversation does not exist it is created from `default`, or (None, None) is returned.
+        """
+        name = f"{prefix}:{key}"
+        lock = self.lock(prefix, key)
+        cached_version, cached = self._cached_context(prefix, name)
+        found, acquired, version, context = self._begin_turn(
+            keys=[name, lock.name],
+            args=[self.codec.encode(default) if default else b"", expire, lock.token, int(lock.ttl * 1000),
+                  cached_version, new_version()])
+        if not found:
+            return None, None
+        lock.acquired = bool(acquired)
+        lock_stats["acquired" if lock.acquired else "contended"] += 1
+        return self.codec.decode(self._fresh_context(prefix, name, cached, version, context, expire)), lock
+
+    @REDIS_LATENCY.timed(op="save_conversation")
+    def save_conversation(self, prefix, key, context, expire=300):
+        raw, version = self.codec.encode(context), new_version()
+        pipe = self.pipeline(transaction=True)
+        pipe.hset(f"{prefix}:{key}", mapping={"context": raw, "version": version})
+        pipe.expire(f"{prefix}:{key}", expire)
+        pipe.execute()
+        self._cache_context(f"{prefix}:{key}", version, raw, expire)
+
+    @REDIS_LATENCY.timed(op="end_turn")
+    def end_turn(self, prefix, key, context, lock, expire=300):
+        # context 저장과 락 해제를 한 번의 왕복으로 처리합니다 (락을 잃었으면 저장하지 않고 False)
+        lock.stop_keep_alive()
+        lock.acquired = False
+        raw, version = self.codec.encode(context), new_version()
+        saved = self._end_turn(keys=[f"{prefix}:{key}", lock.name], args=[raw, lock.token, expire, version])
+        lock_stats["released" if saved else "lost"] += 1
+        if saved:
+            self._cache_context(f"{prefix}:{key}", version, raw, expire)
+        return bool(saved)
+
+
+# asyncio 모드용 RedisManager (이벤트 루프가 뜬 뒤 initialize 를 호출해야 합니다)
+class AsyncRedisManager(_ConversationCache):
+    def __init__(self, host, port, db, max_connections=None, connection_pool=None, lock_ttl=30, codec=None,
+                 local_cache=None, worker_id=None):
+        self.codec = codec or Codec()
+        self.worker_id = worker_id
+        self.pool = connection_pool or aioredis.ConnectionPool(host=host, port=port, db=db,
+                                                               max_connections=max_connections)
+        self.rd = aioredis.StrictRedis(connection_pool=self.pool)
+        self.lock_ttl = lock_ttl
+        self._begin_turn = self.rd.register_script(_BEGIN_TURN_SCRIPT)
+        self._end_turn = self.rd.register_script(_END_TURN_SCRIPT)
+        self._release_lock = self.rd.register_script(_RELEASE_LOCK_SCRIPT)
+        self._renew_lock = self.rd.register_script(_RENEW_LOCK_SCRIPT)
+        self.local_cache = local_cache
+        self.origin = uuid.uuid4().hex
+        self._pubsub_task = None
+
+    async def initialize(self):
+        if self.local_cache is not None:
+            pubsub = self.rd.pubsub(ignore_subscribe_messages=True)
+            await pubsub.subscribe(INVALIDATE_CHANNEL)
+            self._pubsub_task = asyncio.get_running_loop().create_task(self._listen(pubsub))
+
+    async def _listen(self, pubsub):
+        async for message in pubsub.listen():
+            if message["type"] != "message":
+                continue
+            origin, name = message["data"].decode('utf-8').split('|', 1)
+            if origin != self.origin:
+                self.local_cache.invalidate(name)
+
+    async def _write(self, pipe, name, raw=None, expire=None):
+        if self.local_cache is not None:
+            self.local_cache.put(name, raw, expire)
+            pipe.publish(INVALIDATE_CHANNEL, f"{self.origin}|{name}")
+        await pipe.execute()
+
+    @REDIS_LATENCY.timed(op="get")
+    async def get(self, prefix, key):
+        name = f"{prefix}:{key}"
+        if self.local_cache is not None:
+            hit, raw = self.local_cache.get(prefix, name)
+            if hit:
+                return self.codec.decode(raw)
+        raw = await self.rd.get(name)
+        if self.local_cache is not None and raw is not None:
+            self.local_cache.put(name, raw)
+        return self.codec.decode(raw)
+
+    @REDIS_LATENCY.timed(op="mget")
+    async def mget(self, prefix, keys):
+        if self.local_cache is None:
+            return [self.codec.decode(result) for result in await self.rd.mget([f"{prefix}:{key}" for key in keys])]
+        results = {}
+        for key in keys:
+            hit, raw = self.local_cache.get(prefix, f"{prefix}:{key}")
+            if hit:
+                results[key] = raw
+        missing = [key for key in keys if key not in results]
+        if missing:
+            for key, raw in zip(missing, await self.rd.mget([f"{prefix}:{key}" for key in missing])):
+                if raw is not None:
+                    self.local_cache.put(f"{prefix}:{key}", raw)
+                results[key] = raw
+        return [self.codec.decode(results[key]) for key in keys]
+
+    @REDIS_LATENCY.timed(op="set")
+    async def set(self, prefix, key, value, expire=300):
+        raw = self.codec.encode(value)
+        pipe = self.pipeline()
+        pipe.set(f"{prefix}:{key}", raw, expire)
+        await self._write(pipe, f"{prefix}:{key}", raw, expire)
+
+    @REDIS_LATENCY.timed(op="delete")
+    async def delete(self, prefix, key):
+        pipe = self.pipeline()
+        pipe.delete(f"{prefix}:{key}")
+        await self._write(pipe, f"{prefix}:{key}")
+
+    def pipeline(self, transaction=False):
+        return self.rd.pipeline(transaction=transaction)
+
+    def lock(self, prefix, key):
+        return AsyncConversationLock(self, f"lock:{prefix}:{key}", self.lock_ttl)
+
+    async def claim_event(self, body, ttl):
+        keys = event_keys(body)
+        if not keys:
+            return True
+        pipe = self.pipeline()
+        for key in keys:
+            pipe.set(f"event:{key}", self.worker_id or "", nx=True, ex=ttl)
+        return all(await pipe.execute())
+
+    @REDIS_LATENCY.timed(op="begin_turn")
+    async def begin_turn(self, prefix, key, default=None, expire=300):
+        name = f"{prefix}:{key}"
+        lock = self.lock(prefix, key)
+        cached_version, cached = self._cached_context(prefix, name)
+        found, acquired, version, context = await self._begin_turn(
+            keys=[name, lock.name],
+            args=[self.codec.encode(default) if default else b"", expire, lock.token, int(lock.ttl * 1000),
+                  cached_version, new_version()])
+        if not found:
+            return None, None
+        lock.acquired = bool(acquired)
+        lock_stats["acquired" if lock.acquired else "contended"] += 1
+        return self.codec.decode(self._fresh_context(prefix, name, cached, version, context, expire)), lock
+
+    @REDIS_LATENCY.timed(op="save_conversation")
+    async def save_conversation(self, prefix, key, context, expire=300):
+        raw, version = self.codec.encode(context), new_version()
+        pipe = self.pipeline(transaction=True)
+        pipe.hset(f"{prefix}:{key}", mapping={"context": raw, "version": version})
+        pipe.expire(f"{prefix}:{key}", expire)
+        await pipe.execute()
+        self._cache_context(f"{prefix}:{key}", version, raw, expire)
+
+    @REDIS_LATENCY.timed(op="end_turn")
+    async def end_turn(self, prefix, key, context, lock, expire=300):
+        lock.stop_keep_alive()
+        lock.acquired = False
+        raw, version = self.codec.encode(context), new_version()
+        saved = await self._end_turn(keys=[f"{prefix}:{key}", lock.name], args=[raw, lock.token, expire, version])
+        lock_stats["released" if saved else "lost"] += 1
+        if saved:
+            self._cache_context(f"{prefix}:{key}", version, raw, expire)
+        return bool(saved)
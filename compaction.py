@@ -0,0 +1,99 @@
+import os
+import sys
+import glob
+import logging
+import threading
+
+import numpy as np
+
+from config import CONFIG
+from utils import current_year_month
+from usage_engine import rollup_path, rollup_records, write_rollup, read_rollup, log_columns
+
+logger = logging.getLogger(__name__)
+
+# rotate 된 사용량 로그 (logs/usage*.log.YYYYMMDD) 를 (유저, 날짜) 별 합계만 담은 고정 길이 바이너리 rollup 으로 압축합니다.
+# 과거 기간 조회(usage_engine)는 rollup 을 mmap 으로 읽고, 원본 텍스트는 감사용으로 남깁니다 (USAGE_ROLLUP.KEEP_RAW).
+#   python compaction.py            아직 압축되지 않은 rotate 된 로그를 모두 압축합니다
+#   python compaction.py validate   rollup 을 원본 로그와 비교합니다 (다르면 exit 1)
+
+_lock = threading.Lock()
+
+
+def rotated_files():
+    return glob.glob("logs/usage*.log.*")
+
+
+def compact(file):
+    """Writes the rollup of a rotated usage log unless an up-to-date one exists. Returns the rollup path."""
+    path = rollup_path(file)
+    source_size = os.path.getsize(file)
+    try:
+        if read_rollup(path)[0] == source_size:
+            return path
+    except (FileNotFoundError, ValueError):
+        pass
+    write_rollup(path, log_columns(file), source_size)
+    return path
+
+
+def validate(file):
+    """Returns a list of problems found comparing the rollup of `file` with the log itself (empty if they match)."""
+    path = rollup_path(file)
+    try:
+        source_size, records = read_rollup(path)
+    except (FileNotFoundError, ValueError) as e:
+        return [str(e)]
+    problems = []
+    if source_size != os.path.getsize(file):
+        problems.append(f"{path}: source size {source_size} != {os.path.getsize(file)}")
+    expected = rollup_records(log_columns(file))
+    if len(records) != len(expected):
+        return problems + [f"{path}: {len(records)} records, expected {len(expected)}"]
+    for field in ("user", "day", "tokens", "count"):
+        mismatched = np.flatnonzero(records[field] != expected[field])
+        if len(mismatched):
+            problems.append(f"{path}: {field} differs in {len(mismatched)} records "
+                            f"(first: {records[mismatched[0]]} != {expected[mismatched[0]]})")
+    if not np.allclose(records["process_time"], expected["process_time"]):
+        problems.append(f"{path}: process_time differs")
+    return problems
+
+
+def remove_raw(file):
+    # 이번 달 로그는 UsageLogTailer 와 usage.py 재집계가 텍스트로 읽으므로, 지난 달 이전의 검증된 원본만 지웁니다
+    if file.rsplit('.', 1)[-1][:6] >= current_year_month():
+        return False
+    problems = validate(file)
+    if problems:
+        logger.warning(f"Keeping {file}: {problems[0]}")
+        return False
+    os.remove(file)
+    return True
+
+
+def compact_all():
+    """Compacts every rotated usage log, then drops validated old raw logs if USAGE_ROLLUP.KEEP_RAW is false."""
+    compacted = []
+    with _lock:
+        for file in sorted(rotated_files()):
+            try:
+                compacted.append(compact(file))
+                if not CONFIG["USAGE_ROLLUP"]["KEEP_RAW"]:
+                    remove_raw(file)
+            except Exception as e:
+                logger.warning(f"Error compacting {file}: {e}")
+    return compacted
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+    if sys.argv[1:] == ["validate"]:
+        failed = 0
+        for file in sorted(rotated_files()):
+            for problem in validate(file):
+                print(problem)
+                failed += 1
+        print(f"{len(rotated_files())} logs checked, {failed} problems")
+        sys.exit(1 if failed else 0)
+    print(f"{len(compact_all())} rollups up to date")
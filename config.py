@@ -1,4 +1,5 @@
 import os
+import socket
 from dotenv import load_dotenv
 
 load_dotenv(verbose=True)
@@ -8,14 +9,110 @@ CONFIG = {
     "SIGNING_SECRET": os.getenv('SIGNING_SECRET'),
     "API_KEY": os.getenv('API_KEY'),
     "APP_TOKEN": os.getenv('APP_TOKEN'),
+    # Slack Web API 주소 (프록시나 로컬 벤치마크용 가짜 서버를 쓸 때 변경, 끝에 / 포함)
+    "SLACK_API_URL": os.getenv('SLACK_API_URL', 'https://www.slack.com/api/'),
+    # true 로 설정하면 AsyncApp + AsyncSocketModeHandler 로 실행합니다
+    "ASYNC_MODE": os.getenv('ASYNC_MODE', 'false').lower() == 'true',
+    # 스트리밍 응답의 chat_update 주기 (초 / 신규 글자 수)
+    "STREAM": {
+        "MIN_INTERVAL": float(os.getenv('STREAM_MIN_INTERVAL', 1.0)),
+        "MIN_CHARS": int(os.getenv('STREAM_MIN_CHARS', 20)),
+    },
+    # 모델별 프롬프트 토큰 예산, 밀려난 대화 요약 여부
+    "CONTEXT": {
+        "TOKEN_BUDGET": {
+            "gpt-3.5-turbo-0301": int(os.getenv('CONTEXT_TOKEN_BUDGET', 2000)),
+            "gpt-4-0314": int(os.getenv('CONTEXT_TOKEN_BUDGET_GPT4', 6000)),
+        },
+        "SUMMARY": os.getenv('CONTEXT_SUMMARY', 'false').lower() == 'true',
+    },
+    # OpenAI 사용량(/v1/usage) 조회: 동시 요청 수, 지난 날짜 캐시 파일, 아직 바뀔 수 있는 오늘 / 어제 데이터 TTL(초)
+    "OPENAI_USAGE": {
+        "URL": os.getenv('OPENAI_USAGE_URL', 'https://api.openai.com/v1/usage'),
+        "WORKERS": int(os.getenv('OPENAI_USAGE_WORKERS', 8)),
+        "CACHE_FILE": os.getenv('OPENAI_USAGE_CACHE_FILE', 'logs/openai_usage.json'),
+        "RECENT_TTL": int(os.getenv('OPENAI_USAGE_RECENT_TTL', 60)),
+    },
+    # 번역 / 이미지 결과 캐시 크기와 TTL(초). IMAGE_TTL=0 이면 이미지 캐시를 사용하지 않습니다.
+    "RESULT_CACHE": {
+        "TRANSLATE_SIZE": int(os.getenv('TRANSLATE_CACHE_SIZE', 1024)),
+        "TRANSLATE_TTL": int(os.getenv('TRANSLATE_CACHE_TTL', 86400)),
+        "IMAGE_SIZE": int(os.getenv('IMAGE_CACHE_SIZE', 256)),
+        "IMAGE_TTL": int(os.getenv('IMAGE_CACHE_TTL', 600)),
+    },
+    # 렌더링된 App Home view 캐시 TTL(초), 사용량이 바뀌면 바로 무효화됩니다
+    "HOME_CACHE_TTL": int(os.getenv('HOME_CACHE_TTL', 3600)),
+    # 사용량 순위 모달 한 페이지에 보여줄 유저 수
+    "RANK_PAGE_SIZE": int(os.getenv('RANK_PAGE_SIZE', 9)),
+    # OpenAI 호출 스케줄러: 전역 분당 요청 수 / 토큰 수, 동시 실행 수, 우선순위 클래스 가중치 (0 보다 커야 합니다).
+    # 동시 실행 수는 응답을 기다리는 요청만 세고, 열린 스트림은 TPM 예산으로만 제한됩니다
+    "OPENAI_SCHEDULER": {
+        "RPM": int(os.getenv('OPENAI_RPM', 3500)),
+        "TPM": int(os.getenv('OPENAI_TPM', 90000)),
+        "MAX_CONCURRENCY": int(os.getenv('OPENAI_MAX_CONCURRENCY', 16)),
+        "CHAT_WEIGHT": int(os.getenv('OPENAI_CHAT_WEIGHT', 4)),
+        "IMAGE_WEIGHT": int(os.getenv('OPENAI_IMAGE_WEIGHT', 1)),
+    },
+    # 스트리밍 응답 재시도: 최대 재시도 횟수, 지수 백오프(초), 첫 토큰 / 청크 사이 제한 시간(초)
+    "OPENAI_RETRY": {
+        "MAX_RETRIES": int(os.getenv('OPENAI_MAX_RETRIES', 3)),
+        "BACKOFF_BASE": float(os.getenv('OPENAI_BACKOFF_BASE', 0.5)),
+        "BACKOFF_CAP": float(os.getenv('OPENAI_BACKOFF_CAP', 8)),
+        "CONNECT_TIMEOUT": float(os.getenv('OPENAI_CONNECT_TIMEOUT', 5)),
+        "FIRST_TOKEN_TIMEOUT": float(os.getenv('OPENAI_FIRST_TOKEN_TIMEOUT', 15)),
+        "STALL_TIMEOUT": float(os.getenv('OPENAI_STALL_TIMEOUT', 20)),
+    },
+    # Prometheus 텍스트 포맷 메트릭 엔드포인트 (GET /metrics, PORT=0 이면 사용하지 않음)
+    "METRICS": {
+        "HOST": os.getenv('METRICS_HOST', '127.0.0.1'),
+        "PORT": int(os.getenv('METRICS_PORT', 9100)),
+    },
+    # 여러 워커 프로세스 (supervisor.py): 워커 수, 이 프로세스의 워커 id, 이벤트 중복 제거 TTL(초),
+    # 헬스 체크 주기(초), 시작 직후 헬스 체크를 미루는 시간(초)
+    "WORKERS": {
+        "COUNT": int(os.getenv('WORKERS', 2)),
+        "ID": os.getenv('WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}",
+        "DEDUPE_TTL": int(os.getenv('EVENT_DEDUPE_TTL', 900)),
+        "HEALTH_INTERVAL": float(os.getenv('WORKER_HEALTH_INTERVAL', 5)),
+        "STARTUP_GRACE": float(os.getenv('WORKER_STARTUP_GRACE', 30)),
+    },
+    # 로그 파일 이름 접미사 (워커마다 logs/usage-w0.log 처럼 따로 쓰고 rotate 합니다)
+    "LOG_SUFFIX": os.getenv('LOG_SUFFIX', ''),
+    # rotate 된 사용량 로그의 바이너리 rollup (compaction.py): 사용 여부, 저장 디렉토리,
+    # 원본 텍스트 보관 여부 (false 면 검증을 통과한 지난 달 이전 원본을 지웁니다)
+    "USAGE_ROLLUP": {
+        "ENABLED": os.getenv('USAGE_ROLLUP', 'true').lower() == 'true',
+        "DIR": os.getenv('USAGE_ROLLUP_DIR', 'logs/rollups'),
+        "KEEP_RAW": os.getenv('USAGE_ROLLUP_KEEP_RAW', 'true').lower() == 'true',
+    },
+    # 그림 생성 작업: 동시에 실행할 워커 수, 대기열 최대 길이
+    "IMAGE_JOBS": {
+        "WORKERS": int(os.getenv('IMAGE_JOB_WORKERS', 2)),
+        "MAX_DEPTH": int(os.getenv('IMAGE_JOB_MAX_DEPTH', 20)),
+    },
     "REDIS": {
         "HOST": os.getenv('REDIS_HOST'),
         "PORT": os.getenv('REDIS_PORT'),
         "DB": os.getenv('REDIS_DB'),
+        "MAX_CONNECTIONS": int(os.getenv('REDIS_MAX_CONNECTIONS', 50)),
+        # 대화 락 lease (초): 프로세스가 죽으면 이 시간 뒤에 락이 풀립니다
+        "LOCK_TTL": int(os.getenv('REDIS_LOCK_TTL', 30)),
+        # 저장 포맷: json | msgpack, 압축: zlib | zstd (COMPRESS_THRESHOLD 바이트 이상일 때만)
+        "CODEC": os.getenv('REDIS_CODEC', 'json'),
+        "COMPRESSION": os.getenv('REDIS_COMPRESSION') or None,
+        "COMPRESS_THRESHOLD": int(os.getenv('REDIS_COMPRESS_THRESHOLD', 1024)),
+        # 프로세스 내 LRU 캐시 크기 (0 이면 사용하지 않음) / TTL(초)
+        "LOCAL_CACHE_SIZE": int(os.getenv('REDIS_LOCAL_CACHE_SIZE', 0)),
+        "LOCAL_CACHE_TTL": int(os.getenv('REDIS_LOCAL_CACHE_TTL', 60)),
+        # 사용량 카운터 / 순위는 대화와 분리된 DB 에 저장합니다
+        "USAGE_DB": os.getenv('REDIS_USAGE_DB', 1),
+        # 그림 작업 큐 DB (기본값: 사용량 DB)
+        "JOB_DB": os.getenv('REDIS_JOB_DB', os.getenv('REDIS_USAGE_DB', 1)),
     }
 }
 
 ## Slack Request Message
 WATING_MESSAGE = "잠시만 기다려주세요... :hourglass_flowing_sand:"
+INTERRUPTED_MESSAGE = ":warning: 응답이 중간에 끊겼습니다. 다시 질문해주세요."
 INITIAL_MESSAGE = {"role": "assistant", "content": "안녕하세요! 지피티선생님입니다. 무엇이든 물어보세요. :smile:"}
 SYSTEM_MESSAGE = {"role": "system", "content": "You are a helpful PHD professor talking to your students"}
@@ -1,24 +1,116 @@
+import os
+import json
 import time
 import logging
+import threading
+import contextvars
 from logging.handlers import TimedRotatingFileHandler
+from config import CONFIG
+from utils import now, date_to_str
 
 _logger = logging.getLogger(__name__)
 _logger.setLevel(logging.INFO)
-_timedfilehandler = TimedRotatingFileHandler(filename='logs/usage.log', when='midnight', interval=1, encoding='utf-8')
-_timedfilehandler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
+# 사용량 날짜(UsageRollup, 순위, 기간 조회)는 UTC 기준이므로 rotate 도 UTC 자정에 합니다.
+# 프로세스마다 자기 파일을 rotate 하도록 워커별 파일에 씁니다 (여러 프로세스가 한 파일을 rename 하면 로그가 유실됩니다)
+_timedfilehandler = TimedRotatingFileHandler(filename=f'logs/usage{CONFIG["LOG_SUFFIX"]}.log', when='midnight',
+                                             interval=1, encoding='utf-8', utc=True)
+# 한 줄에 JSON 레코드 하나 (LoggingManager.record 참고). 이전 포맷 줄은 extract_logs 가 그대로 읽습니다.
+_timedfilehandler.setFormatter(logging.Formatter('%(message)s'))
 _timedfilehandler.suffix = "%Y%m%d"
 
+
+def _compact_rotated():
+    # numpy 를 쓰는 압축 모듈은 처음 rotate 할 때 불러옵니다
+    from compaction import compact_all
+
+    compact_all()
+
+
+def _rotate(source, dest):
+    # 기본 rotator 처럼 원본이 없으면(지워졌거나 다른 프로세스가 먼저 옮긴 경우) 건너뜁니다
+    if not os.path.exists(source):
+        return
+    os.rename(source, dest)
+    if CONFIG["USAGE_ROLLUP"]["ENABLED"]:
+        # 끝난 날의 로그를 바이너리 rollup 으로 압축합니다 (logging 핸들러 안이므로 별도 스레드에서)
+        threading.Thread(target=_compact_rotated, daemon=True).start()
+
+
+_timedfilehandler.rotator = _rotate
+
 _logger.addHandler(_timedfilehandler)
 
+USAGE_SCHEMA_VERSION = 2
+
+_usage_hooks = []
+
+# 현재 처리 중인 요청의 LoggingManager (OpenAI 스케줄러가 owner 와 대기 시간 기록에 사용)
+current_usage = contextvars.ContextVar("current_usage", default=None)
+
+
+def add_usage_hook(hook):
+    # LoggingManager 가 끝날 때마다 hook(usage) 가 호출됩니다 (사용량 카운터 등)
+    _usage_hooks.append(hook)
+
 
 class LoggingManager:
-    def __init__(self, user_id):
+    def __init__(self, user_id, owner=None, feature="chat", channel=None):
         self.user_id = user_id
+        # OpenAI 스케줄러의 공정 분배 단위 (채널 대화는 채널, 그 외에는 유저)
+        self.owner = owner or user_id
+        self.feature = feature
+        self.channel = channel
+        self.model = None
         self.tokens = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        # 컨텍스트 윈도우로 줄인 프롬프트 토큰 수
+        self.saved_tokens = 0
+        # OpenAI 스케줄러 대기 시간 (초)
+        self.queue_time = 0
+        # 스트리밍 첫 토큰까지 걸린 시간 (초)
+        self.first_token_time = None
+        # 스트리밍 재시도 횟수와 재시도로 늘어난 시간 (초)
+        self.retries = 0
+        self.retry_time = 0
+
+    def record(self):
+        """Returns the usage record written to logs/usage.log as one JSON line (unset fields are omitted)."""
+        # 집계에 쓰는 필드(date/user/tokens/process_time)는 항상 씁니다
+        record = {
+            "v": USAGE_SCHEMA_VERSION,
+            "date": date_to_str(now()),
+            "user": self.user_id,
+            "tokens": self.tokens,
+            "process_time": round(self.process_time, 3),
+        }
+        details = {
+            "feature": self.feature,
+            "channel": self.channel,
+            "model": self.model,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "saved_tokens": self.saved_tokens,
+            "queue_time": round(self.queue_time, 3),
+            "first_token_time": None if self.first_token_time is None else round(self.first_token_time, 3),
+        }
+        record.update((k, v) for k, v in details.items() if v is not None)
+        if self.retries:
+            record["retries"] = self.retries
+            record["retry_time"] = round(self.retry_time, 3)
+        return record
 
     def __enter__(self):
         self.start_time = time.time()
+        self._token = current_usage.set(self)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        _logger.info(f"{self.user_id}/{self.tokens}/{time.time() - self.start_time}")
+        self.process_time = time.time() - self.start_time
+        current_usage.reset(self._token)
+        _logger.info(json.dumps(self.record(), ensure_ascii=False, separators=(",", ":")))
+        for hook in _usage_hooks:
+            try:
+                hook(self)
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Error running usage hook: {e}")
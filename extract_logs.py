@@ -1,69 +1,170 @@
+import os
 import re
+import json
 import glob
+import threading
 from utils import current_year_month, current_month_range
 
 
 def log_files():
-    files = ["logs/usage.log"]
-    files += glob.glob(f"logs/usage.log.{current_year_month()}*")
+    # 워커별 로그 (usage-w0.log 등) 와 이번 달에 rotate 된 파일을 모두 읽습니다
+    files = glob.glob("logs/usage*.log")
+    files += glob.glob(f"logs/usage*.log.{current_year_month()}*")
+    return files
+
+
+def log_files_between(start, end):
+    # usage.log.YYYYMMDD 는 그 날짜의 기록이므로, start ~ end ("YYYY-MM-DD") 에 걸친 rotate 된 파일만 고릅니다
+    files = glob.glob("logs/usage*.log")
+    first, last = start.replace('-', ''), end.replace('-', '')
+    for file in glob.glob("logs/usage*.log.*"):
+        if first <= file.rsplit('.', 1)[-1][:8] <= last:
+            files.append(file)
     return files
 
 
 def parse_log_content(log_content):
-    id, token, process_time = log_content.split('/')
+    # user/tokens/seconds 뒤에 추가 필드(saved tokens 등)가 붙을 수 있습니다
+    id, token, process_time = log_content.split('/')[:3]
     return {"id": id, "tokens": int(token), "process_time": round(float(process_time), 2)}
 
 
-def stats_for_this_month():
-    pattern = r"(\d{4}-\d{2}-\d{2})\s\d{2}:\d{2}:\d{2},\d{3}\s\w+:\s(.+)"
-    files = log_files()
+LOG_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2})\s\d{2}:\d{2}:\d{2},\d{3}\s\w+:\s(.+)")
+
+
+def parse_record(record):
+    # JSONL 레코드 (context.LoggingManager.record) 에 이전 포맷과 같은 키를 채워줍니다
+    record["timestamp"] = record["date"]
+    record["id"] = record["user"]
+    record["process_time"] = round(record["process_time"], 2)
+    return record
+
+
+def parse_line(line):
+    # 새 포맷은 정규식 없이 json.loads 로 바로 읽고, 이전 포맷 줄만 정규식으로 파싱합니다
+    if line.startswith('{'):
+        return parse_record(json.loads(line))
+    match = LOG_PATTERN.search(line)
+    if not match:
+        return None
+    timestamp, log_content = match.groups()
+    return {"timestamp": timestamp, **parse_log_content(log_content)}
+
+
+def parse_lines(lines):
+    """Yields usage logs from an iterable of lines, one json.loads per JSONL record; malformed lines are skipped."""
+    for line in lines:
+        try:
+            log = parse_line(line.strip())
+        except Exception as e:
+            print(e)
+            continue
+        if log is not None:
+            yield log
+
+
+def parse_logs(files):
     logs = []
-    user_ids = set()
     for file in files:
         try:
-            with open(file, "r") as f:
-                lines = [line.strip() for line in f.readlines()]
-                for line in lines:
-                    match = re.search(pattern, line)
-                    if not match:
-                        continue
-                    timestamp, log_content = match.groups()
-                    log_content = parse_log_content(log_content)
-                    user_ids.add(log_content['id'])
-                    logs.append({"timestamp": timestamp, **log_content})
+            # 파일 전체를 읽지 않고 한 줄씩 읽습니다
+            with open(file, "r", encoding="utf-8") as f:
+                logs += parse_lines(f)
         except Exception as e:
             print(e)
             pass
+    return logs
 
-    result = []
-    total_tokens = 0
-    total_process_time = 0
 
-    for user_id in user_ids:
+class UsageLogTailer:
+    # 파일별 (inode, offset) 체크포인트를 기억해서 새로 추가된 줄만 읽는 증분 파서입니다.
+    # TimedRotatingFileHandler 는 자정에 usage.log 를 usage.log.YYYYMMDD 로 rename 하므로
+    # 체크포인트를 경로가 아닌 inode 기준으로 저장해 rotate 된 파일의 남은 부분만 이어서 읽습니다.
+    def __init__(self, files=log_files):
+        self.files = files
+        self._checkpoints = {}  # (st_dev, st_ino) -> (offset, head)
+        self._aggregate = {}  # (date, user_id) -> [tokens, process_time]
+        self._month = None
+        self._lock = threading.Lock()
+
+    def _read(self, file, offset):
+        # 한 줄씩 읽으므로 한 번에 많은 줄이 추가되어도 메모리는 한 줄 크기로 제한됩니다
+        with open(file, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                # 아직 쓰는 중인 마지막 줄은 다음 호출에서 읽습니다
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                for log in parse_lines((line.decode("utf-8"),)):
+                    stat = self._aggregate.setdefault((log['timestamp'], log['id']), [0, 0])
+                    stat[0] += log['tokens']
+                    stat[1] += log['process_time']
+        return offset
+
+    @staticmethod
+    def _head(file, size=64):
+        with open(file, "rb") as f:
+            return f.read(size)
+
+    def poll(self):
+        """Parses only the lines appended since the last call and returns the running aggregate."""
+        with self._lock:
+            month = current_year_month()
+            if month != self._month:
+                # 달이 바뀌면 지난 달 집계는 버립니다
+                prefix = f"{month[:4]}-{month[4:]}"
+                self._aggregate = {k: v for k, v in self._aggregate.items() if k[0].startswith(prefix)}
+                self._month = month
+
+            checkpoints = {}
+            for file in self.files():
+                try:
+                    st = os.stat(file)
+                    offset, head = self._checkpoints.get((st.st_dev, st.st_ino), (0, b""))
+                    # 파일이 잘렸거나 inode 가 재사용된 경우 처음부터 다시 읽습니다
+                    if st.st_size < offset or (head and self._head(file, len(head)) != head):
+                        offset, head = 0, b""
+                    if st.st_size > offset:
+                        offset = self._read(file, offset)
+                        head = head or self._head(file)
+                    checkpoints[(st.st_dev, st.st_ino)] = (offset, head)
+                except FileNotFoundError:
+                    continue
+            self._checkpoints = checkpoints
+            return {k: tuple(v) for k, v in self._aggregate.items()}
+
+
+_tailer = UsageLogTailer()
+
+
+def stats_for_this_month():
+    aggregate = _tailer.poll()
+    users = {}
+    for (date, user_id), stat in aggregate.items():
+        users.setdefault(user_id, {})[date] = stat
+
+    result = []
+    for user_id, days in users.items():
         date_result = []
         for date in current_month_range():
-            date_obj = {
+            tokens, process_time = days.get(date, (0, 0))
+            date_result.append({
                 "date": date,
-                "tokens": 0,
-                "process_time": 0,
-            }
-            for log in logs:
-                if log['timestamp'] == date and log['id'] == user_id:
-                    date_obj['tokens'] += log['tokens']
-                    date_obj['process_time'] += log['process_time']
-                    total_tokens += log['tokens']
-                    total_process_time += log['process_time']
-            date_obj['process_time'] = round(date_obj['process_time'], 2)
-            date_result.append(date_obj)
-        user_obj = {
+                "tokens": tokens,
+                "process_time": round(process_time, 2),
+            })
+        result.append({
             "user_id": user_id,
             "date": date_result,
-        }
-        result.append(user_obj)
+        })
     return result
 
 
-def user_stats(user_id):
+def user_stats(user_id, rollup=None):
+    # rollup(usage.UsageRollup) 이 있으면 미리 집계된 카운터로 조회합니다
+    if rollup is not None:
+        return rollup.user_stats(user_id, current_month_range())
     result = stats_for_this_month()
     filtered_list = list(filter(lambda x: x['user_id'] == user_id, result))
     if not filtered_list:
@@ -75,7 +176,9 @@ def user_stats(user_id):
     return user_date_list, user_total_token, user_total_process_time
 
 
-def rank_stats():
+def rank_stats(rollup=None):
+    if rollup is not None:
+        return rollup.rank_stats(current_month_range())
     result = stats_for_this_month()
     new_list = [{
         "user_id": x['user_id'],
@@ -0,0 +1,254 @@
+import json
+import time
+import uuid
+import asyncio
+import logging
+import threading
+
+import redis
+import redis.asyncio as aioredis
+from metrics import QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    # Redis 리스트 기반 작업 큐 + 고정 크기 워커 스레드.
+    # {name}:queue (대기, LPUSH / RPOPLPUSH), {name}:processing:{worker_id} (실행 중), {name}:{job_id} (상태 hash)
+    # 여러 프로세스가 같은 queue 를 나눠 가지며, 각 프로세스는 {name}:worker:{worker_id} 하트비트를 갱신합니다.
+    # 하트비트가 끊긴 프로세스(와 자신의 이전 실행)의 processing 에 남은 작업은 queue 로 되돌려 다시 실행합니다.
+    def __init__(self, host, port, db, name, handler, workers=2, max_depth=20, status_ttl=86400,
+                 worker_id=None, heartbeat_ttl=30):
+        self.rd = redis.StrictRedis(host=host, port=port, db=db)
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.max_depth = max_depth
+        self.status_ttl = status_ttl
+        self.worker_id = worker_id
+        self.heartbeat_ttl = heartbeat_ttl
+        self._threads = []
+        self._stop = threading.Event()
+
+    def _key(self, suffix):
+        return f"{self.name}:{suffix}"
+
+    def _processing(self):
+        return self._key(f"processing:{self.worker_id}" if self.worker_id else "processing")
+
+    def submit(self, payload):
+        """Queues a job. Returns (job_id, position) or (None, depth) if the queue is full."""
+        depth = self.rd.llen(self._key("queue"))
+        if depth >= self.max_depth:
+            return None, depth
+        job_id = uuid.uuid4().hex
+        pipe = self.rd.pipeline(transaction=True)
+        pipe.hset(self._key(job_id), mapping={
+            "status": "queued",
+            "payload": json.dumps(payload, ensure_ascii=False),
+            "created": time.time(),
+        })
+        pipe.lpush(self._key("queue"), job_id)
+        _, position = pipe.execute()
+        return job_id, position
+
+    def status(self, job_id):
+        return {k.decode('utf-8'): v.decode('utf-8') for k, v in self.rd.hgetall(self._key(job_id)).items()}
+
+    def depth(self):
+        return self.rd.llen(self._key("queue"))
+
+    def _owner(self, key):
+        # {name}:processing -> None (worker_id 없이 돌던 이전 버전), {name}:processing:{worker_id} -> worker_id
+        owner = key.decode('utf-8')[len(self._key("processing")) + 1:]
+        return owner or None
+
+    def recover(self, own=False):
+        """Re-queues jobs left in processing lists of stopped workers (and this worker's own list if `own`)."""
+        # 자기 processing 리스트는 start() 에서 한 번만 (이전 실행이 남긴 것) 되찾습니다. 주기적인 점검에서는
+        # 지금 실행 중인 작업이므로 건드리지 않고, 다른 워커의 리스트는 하트비트가 끊긴 경우에만 되찾습니다.
+        recovered = 0
+        for key in self.rd.scan_iter(match=self._key("processing*")):
+            owner = self._owner(key)
+            if owner is not None and owner == self.worker_id:
+                if not own:
+                    continue
+            elif owner is not None and self.rd.exists(self._key(f"worker:{owner}")):
+                continue
+            while self.rd.rpoplpush(key, self._key("queue")) is not None:
+                recovered += 1
+        return recovered
+
+    def heartbeat(self):
+        self.rd.set(self._key(f"worker:{self.worker_id}"), time.time(), ex=self.heartbeat_ttl)
+
+    def _watch(self):
+        while not self._stop.wait(self.heartbeat_ttl / 3):
+            try:
+                self.heartbeat()
+                recovered = self.recover()
+                if recovered:
+                    logger.warning(f"Recovered {recovered} jobs from stopped workers of {self.name}")
+            except Exception as e:
+                logger.error(f"Error updating heartbeat: {e}")
+
+    def start(self):
+        if self.worker_id:
+            self.heartbeat()
+        recovered = self.recover(own=True)
+        if recovered:
+            logger.warning(f"Recovered {recovered} pending jobs from {self.name}")
+        targets = [self._work] * self.workers + ([self._watch] if self.worker_id else [])
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self.worker_id:
+            self.rd.delete(self._key(f"worker:{self.worker_id}"))
+
+    def _work(self):
+        while not self._stop.is_set():
+            job_id = self.rd.brpoplpush(self._key("queue"), self._processing(), timeout=1)
+            if job_id is None:
+                continue
+            job_id = job_id.decode('utf-8')
+            payload, created = self.rd.hmget(self._key(job_id), "payload", "created")
+            if payload is None:
+                self.rd.lrem(self._processing(), 1, job_id)
+                continue
+            started = time.time()
+            QUEUE_WAIT.observe(started - float(created), queue=self.name)
+            self.rd.hset(self._key(job_id), mapping={"status": "running", "started": started})
+            try:
+                self.handler(json.loads(payload))
+                status = {"status": "done", "finished": time.time()}
+            except Exception as e:
+                status = {"status": "failed", "error": str(e), "finished": time.time()}
+            pipe = self.rd.pipeline(transaction=True)
+            pipe.hset(self._key(job_id), mapping=status)
+            pipe.expire(self._key(job_id), self.status_ttl)
+            pipe.lrem(self._processing(), 1, job_id)
+            pipe.execute()
+
+
+class AsyncJobQueue:
+    # JobQueue 와 같은 키 구조를 쓰는 asyncio 버전 (워커는 이벤트 루프의 task 입니다)
+    def __init__(self, host, port, db, name, handler, workers=2, max_depth=20, status_ttl=86400,
+                 worker_id=None, heartbeat_ttl=30):
+        self.rd = aioredis.StrictRedis(host=host, port=port, db=db)
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.max_depth = max_depth
+        self.status_ttl = status_ttl
+        self.worker_id = worker_id
+        self.heartbeat_ttl = heartbeat_ttl
+        self._tasks = []
+
+    def _key(self, suffix):
+        return f"{self.name}:{suffix}"
+
+    def _processing(self):
+        return self._key(f"processing:{self.worker_id}" if self.worker_id else "processing")
+
+    def _owner(self, key):
+        owner = key.decode('utf-8')[len(self._key("processing")) + 1:]
+        return owner or None
+
+    async def submit(self, payload):
+        """Queues a job. Returns (job_id, position) or (None, depth) if the queue is full."""
+        depth = await self.rd.llen(self._key("queue"))
+        if depth >= self.max_depth:
+            return None, depth
+        job_id = uuid.uuid4().hex
+        pipe = self.rd.pipeline(transaction=True)
+        pipe.hset(self._key(job_id), mapping={
+            "status": "queued",
+            "payload": json.dumps(payload, ensure_ascii=False),
+            "created": time.time(),
+        })
+        pipe.lpush(self._key("queue"), job_id)
+        _, position = await pipe.execute()
+        return job_id, position
+
+    async def status(self, job_id):
+        return {k.decode('utf-8'): v.decode('utf-8') for k, v in (await self.rd.hgetall(self._key(job_id))).items()}
+
+    async def depth(self):
+        return await self.rd.llen(self._key("queue"))
+
+    async def recover(self, own=False):
+        recovered = 0
+        async for key in self.rd.scan_iter(match=self._key("processing*")):
+            owner = self._owner(key)
+            if owner is not None and owner == self.worker_id:
+                if not own:
+                    continue
+            elif owner is not None and await self.rd.exists(self._key(f"worker:{owner}")):
+                continue
+            while await self.rd.rpoplpush(key, self._key("queue")) is not None:
+                recovered += 1
+        return recovered
+
+    async def heartbeat(self):
+        await self.rd.set(self._key(f"worker:{self.worker_id}"), time.time(), ex=self.heartbeat_ttl)
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_ttl / 3)
+            try:
+                await self.heartbeat()
+                recovered = await self.recover()
+                if recovered:
+                    logger.warning(f"Recovered {recovered} jobs from stopped workers of {self.name}")
+            except Exception as e:
+                logger.error(f"Error updating heartbeat: {e}")
+
+    async def start(self):
+        if self.worker_id:
+            await self.heartbeat()
+        recovered = await self.recover(own=True)
+        if recovered:
+            logger.warning(f"Recovered {recovered} pending jobs from {self.name}")
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+        if self.worker_id:
+            self._tasks.append(loop.create_task(self._watch()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.worker_id:
+            await self.rd.delete(self._key(f"worker:{self.worker_id}"))
+
+    async def _work(self):
+        while True:
+            job_id = await self.rd.brpoplpush(self._key("queue"), self._processing(), timeout=1)
+            if job_id is None:
+                continue
+            job_id = job_id.decode('utf-8')
+            payload, created = await self.rd.hmget(self._key(job_id), "payload", "created")
+            if payload is None:
+                await self.rd.lrem(self._processing(), 1, job_id)
+                continue
+            started = time.time()
+            QUEUE_WAIT.observe(started - float(created), queue=self.name)
+            await self.rd.hset(self._key(job_id), mapping={"status": "running", "started": started})
+            try:
+                await self.handler(json.loads(payload))
+                status = {"status": "done", "finished": time.time()}
+            except Exception as e:
+                status = {"status": "failed", "error": str(e), "finished": time.time()}
+            pipe = self.rd.pipeline(transaction=True)
+            pipe.hset(self._key(job_id), mapping=status)
+            pipe.expire(self._key(job_id), self.status_ttl)
+            pipe.lrem(self._processing(), 1, job_id)
+            await pipe.execute()
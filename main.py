@@ -0,0 +1,24 @@
+import time
+import asyncio
+
+from config import CONFIG
+from metrics import STARTUP_TIME, add_health_check
+
+# 실행 모드에 따라 필요한 앱 모듈만 import 합니다 (ASYNC_MODE=true 이면 asyncio 모드)
+if __name__ == "__main__":
+    if CONFIG["ASYNC_MODE"]:
+        started = time.perf_counter()
+        from async_app import main
+
+        STARTUP_TIME.set(time.perf_counter() - started, phase="import")
+        asyncio.run(main())
+    else:
+        started = time.perf_counter()
+        from slack_bolt.adapter.socket_mode import SocketModeHandler
+        from app import bolt_app, start_background_workers
+
+        STARTUP_TIME.set(time.perf_counter() - started, phase="import")
+        start_background_workers()
+        handler = SocketModeHandler(bolt_app, CONFIG["APP_TOKEN"])
+        add_health_check(handler.client.is_connected)
+        handler.start()
@@ -0,0 +1,365 @@
+import time
+import logging
+import inspect
+import functools
+import threading
+import contextvars
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# 지금 실행 중인 Bolt 핸들러 이름 (핸들러 안에서 남긴 에러 로그를 핸들러별로 집계합니다)
+current_handler = contextvars.ContextVar("current_handler", default=None)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines += self._render_value(key, value)
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += 1
+            state[2] += value
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def timed(self, **labels):
+        """Decorator observing the duration of every call (sync or async)."""
+        def decorator(func):
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def wrapper(*args, **kwargs):
+                    with self.time(**labels):
+                        return await func(*args, **kwargs)
+            else:
+                @functools.wraps(func)
+                def wrapper(*args, **kwargs):
+                    with self.time(**labels):
+                        return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _render_value(self, key, value):
+        counts, count, total = value
+        lines = []
+        cumulative = 0
+        for bound, bucket in zip(self.buckets + (float("inf"),), counts + [count - sum(counts)]):
+            cumulative += bucket
+            labels = _format_labels(self.label_names, key, [("le", _format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_count{labels} {count}")
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.elapsed = time.perf_counter() - self.start
+        self.histogram.observe(self.elapsed, **self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._get_or_create(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        return self._get_or_create(Gauge, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help, labels, buckets)
+
+    def register_collector(self, collector):
+        # collector() 는 렌더링할 때마다 호출되어 Metric 목록을 돌려줍니다 (기존 통계 dict 노출용)
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines += metric.render()
+        for collector in self._collectors:
+            try:
+                for metric in collector():
+                    lines += metric.render()
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Error collecting metrics: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def register_stats(name, help, stats, label="kind"):
+    """Exposes a module-level stats dict ({kind: count}) as a counter with one sample per key."""
+    def collect():
+        metric = Counter(name, help, (label,))
+        for kind, value in list(stats.items()):
+            metric.inc(value, **{label: kind})
+        return [metric]
+
+    registry.register_collector(collect)
+
+
+def register_cache_stats(name, help, *caches):
+    """Exposes LocalCache.stats ({prefix: {"hits", "misses"}}) as a counter labelled by prefix and result."""
+    def collect():
+        metric = Counter(name, help, ("prefix", "result"))
+        for cache in caches:
+            for prefix, stat in list(cache.stats.items()):
+                for result, value in stat.items():
+                    metric.inc(value, prefix=prefix, result=result)
+        return [metric]
+
+    registry.register_collector(collect)
+
+
+# 공통 지표
+HANDLER_LATENCY = registry.histogram("bolt_handler_duration_seconds", "Bolt listener duration", ("handler",))
+HANDLER_ERRORS = registry.counter("bolt_handler_errors_total", "Errors raised or logged by Bolt listeners",
+                                  ("handler",))
+TIME_TO_FIRST_TOKEN = registry.histogram("openai_time_to_first_token_seconds",
+                                         "Time from sending a chat completion to its first content chunk")
+COMPLETION_TIME = registry.histogram("openai_completion_seconds", "Total streamed chat completion time")
+ACTIVE_STREAMS = registry.gauge("openai_active_streams", "Chat completions currently streaming")
+QUEUE_WAIT = registry.histogram("queue_wait_seconds", "Time spent waiting in a queue", ("queue",))
+SLACK_LATENCY = registry.histogram("slack_api_duration_seconds", "Slack Web API call latency", ("method",))
+REDIS_LATENCY = registry.histogram("redis_op_duration_seconds", "RedisManager operation latency", ("op",))
+STARTUP_TIME = registry.gauge("app_startup_seconds", "Seconds spent in each startup phase (import, prewarm)",
+                              ("phase",))
+TOKENIZER_TIME = registry.histogram("tokenizer_duration_seconds", "tiktoken encode time",
+                                    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05))
+
+
+def instrument_handler(func, name):
+    # Bolt 는 inspect.unwrap 으로 원래 함수의 인자 이름을 읽으므로 functools.wraps 로 감싸면 그대로 주입됩니다
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            token = current_handler.set(name)
+            try:
+                with HANDLER_LATENCY.time(handler=name):
+                    return await func(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(handler=name)
+                raise
+            finally:
+                current_handler.reset(token)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = current_handler.set(name)
+            try:
+                with HANDLER_LATENCY.time(handler=name):
+                    return func(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(handler=name)
+                raise
+            finally:
+                current_handler.reset(token)
+    return wrapper
+
+
+def instrument_client(client):
+    # WebClient 의 모든 메서드(chat_update 등)는 api_call 을 거치므로 인스턴스의 api_call 만 감쌉니다
+    api_call = client.api_call
+    if inspect.iscoroutinefunction(api_call):
+        async def timed_api_call(api_method, *args, **kwargs):
+            with SLACK_LATENCY.time(method=api_method):
+                return await api_call(api_method, *args, **kwargs)
+    else:
+        def timed_api_call(api_method, *args, **kwargs):
+            with SLACK_LATENCY.time(method=api_method):
+                return api_call(api_method, *args, **kwargs)
+    client.api_call = timed_api_call
+    return client
+
+
+def instrument(bolt_app):
+    """Wraps the listener decorators of a Bolt App/AsyncApp so every handler registered afterwards is timed.
+
+    Also times every Slack Web API call, including the per-request clients Bolt hands to listeners.
+    """
+    instrument_client(bolt_app.client)
+    if inspect.iscoroutinefunction(bolt_app.client.api_call):
+        async def instrument_request_client(client, next):
+            instrument_client(client)
+            await next()
+    else:
+        def instrument_request_client(client, next):
+            instrument_client(client)
+            next()
+    bolt_app.use(instrument_request_client)
+
+    for kind in ("event", "message", "command", "action", "view", "shortcut", "options"):
+        register = getattr(bolt_app, kind)
+
+        def decorator(*args, register=register, kind=kind, **kwargs):
+            listener = register(*args, **kwargs)
+
+            def wrap(*functions):
+                return listener(*[instrument_handler(func, f"{kind}:{func.__name__}") for func in functions])
+            return wrap
+
+        setattr(bolt_app, kind, decorator)
+    return bolt_app
+
+
+class HandlerErrorCounter(logging.Handler):
+    # 핸들러는 예외를 잡아서 logger.error 로 남기므로, 에러 로그를 현재 핸들러 기준으로 셉니다
+    def __init__(self):
+        super().__init__(logging.ERROR)
+
+    def emit(self, record):
+        handler = current_handler.get()
+        if handler is not None:
+            HANDLER_ERRORS.inc(handler=handler)
+
+
+# /healthz 가 확인할 함수들 (예: Socket Mode 연결 여부). 하나라도 False 면 503 을 돌려줍니다
+health_checks = []
+
+
+def add_health_check(check):
+    health_checks.append(check)
+
+
+def healthy():
+    for check in health_checks:
+        try:
+            if not check():
+                return False
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Error running health check: {e}")
+            return False
+    return True
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == "/healthz":
+            ok = healthy()
+            self._send(200 if ok else 503, b"ok\n" if ok else b"unhealthy\n", "text/plain; charset=utf-8")
+            return
+        if path != "/metrics":
+            self.send_error(404)
+            return
+        self._send(200, registry.render().encode('utf-8'), "text/plain; version=0.0.4; charset=utf-8")
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(host, port):
+    """Serves GET /metrics in Prometheus text format and GET /healthz from a daemon thread. Returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
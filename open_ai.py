@@ -1,13 +1,35 @@
-import openai
-import requests
-import tiktoken
-from utils import current_month_range
+import os
+import json
+import time
+import random
+import asyncio
+import functools
+import logging
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils import current_month_range, date_to_str, now
+from cache import ResultCache
 from config import CONFIG
+from scheduler import scheduler
+from context import current_usage
+from metrics import TIME_TO_FIRST_TOKEN, COMPLETION_TIME, ACTIVE_STREAMS, TOKENIZER_TIME, STARTUP_TIME, \
+    register_stats, register_cache_stats
+
+logger = logging.getLogger(__name__)
 
 # 발급받은 OpenAI API Key 기입
 API_KEY = CONFIG.get("API_KEY")
 
-openai.api_key = API_KEY
+
+# openai (requests / aiohttp 포함) 와 tiktoken 은 import 비용이 커서 처음 쓸 때 불러옵니다.
+# 앱 시작 시 start_prewarm() 이 이벤트를 받기 전에 백그라운드 스레드에서 미리 불러옵니다.
+@functools.lru_cache(maxsize=None)
+def _openai():
+    import openai
+
+    openai.api_key = API_KEY
+    return openai
 
 
 def format_conversation(content, role='user'):
@@ -17,33 +39,190 @@ def format_conversation(content, role='user'):
     }
 
 
-def check_token_price_this_month():
-    days_of_month = current_month_range()
-    url = 'https://api.openai.com/v1/usage'
-    headers = {
+@functools.lru_cache(maxsize=None)
+def _usage_session():
+    # 사용량 조회용 keep-alive 세션 (날짜별 요청이 연결을 재사용합니다)
+    import requests
+    import requests.adapters
+
+    session = requests.Session()
+    session.headers.update({
         'Authorization': f'Bearer {API_KEY}',
         'Content-Type': 'application/json'
-    }
-    total_tokens = 0
-    for date in days_of_month:
-        params = {
-            'date': date,
-        }
-        response = requests.get(url, headers=headers, params=params)
-
-        if response.status_code == 200:
-            result = response.json()
-            # 사용량 조회 결과 처리
-            for data in result['data']:
-                total_tokens += data.get('n_context_tokens_total', 0)
-                total_tokens += data.get('n_generated_tokens_total', 0)
-        else:
-            raise Exception(f"Error: {response.status_code} {response.text}")
+    })
+    session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=CONFIG["OPENAI_USAGE"]["WORKERS"]))
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=CONFIG["OPENAI_USAGE"]["WORKERS"]))
+    return session
+
+
+_usage_lock = threading.Lock()
+_usage_cache = None  # 그제 이전 날짜 -> 토큰 수 (끝난 날짜는 바뀌지 않으므로 디스크에 영구 저장)
+# 오늘 / 어제 날짜 -> (토큰 수, 조회 시각). 어제 집계도 자정 직후에는 아직 늘어날 수 있으므로 TTL 동안만 씁니다
+_usage_recent = {}
+
+
+def _fetch_usage_tokens(date):
+    response = _usage_session().get(CONFIG["OPENAI_USAGE"]["URL"], params={'date': date}, timeout=30)
+
+    if response.status_code == 200:
+        result = response.json()
+        # 사용량 조회 결과 처리
+        tokens = 0
+        for data in result['data']:
+            tokens += data.get('n_context_tokens_total', 0)
+            tokens += data.get('n_generated_tokens_total', 0)
+        return tokens
+    else:
+        raise Exception(f"Error: {response.status_code} {response.text}")
+
+
+def _try_fetch_usage_tokens(date):
+    # 하루 조회가 실패해도 나머지 날짜의 합계는 돌려줍니다 (실패한 날은 캐시하지 않고 다음 조회에서 다시 가져옵니다)
+    try:
+        return _fetch_usage_tokens(date)
+    except Exception as e:
+        logger.warning(f"Error fetching OpenAI usage for {date}: {e}")
+        return None
+
+
+def _load_usage_cache():
+    global _usage_cache
+    if _usage_cache is None:
+        try:
+            with open(CONFIG["OPENAI_USAGE"]["CACHE_FILE"], "r") as f:
+                _usage_cache = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            _usage_cache = {}
+    return _usage_cache
+
+
+def _save_usage_cache():
+    path = CONFIG["OPENAI_USAGE"]["CACHE_FILE"]
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(_usage_cache, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def check_token_price_this_month():
+    return check_token_price(current_month_range())
+
+
+def check_token_price(dates):
+    """Returns (tokens, dollars, failed_dates) of the organisation's OpenAI usage over the given dates ("YYYY-MM-DD").
+
+    Days whose usage could not be fetched are listed in failed_dates and left out of the totals.
+    """
+    today = now()
+    recent = {date_to_str(today), date_to_str(today - datetime.timedelta(days=1))}
+    with _usage_lock:
+        cache = {date: tokens for date, tokens in _load_usage_cache().items() if date not in recent}
+        for date, (tokens, fetched_at) in _usage_recent.items():
+            if date in recent and time.time() - fetched_at < CONFIG["OPENAI_USAGE"]["RECENT_TTL"]:
+                cache[date] = tokens
+
+    # 캐시에 없는 날짜만 제한된 개수의 스레드로 동시에 조회합니다
+    missing = [date for date in dates if date not in cache]
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(CONFIG["OPENAI_USAGE"]["WORKERS"], len(missing))) as executor:
+            fetched = dict(zip(missing, executor.map(_try_fetch_usage_tokens, missing)))
+        fetched = {date: tokens for date, tokens in fetched.items() if tokens is not None}
+        cache.update(fetched)
+        with _usage_lock:
+            past = {date: tokens for date, tokens in fetched.items() if date not in recent}
+            if past:
+                _load_usage_cache().update(past)
+                _save_usage_cache()
+            for date in list(_usage_recent):
+                if date not in recent:
+                    del _usage_recent[date]
+            for date in recent & fetched.keys():
+                _usage_recent[date] = (fetched[date], time.time())
+
+    failed = [date for date in dates if date not in cache]
+    total_tokens = sum(cache.get(date, 0) for date in dates)
     # model: gpt-3.5-turbo 기준 pricing
-    return total_tokens, (total_tokens * 0.0000027)
+    return total_tokens, (total_tokens * 0.0000027), failed
+
 
+class _SettlingStream:
+    # 스트리밍 응답은 끝까지 읽거나 닫을 때 스케줄러 자리를 반납합니다.
+    # 반납할 때 프롬프트 + 받은 청크 수(청크 하나가 토큰 하나)로 TPM 예산을 정산합니다 (응답에 usage 가 있으면 그 값).
+    def __init__(self, iterator, slot, prompt_tokens):
+        self._iterator = iterator
+        self.slot = slot
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = 0
+        self.usage = None
+
+    def _count(self, chunk):
+        if chunk["choices"][0].get("delta", {}).get("content"):
+            self.completion_tokens += 1
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        return chunk
+
+    def _release(self):
+        if self.usage is not None and "total_tokens" in self.usage:
+            self.slot.release(self.usage["total_tokens"])
+        else:
+            self.slot.release(self.prompt_tokens + self.completion_tokens)
 
-def send(messages, model="gpt-3.5-turbo-0301", max_tokens=500, temperature=0.7, stream=False):
+
+class _ReleasingStream(_SettlingStream):
+    # generator 의 finally 는 한 번도 읽지 않은 채 닫으면 실행되지 않으므로 close() 에서 직접 반납합니다.
+    def __init__(self, response, slot, prompt_tokens):
+        super().__init__(iter(response), slot, prompt_tokens)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return self._count(next(self._iterator))
+        except BaseException:
+            self._release()
+            raise
+
+    def close(self):
+        self._release()
+        close = getattr(self._iterator, "close", None)
+        if close is not None:
+            close()
+
+
+class _AsyncReleasingStream(_SettlingStream):
+    def __init__(self, response, slot, prompt_tokens):
+        super().__init__(response.__aiter__(), slot, prompt_tokens)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return self._count(await self._iterator.__anext__())
+        except BaseException:
+            self._release()
+            raise
+
+    async def aclose(self):
+        self._release()
+        close = getattr(self._iterator, "aclose", None)
+        if close is not None:
+            await close()
+
+
+def _record_usage(model, usage=None):
+    # 현재 LoggingManager 에 모델과 prompt / completion 토큰을 기록합니다 (스트리밍은 호출한 쪽에서 기록)
+    current = current_usage.get()
+    if current is not None:
+        current.model = model
+        if usage:
+            current.prompt_tokens += usage.get("prompt_tokens", 0)
+            current.completion_tokens += usage.get("completion_tokens", 0)
+
+
+def send(messages, model="gpt-3.5-turbo-0301", max_tokens=500, temperature=0.7, stream=False, prompt_tokens=None,
+         request_timeout=None, kind="chat"):
     data = {
         "model": model,
         "messages": messages,
@@ -51,17 +230,214 @@ def send(messages, model="gpt-3.5-turbo-0301", max_tokens=500, temperature=0.7,
         "max_tokens": max_tokens,
         "stream": stream,
     }
-    return openai.ChatCompletion.create(**data)
+    if request_timeout is not None:
+        # (connect, read) 소켓 타임아웃: 스트리밍 중에는 청크 사이의 최대 대기 시간이 됩니다
+        data["request_timeout"] = request_timeout
+    # 프롬프트 + 최대 응답 토큰으로 TPM 예산을 잡고, 응답의 usage 로 정산합니다
+    if prompt_tokens is None:
+        prompt_tokens = num_tokens_from_messages(messages, model)
+    slot = scheduler.acquire(kind, prompt_tokens + max_tokens)
+    try:
+        response = _openai().ChatCompletion.create(**data)
+    except Exception:
+        slot.release()
+        raise
+    if stream:
+        # 스트림이 열렸으면 동시 실행 자리는 돌려주고, 토큰 예산은 스트림이 끝날 때 정산합니다
+        slot.stream_opened()
+        _record_usage(model)
+        return _ReleasingStream(response, slot, prompt_tokens)
+    slot.release(response["usage"]["total_tokens"])
+    _record_usage(model, response["usage"])
+    return response
 
 
-def num_tokens_from_messages(messages, model="gpt-3.5-turbo-0301"):
-    """Returns the number of tokens used by a list of messages."""
+async def async_send(messages, model="gpt-3.5-turbo-0301", max_tokens=500, temperature=0.7, stream=False,
+                     prompt_tokens=None, request_timeout=None, kind="chat"):
+    data = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "stream": stream,
+    }
+    if prompt_tokens is None:
+        await async_load_encodings([model])
+        prompt_tokens = num_tokens_from_messages(messages, model)
+    slot = await scheduler.async_acquire(kind, prompt_tokens + max_tokens)
+    try:
+        # aiohttp 의 timeout 은 전체 시간 기준이라 스트림에는 맞지 않으므로 응답 헤더까지만 기다립니다
+        response = await asyncio.wait_for(_openai().ChatCompletion.acreate(**data), request_timeout)
+    except BaseException:
+        slot.release()
+        raise
+    # stream=True 인 경우 async generator 를 반환
+    if stream:
+        slot.stream_opened()
+        _record_usage(model)
+        return _AsyncReleasingStream(response, slot, prompt_tokens)
+    slot.release(response["usage"]["total_tokens"])
+    _record_usage(model, response["usage"])
+    return response
+
+
+class StreamTimeout(Exception):
+    pass
+
+
+@functools.lru_cache(maxsize=None)
+def retryable_errors():
+    # except 절은 예외가 났을 때만 평가되므로 openai 를 미리 import 하지 않아도 됩니다
+    import aiohttp
+    import requests
+
+    error = _openai().error
+    return (error.RateLimitError, error.APIError, error.ServiceUnavailableError, error.Timeout, error.TryAgain,
+            error.APIConnectionError, requests.exceptions.RequestException, aiohttp.ClientError,
+            asyncio.TimeoutError, StreamTimeout)
+
+# 프로세스 전체 누적 카운터 (튜닝용)
+retry_stats = {
+    "retries": 0,
+    "retry_time": 0.0,
+    "interrupted": 0,
+    "failed": 0,
+}
+register_stats("openai_stream_retries_total", "Streaming completion retries, interruptions and failures", retry_stats)
+
+# 이미 보여준 답변이 있는 상태에서 스트림이 끊기면 이 finish_reason 으로 마무리합니다
+INTERRUPTED = "interrupted"
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2 ** attempt))."""
+    retry = CONFIG["OPENAI_RETRY"]
+    return random.uniform(0, min(retry["BACKOFF_CAP"], retry["BACKOFF_BASE"] * 2 ** attempt))
+
+
+def _interrupted_chunk():
+    return {"choices": [{"delta": {}, "finish_reason": INTERRUPTED}]}
+
+
+def _record_first_token(elapsed):
+    TIME_TO_FIRST_TOKEN.observe(elapsed)
+    usage = current_usage.get()
+    if usage is not None:
+        usage.first_token_time = elapsed
+
+
+def _record_retry(started):
+    elapsed = time.monotonic() - started
+    retry_stats["retries"] += 1
+    retry_stats["retry_time"] += elapsed
+    usage = current_usage.get()
+    if usage is not None:
+        usage.retries += 1
+        usage.retry_time += elapsed
+
+
+def stream_with_retry(messages, **kwargs):
+    """Yields completion chunks like send(stream=True), retrying until the first content arrives.
+
+    Rate limits, 5xx, connection errors and a missed first-token deadline are retried with jittered
+    backoff. Once content has been yielded the stream is never restarted; a failure then ends it with a
+    chunk whose finish_reason is INTERRUPTED so the caller can keep the partial answer.
+    """
+    retry = CONFIG["OPENAI_RETRY"]
+    attempt = 0
+    while True:
+        started = time.monotonic()
+        received = False
+        try:
+            # 동기 클라이언트는 소켓 read timeout 으로 청크 사이 멈춤을 감지하고, 첫 토큰 제한은 도착 시각으로 확인합니다
+            response = send(messages, stream=True, request_timeout=(
+                retry["CONNECT_TIMEOUT"], max(retry["FIRST_TOKEN_TIMEOUT"], retry["STALL_TIMEOUT"])), **kwargs)
+            ACTIVE_STREAMS.inc()
+            try:
+                opened = time.monotonic()
+                for chunk in response:
+                    if not received:
+                        if time.monotonic() - opened > retry["FIRST_TOKEN_TIMEOUT"]:
+                            raise StreamTimeout("first token deadline exceeded")
+                        received = bool(chunk["choices"][0].get("delta", {}).get("content"))
+                        if received:
+                            _record_first_token(time.monotonic() - opened)
+                    yield chunk
+                COMPLETION_TIME.observe(time.monotonic() - opened)
+            finally:
+                ACTIVE_STREAMS.dec()
+                response.close()
+            return
+        except retryable_errors():
+            if received:
+                retry_stats["interrupted"] += 1
+                yield _interrupted_chunk()
+                return
+            if attempt >= retry["MAX_RETRIES"]:
+                retry_stats["failed"] += 1
+                raise
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+            _record_retry(started)
+
+
+async def async_stream_with_retry(messages, **kwargs):
+    retry = CONFIG["OPENAI_RETRY"]
+    attempt = 0
+    while True:
+        started = time.monotonic()
+        received = False
+        try:
+            response = await async_send(messages, stream=True, request_timeout=retry["FIRST_TOKEN_TIMEOUT"], **kwargs)
+            ACTIVE_STREAMS.inc()
+            try:
+                # 스케줄러 대기 시간은 제외하고, 요청을 보낸 뒤부터 첫 토큰 제한 시간을 잽니다 (동기 버전과 같은 기준)
+                opened = time.monotonic()
+                iterator = response.__aiter__()
+                while True:
+                    # 첫 토큰 전에는 남은 첫 토큰 제한 시간, 이후에는 청크 사이 제한 시간만큼 기다립니다
+                    if received:
+                        timeout = retry["STALL_TIMEOUT"]
+                    else:
+                        timeout = max(retry["FIRST_TOKEN_TIMEOUT"] - (time.monotonic() - opened), 0)
+                    try:
+                        chunk = await asyncio.wait_for(iterator.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise StreamTimeout("stream stalled" if received else "first token deadline exceeded")
+                    if not received:
+                        received = bool(chunk["choices"][0].get("delta", {}).get("content"))
+                        if received:
+                            _record_first_token(time.monotonic() - opened)
+                    yield chunk
+                COMPLETION_TIME.observe(time.monotonic() - opened)
+            finally:
+                ACTIVE_STREAMS.dec()
+                await response.aclose()
+            return
+        except retryable_errors():
+            if received:
+                retry_stats["interrupted"] += 1
+                yield _interrupted_chunk()
+                return
+            if attempt >= retry["MAX_RETRIES"]:
+                retry_stats["failed"] += 1
+                raise
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+            _record_retry(started)
+
+
+@functools.lru_cache(maxsize=None)
+def token_params(model):
+    """Returns (model, tokens_per_message, tokens_per_name) used for counting tokens of the given model."""
     if model == "gpt-3.5-turbo":
         print("Warning: gpt-3.5-turbo may change over time. Returning num tokens assuming gpt-3.5-turbo-0301.")
-        return num_tokens_from_messages(messages, model="gpt-3.5-turbo-0301")
+        return token_params("gpt-3.5-turbo-0301")
     elif model == "gpt-4":
         print("Warning: gpt-4 may change over time. Returning num tokens assuming gpt-4-0314.")
-        return num_tokens_from_messages(messages, model="gpt-4-0314")
+        return token_params("gpt-4-0314")
     elif model == "gpt-3.5-turbo-0301":
         tokens_per_message = 4  # every message follows <|start|>{role/name}\n{content}<|end|>\n
         tokens_per_name = -1  # if there's a name, the role is omitted
@@ -70,36 +446,206 @@ def num_tokens_from_messages(messages, model="gpt-3.5-turbo-0301"):
         tokens_per_name = 1
     else:
         raise NotImplementedError(f"""num_tokens_from_messages() is not implemented for model {model}. See https://github.com/openai/openai-python/blob/main/chatml.md for information on how messages are converted to tokens.""")
+    return model, tokens_per_message, tokens_per_name
+
+
+_encodings = {}
+_encoding_lock = threading.Lock()
 
-    encoding = tiktoken.encoding_for_model(model)
 
+def get_encoding(model):
+    # BPE 로딩 비용이 크기 때문에 모델별로 한 번만 불러옵니다 (prewarm 중이면 끝날 때까지 기다립니다)
+    encoding = _encodings.get(model)
+    if encoding is None:
+        with _encoding_lock:
+            encoding = _encodings.get(model)
+            if encoding is None:
+                import tiktoken
+
+                encoding = _encodings[model] = tiktoken.encoding_for_model(token_params(model)[0])
+    return encoding
+
+
+async def async_load_encodings(models=None):
+    """Loads missing tokenizer encodings in a thread so the event loop never waits on _encoding_lock."""
+    missing = [model for model in models or CONFIG["CONTEXT"]["TOKEN_BUDGET"] if model not in _encodings]
+    if missing:
+        # prewarm 스레드가 불러오는 중이면 이 스레드가 락을 기다립니다
+        await asyncio.to_thread(lambda: [get_encoding(model) for model in missing])
+
+
+def prewarm(models=None):
+    """Imports openai and loads the tokenizer encodings so the first message after a deploy does not pay for them."""
+    started = time.perf_counter()
+    try:
+        _openai()
+        for model in models or CONFIG["CONTEXT"]["TOKEN_BUDGET"]:
+            get_encoding(model)
+    except Exception as e:
+        # 실패해도 첫 요청에서 다시 불러오므로 시작은 계속합니다
+        logger.warning(f"Error prewarming OpenAI client: {e}")
+    STARTUP_TIME.set(time.perf_counter() - started, phase="prewarm")
+
+
+def start_prewarm():
+    thread = threading.Thread(target=prewarm, daemon=True)
+    thread.start()
+    return thread
+
+
+def num_tokens_from_message(message, model="gpt-3.5-turbo-0301"):
+    """Returns the number of tokens used by a single message, without the reply priming."""
+    _, tokens_per_message, tokens_per_name = token_params(model)
+    encoding = get_encoding(model)
+    num_tokens = tokens_per_message
+    with TOKENIZER_TIME.time():
+        for key, value in message.items():
+            num_tokens += len(encoding.encode(value))
+            if key == "name":
+                num_tokens += tokens_per_name
+    return num_tokens
+
+
+def num_tokens_from_messages(messages, model="gpt-3.5-turbo-0301"):
+    """Returns the number of tokens used by a list of messages."""
     num_tokens = 0
     if type(messages) == list:
         for message in messages:
-            num_tokens += tokens_per_message
-            for key, value in message.items():
-                num_tokens += len(encoding.encode(value))
-                if key == "name":
-                    num_tokens += tokens_per_name
+            num_tokens += num_tokens_from_message(message, model)
         num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
     elif type(messages) == str:
-        num_tokens += len(encoding.encode(messages))
+        num_tokens += len(get_encoding(model).encode(messages))
     else:
         raise TypeError(f"messages must be a list or str, not {type(messages)}")
     return num_tokens
 
 
-def translate_to_eng(text):
-    content = f"아래를 영어로 번역해줘 \n {text}"
-    response = send([format_conversation(content, role='user')])
+@functools.lru_cache(maxsize=32)
+def _cached_message_tokens(role, content, model):
+    return num_tokens_from_message({"role": role, "content": content}, model)
+
+
+def context_token_counts(context, model="gpt-3.5-turbo-0301"):
+    # context["tokens"] 에 메시지별 토큰 수를 함께 저장합니다 (이전 포맷이면 한 번만 다시 계산)
+    tokens = context.get("tokens")
+    if tokens is None or len(tokens) != len(context["messages"]):
+        tokens = [num_tokens_from_message(message, model) for message in context["messages"]]
+        context["tokens"] = tokens
+    return tokens
+
+
+def num_prompt_tokens(system_message, token_counts, model="gpt-3.5-turbo-0301"):
+    """Returns the prompt tokens of [system_message] + messages from the stored per-message counts."""
+    system_tokens = _cached_message_tokens(system_message["role"], system_message["content"], model)
+    return system_tokens + sum(token_counts) + 3
+
+
+class CompletionTokenCounter:
+    # 스트리밍 delta 를 받을 때마다 새로 들어온 텍스트만 인코딩합니다.
+    # 응답에 usage 필드가 있으면 그 값을 우선 사용합니다.
+    def __init__(self, model="gpt-3.5-turbo-0301"):
+        self.model = model
+        self.encoding = get_encoding(model)
+        self.tokens = 0
+        self.usage = None
+
+    def feed(self, chunk):
+        content = chunk["choices"][0].get("delta", {}).get("content")
+        if content:
+            with TOKENIZER_TIME.time():
+                self.tokens += len(self.encoding.encode(content))
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        return content
+
+    @property
+    def completion_tokens(self):
+        if self.usage is not None and "completion_tokens" in self.usage:
+            return self.usage["completion_tokens"]
+        return self.tokens
+
+    @property
+    def message_tokens(self):
+        # 다음 턴의 프롬프트로 들어갈 assistant 메시지의 토큰 수
+        return self.completion_tokens + _cached_message_tokens("assistant", "", self.model)
+
+
+# 같은 문장 번역 / 같은 (prompt, size) 이미지 요청은 캐시된 결과를 돌려줍니다 (캐시 히트는 0 토큰)
+translation_cache = ResultCache(CONFIG["RESULT_CACHE"]["TRANSLATE_SIZE"], CONFIG["RESULT_CACHE"]["TRANSLATE_TTL"])
+image_cache = ResultCache(CONFIG["RESULT_CACHE"]["IMAGE_SIZE"], CONFIG["RESULT_CACHE"]["IMAGE_TTL"])
+register_cache_stats("result_cache_requests_total", "Translation / image result cache lookups", translation_cache.local,
+                     image_cache.local)
+
+
+def translate_to_eng(text, kind="chat"):
+    # kind 는 호출한 작업의 스케줄러 클래스입니다 (그림 작업의 번역은 "image" 몫으로 잡힙니다)
+    def _translate():
+        content = f"아래를 영어로 번역해줘 \n {text}"
+        response = send([format_conversation(content, role='user')], kind=kind)
+        return {"text": response['choices'][0]['message']["content"], "tokens": response['usage']["total_tokens"]}
+
+    result, hit = translation_cache.get_or_compute(_translate, "translate", text)
+    return result["text"], 0 if hit else result["tokens"]
+
+
+async def async_translate_to_eng(text, kind="chat"):
+    async def _translate():
+        content = f"아래를 영어로 번역해줘 \n {text}"
+        response = await async_send([format_conversation(content, role='user')], kind=kind)
+        return {"text": response['choices'][0]['message']["content"], "tokens": response['usage']["total_tokens"]}
+
+    result, hit = await translation_cache.async_get_or_compute(_translate, "translate", text)
+    return result["text"], 0 if hit else result["tokens"]
+
+
+def _summary_prompt(summary, messages):
+    lines = [f"{message['role']}: {message['content']}" for message in messages]
+    content = "아래 대화를 이전 요약과 합쳐서 핵심만 짧게 요약해줘\n"
+    if summary:
+        content += f"이전 요약: {summary['content']}\n"
+    return content + "\n".join(lines)
+
+
+def summarize_conversation(summary, messages, max_tokens=200):
+    response = send([format_conversation(_summary_prompt(summary, messages))], max_tokens=max_tokens)
+    return response['choices'][0]['message']["content"], response['usage']["total_tokens"]
+
+
+async def async_summarize_conversation(summary, messages, max_tokens=200):
+    response = await async_send([format_conversation(_summary_prompt(summary, messages))], max_tokens=max_tokens)
     return response['choices'][0]['message']["content"], response['usage']["total_tokens"]
 
 
 def create_image(prompt, n=1, size="512x512"):
-    return openai.Image.create(
-        prompt=prompt,
-        n=n,
-        size=size
-    )
+    with scheduler.acquire("image"):
+        return _openai().Image.create(
+            prompt=prompt,
+            n=n,
+            size=size
+        )
+
+
+async def async_create_image(prompt, n=1, size="512x512"):
+    async with await scheduler.async_acquire("image"):
+        return await _openai().Image.acreate(
+            prompt=prompt,
+            n=n,
+            size=size
+        )
+
+
+def cached_create_image(prompt, n=1, size="512x512"):
+    """Returns (response, hit); repeated (prompt, size) requests within IMAGE_TTL reuse the generated image."""
+    if not CONFIG["RESULT_CACHE"]["IMAGE_TTL"]:
+        return create_image(prompt, n, size), False
+    return image_cache.get_or_compute(lambda: dict(create_image(prompt, n, size)), "image", prompt, size, n)
+
+
+async def async_cached_create_image(prompt, n=1, size="512x512"):
+    if not CONFIG["RESULT_CACHE"]["IMAGE_TTL"]:
+        return await async_create_image(prompt, n, size), False
+
+    async def _create():
+        return dict(await async_create_image(prompt, n, size))
 
-openai.ErrorObject
\ No newline at end of file
+    return await image_cache.async_get_or_compute(_create, "image", prompt, size, n)
@@ -0,0 +1,247 @@
+import time
+import asyncio
+import threading
+import collections
+from config import CONFIG
+from context import current_usage
+from metrics import QUEUE_WAIT, register_stats
+
+# 프로세스 전체 누적 카운터 (튜닝용)
+scheduler_stats = {
+    "granted": 0,
+    "waited": 0,
+    "wait_time": 0.0,
+}
+register_stats("openai_scheduler_total", "OpenAI scheduler grants, delayed grants and total wait seconds",
+               scheduler_stats)
+
+
+class TokenBucket:
+    # 분당 한도(per_minute)를 초당 per_minute / 60 씩 채우는 토큰 버킷
+    def __init__(self, per_minute, clock=time.monotonic):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.clock = clock
+        self.level = per_minute
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Returns seconds until `amount` can be taken (0 if it can be taken now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.level -= amount
+
+    def give_back(self, amount):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class Slot:
+    # 스케줄러가 허가한 요청 1건. release() 로 동시 실행 자리를 반납하고 토큰 예산을 정산합니다.
+    # 스트리밍 응답은 stream_opened() 로 동시 실행 자리만 먼저 반납하고,
+    # 토큰 예산은 스트림이 끝날 때 release() 로 정산합니다.
+    def __init__(self, scheduler, owner, kind, tokens):
+        self.scheduler = scheduler
+        self.owner = owner
+        self.kind = kind
+        self.tokens = tokens
+        self.wait_time = 0
+        self.granted = False
+        self.streaming = False
+        self.released = False
+        self._enqueued = time.monotonic()
+        self._event = None
+        self._future = None
+
+    def _grant(self):
+        self.granted = True
+        self.wait_time = time.monotonic() - self._enqueued
+        if self._event is not None:
+            self._event.set()
+        else:
+            self._future.get_loop().call_soon_threadsafe(self._set_future)
+
+    def _set_future(self):
+        if not self._future.done():
+            self._future.set_result(None)
+
+    def stream_opened(self):
+        if not self.streaming and not self.released:
+            self.streaming = True
+            self.scheduler._stream_opened(self)
+
+    def release(self, tokens=None):
+        # tokens 에 실제 사용량을 주면 예상치와의 차이를 토큰 버킷에 반영합니다
+        if not self.released:
+            self.released = True
+            self.scheduler._release(self, tokens)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class OpenAIScheduler:
+    # 모든 OpenAI 호출이 거쳐가는 프로세스 내 스케줄러입니다.
+    # - 전역 분당 요청 수(RPM) / 토큰 수(TPM) 토큰 버킷과 동시 실행 수 제한
+    # - 우선순위 클래스(chat / image)는 가중치 비율로 번갈아 처리하고 (stride scheduling)
+    # - 같은 클래스 안에서는 owner(유저 / 채널)별 대기열을 round robin 으로 돌면서 하나씩 허가합니다.
+    # sync / async 호출자 모두 같은 대기열을 쓰며, 허가는 하나의 디스패처 스레드가 담당합니다.
+    # 동시 실행 수는 응답을 기다리는 요청만 셉니다. 열린 스트림은 TPM 예산으로만 제한되므로
+    # 긴 스트리밍 대화가 많아도 새 요청의 허가가 막히지 않습니다 (Slot.stream_opened).
+    def __init__(self, rpm, tpm, max_concurrency, weights, clock=time.monotonic):
+        invalid = [kind for kind, weight in weights.items() if weight <= 0]
+        if invalid:
+            raise ValueError(f"Scheduler weights must be positive: {invalid}")
+        self.requests = TokenBucket(rpm, clock)
+        self.tokens = TokenBucket(tpm, clock)
+        self.max_concurrency = max_concurrency
+        self.weights = weights
+        self.running = 0
+        # 동시 실행 자리는 반납했지만 아직 토큰을 정산하지 않은 스트림 수
+        self.streaming = 0
+        self._queues = {kind: collections.OrderedDict() for kind in weights}
+        self._passes = {kind: 0 for kind in weights}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def _enqueue(self, slot):
+        with self._cond:
+            self._queues[slot.kind].setdefault(slot.owner, collections.deque()).append(slot)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _remove(self, slot):
+        # 대기 중에 취소된 요청을 대기열에서 뺍니다
+        with self._cond:
+            queue = self._queues[slot.kind].get(slot.owner)
+            if queue is not None and slot in queue:
+                queue.remove(slot)
+                if not queue:
+                    del self._queues[slot.kind][slot.owner]
+            self._cond.notify()
+
+    def _peek(self):
+        kinds = [kind for kind, owners in self._queues.items() if owners]
+        if not kinds:
+            return None
+        kind = min(kinds, key=lambda k: self._passes[k])
+        owner, queue = next(iter(self._queues[kind].items()))
+        return queue[0]
+
+    def _pop(self, slot):
+        owners = self._queues[slot.kind]
+        queue = owners.pop(slot.owner)
+        queue.popleft()
+        if queue:
+            # 같은 owner 의 다음 요청은 다른 owner 들 뒤로 보냅니다
+            owners[slot.owner] = queue
+        self._passes[slot.kind] += 1 / self.weights[slot.kind]
+
+    def _dispatch(self):
+        with self._cond:
+            while True:
+                slot = self._peek()
+                if slot is None or self.running >= self.max_concurrency:
+                    self._cond.wait()
+                    continue
+                delay = max(self.requests.wait_time(1), self.tokens.wait_time(slot.tokens))
+                if delay > 0:
+                    self._cond.wait(timeout=delay)
+                    continue
+                self._pop(slot)
+                # 쉬고 있던 클래스가 밀린 몫을 한꺼번에 가져가지 않도록 pass 값을 맞춰줍니다
+                idle = [kind for kind, owners in self._queues.items() if not owners]
+                for kind in idle:
+                    self._passes[kind] = max(self._passes[kind], self._passes[slot.kind])
+                self.requests.take(1)
+                self.tokens.take(slot.tokens)
+                self.running += 1
+                scheduler_stats["granted"] += 1
+                slot._grant()
+                if slot.wait_time > 0.001:
+                    scheduler_stats["waited"] += 1
+                    scheduler_stats["wait_time"] += slot.wait_time
+
+    def _stream_opened(self, slot):
+        with self._cond:
+            if slot.granted:
+                self.running -= 1
+                self.streaming += 1
+            self._cond.notify()
+
+    def _release(self, slot, tokens):
+        with self._cond:
+            if slot.granted:
+                if slot.streaming:
+                    self.streaming -= 1
+                else:
+                    self.running -= 1
+                if tokens is not None and tokens < slot.tokens:
+                    self.tokens.give_back(slot.tokens - tokens)
+                elif tokens is not None:
+                    self.tokens.take(tokens - slot.tokens)
+            self._cond.notify()
+
+    def _slot(self, kind, tokens, owner):
+        usage = current_usage.get()
+        if owner is None:
+            owner = usage.owner if usage is not None else None
+        return Slot(self, owner, kind, tokens)
+
+    def acquire(self, kind="chat", tokens=0, owner=None):
+        """Blocks until the request may be sent and returns its Slot. owner defaults to the current usage owner."""
+        slot = self._slot(kind, tokens, owner)
+        slot._event = threading.Event()
+        self._enqueue(slot)
+        slot._event.wait()
+        _record_wait(slot)
+        return slot
+
+    async def async_acquire(self, kind="chat", tokens=0, owner=None):
+        slot = self._slot(kind, tokens, owner)
+        slot._future = asyncio.get_running_loop().create_future()
+        self._enqueue(slot)
+        try:
+            await slot._future
+        except asyncio.CancelledError:
+            self._remove(slot)
+            slot.release()
+            raise
+        _record_wait(slot)
+        return slot
+
+
+def _record_wait(slot):
+    # 대기 시간은 현재 LoggingManager 의 queue_time 으로 사용량 로그에 남깁니다
+    QUEUE_WAIT.observe(slot.wait_time, queue=f"openai:{slot.kind}")
+    usage = current_usage.get()
+    if usage is not None:
+        usage.queue_time += slot.wait_time
+
+
+scheduler = OpenAIScheduler(CONFIG["OPENAI_SCHEDULER"]["RPM"], CONFIG["OPENAI_SCHEDULER"]["TPM"],
+                            CONFIG["OPENAI_SCHEDULER"]["MAX_CONCURRENCY"],
+                            {"chat": CONFIG["OPENAI_SCHEDULER"]["CHAT_WEIGHT"],
+                             "image": CONFIG["OPENAI_SCHEDULER"]["IMAGE_WEIGHT"]})
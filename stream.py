@@ -0,0 +1,62 @@
+import time
+from config import CONFIG
+from metrics import register_stats
+
+# 프로세스 전체 누적 카운터 (튜닝용)
+stream_stats = {
+    "flushes": 0,
+    "suppressed": 0,
+}
+register_stats("slack_stream_updates_total", "chat_update calls sent or suppressed while streaming", stream_stats)
+
+
+class StreamBuffer:
+    # 스트리밍 응답을 조각 단위로 모아두고, chat_update 호출 시점을 결정합니다.
+    # 최소 간격(min_interval 초)과 최소 신규 글자 수(min_chars)를 모두 만족할 때만 flush 하며,
+    # finish_reason 이 오면 남은 내용을 무조건 flush 합니다.
+    def __init__(self, min_interval=None, min_chars=None, clock=time.monotonic):
+        self.min_interval = CONFIG["STREAM"]["MIN_INTERVAL"] if min_interval is None else min_interval
+        self.min_chars = CONFIG["STREAM"]["MIN_CHARS"] if min_chars is None else min_chars
+        self.clock = clock
+        self.flush_count = 0
+        self.suppressed_count = 0
+        self._chunks = []
+        self._text = ""
+        self._size = 0
+        self._flushed_size = 0
+        self._last_flush = None
+
+    def append(self, content):
+        self._chunks.append(content)
+        self._size += len(content)
+
+    @property
+    def text(self):
+        # 쌓인 조각은 읽을 때 한 번만 합칩니다
+        if self._chunks:
+            self._text += "".join(self._chunks)
+            self._chunks.clear()
+        return self._text.strip()
+
+    def poll(self, finish=False):
+        """Returns the text to send to chat_update, or None if this update should be suppressed."""
+        new_chars = self._size - self._flushed_size
+        if new_chars <= 0:
+            return None
+
+        now = self.clock()
+        if not finish:
+            is_due = self._last_flush is None or now - self._last_flush >= self.min_interval
+            if not is_due or new_chars < self.min_chars:
+                self.suppressed_count += 1
+                stream_stats["suppressed"] += 1
+                return None
+
+        text = self.text
+        if not text:
+            return None
+        self._flushed_size = self._size
+        self._last_flush = now
+        self.flush_count += 1
+        stream_stats["flushes"] += 1
+        return text
@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import signal
+import socket
+import logging
+import subprocess
+import urllib.request
+
+from config import CONFIG
+
+# 워커 프로세스(main.py)를 여러 개 띄우고 살아 있는지 확인하는 로컬 supervisor 입니다.
+# 각 워커는 자기 Socket Mode 연결을 갖고 같은 Redis 를 씁니다 (python supervisor.py, 워커 수는 WORKERS).
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+logger = logging.getLogger("supervisor")
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+
+
+class Worker:
+    # 워커 i 는 id {hostname}-w{i}, 메트릭 포트 METRICS_PORT + i, 로그 logs/usage-w{i}.log 를 씁니다.
+    # 재시작해도 id 가 같으므로 이전 실행이 남긴 작업(processing 리스트)을 바로 되찾습니다.
+    def __init__(self, index, max_unhealthy=3, max_backoff=60):
+        self.index = index
+        self.worker_id = f"{socket.gethostname()}-w{index}"
+        self.port = CONFIG["METRICS"]["PORT"] + index if CONFIG["METRICS"]["PORT"] else 0
+        self.max_unhealthy = max_unhealthy
+        self.max_backoff = max_backoff
+        self.process = None
+        self.started = 0
+        self.restarts = 0
+        self.unhealthy = 0
+        self.next_start = 0
+
+    def start(self):
+        env = dict(os.environ, WORKER_ID=self.worker_id, METRICS_PORT=str(self.port), LOG_SUFFIX=f"-w{self.index}")
+        self.process = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py")], cwd=ROOT, env=env)
+        self.started = time.monotonic()
+        self.unhealthy = 0
+        logger.info(f"Started worker {self.worker_id} (pid {self.process.pid})")
+
+    def healthy(self):
+        # 시작 직후(STARTUP_GRACE)에는 프로세스가 살아 있는지만 봅니다
+        if self.process.poll() is not None:
+            return False
+        if not self.port or time.monotonic() - self.started < CONFIG["WORKERS"]["STARTUP_GRACE"]:
+            return True
+        host = CONFIG["METRICS"]["HOST"]
+        try:
+            with urllib.request.urlopen(f"http://{host}:{self.port}/healthz", timeout=2) as response:
+                return response.status == 200
+        except Exception:
+            return False
+
+    def check(self):
+        now = time.monotonic()
+        if self.process is None:
+            if now >= self.next_start:
+                self.start()
+            return
+        if self.healthy():
+            self.unhealthy = 0
+            # 한동안 잘 돌았으면 재시작 backoff 를 초기화합니다
+            if now - self.started > self.max_backoff:
+                self.restarts = 0
+            return
+        if self.process.poll() is None:
+            self.unhealthy += 1
+            if self.unhealthy < self.max_unhealthy:
+                return
+            logger.warning(f"Worker {self.worker_id} failed {self.unhealthy} health checks, restarting")
+            self.stop()
+        else:
+            logger.warning(f"Worker {self.worker_id} exited with {self.process.returncode}")
+        self.process = None
+        self.next_start = now + min(2 ** self.restarts, self.max_backoff)
+        self.restarts += 1
+
+    def stop(self, timeout=10):
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+def run(count=CONFIG["WORKERS"]["COUNT"], interval=CONFIG["WORKERS"]["HEALTH_INTERVAL"]):
+    workers = [Worker(i) for i in range(count)]
+    stopping = []
+
+    def shutdown(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    while not stopping:
+        for worker in workers:
+            worker.check()
+        time.sleep(interval)
+    logger.info("Stopping workers")
+    for worker in workers:
+        worker.stop()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,40 @@
+import os
+import sys
+
+# 앱 모듈은 저장소 최상위에 있으므로 테스트에서도 바로 import 할 수 있게 합니다
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import pytest
+
+
+@pytest.fixture
+def redis_server():
+    # fakeredis TCP 서버 (Lua 스크립트는 lupa 패키지가 필요합니다)
+    from benchmarks.fakes import start_redis
+
+    host, port, stop = start_redis()
+    yield host, port
+    stop()
+
+
+class WordEncoding:
+    # 공백 단위로 토큰을 세는 가짜 인코딩 (tiktoken 파일을 내려받지 않습니다)
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, text):
+        self.encoded.append(text)
+        return text.split()
+
+
+@pytest.fixture
+def encoding(monkeypatch):
+    import open_ai
+
+    encoding = WordEncoding()
+    monkeypatch.setattr(open_ai, "_encodings", {"gpt-3.5-turbo-0301": encoding})
+    open_ai._cached_message_tokens.cache_clear()
+    yield encoding
+    open_ai._cached_message_tokens.cache_clear()
@@ -0,0 +1,51 @@
+import pytest
+from redis.commands.core import Script
+
+from cache import RedisManager, LocalCache
+
+
+@pytest.fixture
+def workers(redis_server):
+    # 같은 Redis 를 쓰는 두 워커의 RedisManager
+    host, port = redis_server
+    managers = [RedisManager(host, port, 0, local_cache=LocalCache(64, 60)) for _ in range(2)]
+    # fakeredis TCP 서버는 NOSCRIPT 에러를 보낸 뒤 연결을 끊으므로 Lua 스크립트를 미리 올려둡니다
+    for script in vars(managers[0]).values():
+        if isinstance(script, Script):
+            managers[0].rd.script_load(script.script)
+    yield managers
+    for manager in managers:
+        manager._pubsub_thread.stop()
+        manager._pubsub_thread.join()
+
+
+def turn(manager, text):
+    context, lock = manager.begin_turn(prefix="user", key="U1", default={"messages": []})
+    assert lock.acquired
+    context["messages"].append(text)
+    assert manager.end_turn(prefix="user", key="U1", context=context, lock=lock)
+    return context
+
+
+def test_conversation_reads_hit_local_cache_until_another_worker_writes(workers):
+    a, b = workers
+
+    turn(a, "a1")
+    assert turn(a, "a2")["messages"] == ["a1", "a2"]
+    assert a.local_cache.stats["user"] == {"hits": 1, "misses": 1}
+
+    # 다른 워커가 쓴 뒤에는 로컬 캐시가 있어도 Redis 의 최신 context 를 받습니다
+    assert turn(b, "b1")["messages"] == ["a1", "a2", "b1"]
+    assert turn(a, "a3")["messages"] == ["a1", "a2", "b1", "a3"]
+    assert a.local_cache.stats["user"] == {"hits": 1, "misses": 2}
+
+
+def test_save_and_delete_refresh_cached_conversation(workers):
+    a, b = workers
+    turn(a, "a1")
+
+    b.save_conversation(prefix="user", key="U1", context={"messages": ["reset"]})
+    assert turn(a, "a2")["messages"] == ["reset", "a2"]
+
+    b.delete(prefix="user", key="U1")
+    assert turn(a, "a3")["messages"] == ["a3"]
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from cache import Codec
+
+SMALL = {"messages": [{"role": "user", "content": "안녕하세요"}], "tokens": [5]}
+LARGE = {"messages": [{"role": "user", "content": "안녕하세요 " * 200}] * 5, "tokens": [400] * 5}
+WRITERS = [("json", None), ("json", "zlib"), ("json", "zstd"),
+           ("msgpack", None), ("msgpack", "zlib"), ("msgpack", "zstd")]
+
+
+def test_one_codec_reads_every_format_written_during_migration():
+    stored = [
+        # 버전 바이트가 없는 이전 포맷 (JSON / 문자열)
+        (json.dumps(SMALL).encode('utf-8'), SMALL),
+        (json.dumps(LARGE, ensure_ascii=False).encode('utf-8'), LARGE),
+        (b"published-digest", "published-digest"),
+    ]
+    for serializer, compression in WRITERS:
+        writer = Codec(serializer, compression, threshold=1024)
+        # threshold 아래 값은 압축하지 않고, 위의 값만 압축합니다
+        stored += [(writer.encode(SMALL), SMALL), (writer.encode(LARGE), LARGE)]
+
+    reader = Codec("msgpack", "zstd")
+    for raw, expected in stored:
+        assert reader.decode(raw) == expected
+
+
+@pytest.mark.parametrize("serializer,compression", [w for w in WRITERS if w[1]])
+def test_compresses_only_above_threshold(serializer, compression):
+    codec = Codec(serializer, compression, threshold=1024)
+    plain = Codec(serializer, None)
+
+    assert codec.encode(SMALL) == plain.encode(SMALL)
+    assert len(codec.encode(LARGE)) < len(plain.encode(LARGE))
@@ -0,0 +1,95 @@
+import os
+import json
+
+import numpy as np
+import pytest
+
+import compaction
+from usage_engine import rollup_path, read_rollup, ROLLUP_HEADER
+from utils import now, date_to_str
+
+
+def write_log(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for user, date, tokens in records:
+            f.write(json.dumps({"v": 2, "date": date, "user": user, "tokens": tokens, "process_time": 1.0}) + "\n")
+
+
+@pytest.fixture
+def logs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("logs")
+    monkeypatch.setitem(compaction.CONFIG["USAGE_ROLLUP"], "DIR", "logs/rollups")
+    monkeypatch.setitem(compaction.CONFIG["USAGE_ROLLUP"], "KEEP_RAW", True)
+    old = "logs/usage.log.20200101"
+    write_log(old, [("U1", "2020-01-01", 10), ("U1", "2020-01-01", 5), ("U2", "2020-01-01", 7)])
+    return old
+
+
+def test_rollup_round_trip(logs):
+    path = compaction.compact(logs)
+    source_size, records = read_rollup(path)
+
+    assert source_size == os.path.getsize(logs)
+    assert records["user"].tolist() == [b"U1", b"U2"]
+    assert records["tokens"].tolist() == [15, 7]
+    assert records["count"].tolist() == [2, 1]
+    assert np.allclose(records["process_time"], [2.0, 1.0])
+    assert compaction.validate(logs) == []
+
+
+@pytest.mark.parametrize("content", [b"", b"USGR\x01", None])
+def test_corrupt_or_short_rollup_is_rebuilt(logs, content):
+    path = compaction.compact(logs)
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        # 비었거나 헤더보다 짧거나 레코드 중간에서 잘린 파일
+        f.write(content if content is not None else data[:ROLLUP_HEADER.size + 5])
+
+    assert compaction.validate(logs)
+    compaction.compact(logs)
+    assert compaction.validate(logs) == []
+
+
+def test_source_size_mismatch_is_reported_and_recompacted(logs):
+    compaction.compact(logs)
+    with open(logs, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"v": 2, "date": "2020-01-01", "user": "U3", "tokens": 1, "process_time": 1.0}) + "\n")
+
+    problems = compaction.validate(logs)
+    assert any("source size" in problem for problem in problems)
+    compaction.compact(logs)
+    assert compaction.validate(logs) == []
+
+
+def test_drop_raw_keeps_this_months_logs(logs, monkeypatch):
+    monkeypatch.setitem(compaction.CONFIG["USAGE_ROLLUP"], "KEEP_RAW", False)
+    today = now()
+    current = f"logs/usage.log.{today.strftime('%Y%m%d')}"
+    write_log(current, [("U1", date_to_str(today), 3)])
+
+    compaction.compact_all()
+
+    # 지난 달 이전의 검증된 원본만 지우고, 이번 달 로그는 tailer 가 읽으므로 남깁니다
+    assert not os.path.exists(logs)
+    assert os.path.exists(current)
+    assert os.path.exists(rollup_path(logs)) and os.path.exists(rollup_path(current))
+
+
+def test_drop_raw_keeps_log_that_fails_validation(logs, monkeypatch):
+    path = compaction.compact(logs)
+    with open(path, "r+b") as f:
+        # 레코드의 토큰 수를 망가뜨려도 크기는 같으므로 compact 는 다시 쓰지 않습니다
+        f.seek(os.path.getsize(path) - 20)
+        f.write(b"\xff" * 8)
+
+    assert not compaction.remove_raw(logs)
+    assert os.path.exists(logs)
+
+
+def test_rotate_skips_missing_log(tmp_path):
+    from context import _rotate
+
+    _rotate(str(tmp_path / "usage.log"), str(tmp_path / "usage.log.20200101"))
+    assert not os.path.exists(tmp_path / "usage.log.20200101")
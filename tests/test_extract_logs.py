@@ -0,0 +1,30 @@
+import json
+
+from extract_logs import parse_logs, UsageLogTailer
+
+
+def record(user, tokens, date="2026-10-01"):
+    return json.dumps({"v": 2, "date": date, "user": user, "tokens": tokens, "process_time": 1.5}) + "\n"
+
+
+def test_malformed_line_only_skips_itself(tmp_path):
+    log = tmp_path / "usage.log"
+    log.write_text(record("U1", 10) + '{"v": 2, "date": \n' + record("U2", 20) +
+                   "2026-10-01 10:00:00,000 INFO: U3/30/2.5\n", encoding="utf-8")
+
+    logs = parse_logs([str(log)])
+
+    assert [(x["id"], x["tokens"]) for x in logs] == [("U1", 10), ("U2", 20), ("U3", 30)]
+    assert logs[0]["timestamp"] == "2026-10-01"
+
+
+def test_tailer_waits_for_partial_line(tmp_path):
+    log = tmp_path / "usage.log"
+    log.write_text(record("U1", 10) + record("U1", 5)[:20], encoding="utf-8")
+    tailer = UsageLogTailer(files=lambda: [str(log)])
+
+    assert tailer.poll() == {("2026-10-01", "U1"): (10, 1.5)}
+
+    with open(log, "a", encoding="utf-8") as f:
+        f.write(record("U1", 5)[20:])
+    assert tailer.poll() == {("2026-10-01", "U1"): (15, 3.0)}
@@ -0,0 +1,58 @@
+import sys
+import importlib
+
+import pytest
+
+from benchmarks.fakes import FakeSlack
+from views import view_digest
+
+
+@pytest.fixture
+def app(redis_server, monkeypatch, tmp_path):
+    import context
+    from config import CONFIG
+
+    host, port = redis_server
+    (tmp_path / "logs").mkdir()
+    monkeypatch.chdir(tmp_path)
+    # app 이 등록하는 usage hook 은 테스트가 끝나면 되돌립니다
+    monkeypatch.setattr(context, "_usage_hooks", list(context._usage_hooks))
+    with FakeSlack(limits={}, latency=0) as slack:
+        monkeypatch.setitem(CONFIG, "BOT_TOKEN", "xoxb-test")
+        monkeypatch.setitem(CONFIG, "SLACK_API_URL", f"{slack.url}/api/")
+        monkeypatch.setitem(CONFIG["REDIS"], "HOST", host)
+        monkeypatch.setitem(CONFIG["REDIS"], "PORT", port)
+        monkeypatch.setitem(CONFIG["REDIS"], "LOCAL_CACHE_SIZE", 0)
+        sys.modules.pop("app", None)
+        app = importlib.import_module("app")
+        yield app, slack
+        sys.modules.pop("app", None)
+
+
+def test_view_digest_ignores_key_order():
+    view = {"type": "home", "blocks": [{"type": "section", "text": "사용량"}]}
+
+    assert view_digest(view) == view_digest({"blocks": [{"text": "사용량", "type": "section"}], "type": "home"})
+    assert view_digest(view) != view_digest({"type": "home", "blocks": []})
+
+
+def test_home_is_republished_only_after_own_usage_changes(app):
+    app, slack = app
+    from context import LoggingManager
+
+    client = app.bolt_app.client
+    app.publish_home(client, "U1")
+    app.publish_home(client, "U1")
+    # 같은 view 를 다시 보내지 않습니다
+    assert slack.stats["views.publish"] == 1
+
+    with LoggingManager("U2") as usage:
+        usage.tokens = 10
+    app.publish_home(client, "U1")
+    assert slack.stats["views.publish"] == 1
+
+    # 사용량이 바뀌면 캐시된 view 를 지우고 새 사용량으로 다시 보냅니다
+    with LoggingManager("U1") as usage:
+        usage.tokens = 10
+    app.publish_home(client, "U1")
+    assert slack.stats["views.publish"] == 2
@@ -0,0 +1,73 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from jobs import JobQueue, AsyncJobQueue
+
+
+def test_long_job_runs_once_across_heartbeat_sweeps(redis_server):
+    host, port = redis_server
+    runs = []
+    done = threading.Event()
+
+    def handler(payload):
+        runs.append(payload["n"])
+        # 점검 주기(heartbeat_ttl / 3)보다 몇 배 오래 걸리는 작업
+        time.sleep(1.5)
+        done.set()
+
+    queue = JobQueue(host, port, 0, "job:test", handler, workers=2, worker_id="w0", heartbeat_ttl=1)
+    queue.start()
+    try:
+        queue.submit({"n": 1})
+        assert done.wait(10)
+        time.sleep(1)
+        assert runs == [1]
+        assert queue.depth() == 0
+    finally:
+        queue.stop()
+
+
+def test_start_reclaims_own_and_dead_workers_jobs(redis_server):
+    host, port = redis_server
+    runs = []
+    queue = JobQueue(host, port, 0, "job:test", lambda payload: runs.append(payload), worker_id="w0")
+    job_id, _ = queue.submit({"n": 1})
+    # 이전 실행(w0)과 하트비트가 끊긴 w1, 살아 있는 w2 가 남긴 작업
+    queue.rd.rpoplpush("job:test:queue", "job:test:processing:w0")
+    queue.rd.lpush("job:test:processing:w1", "missing-1")
+    queue.rd.lpush("job:test:processing:w2", "missing-2")
+    queue.rd.set("job:test:worker:w2", time.time(), ex=30)
+
+    assert queue.recover() == 1
+    assert queue.recover(own=True) == 1
+    assert queue.rd.llen("job:test:processing:w2") == 1
+
+
+def test_async_long_job_runs_once_across_heartbeat_sweeps(redis_server):
+    host, port = redis_server
+    runs = []
+
+    async def handler(payload):
+        runs.append(payload["n"])
+        await asyncio.sleep(1.5)
+
+    async def main():
+        queue = AsyncJobQueue(host, port, 0, "job:async", handler, workers=2, worker_id="w0", heartbeat_ttl=1)
+        await queue.start()
+        try:
+            job_id, _ = await queue.submit({"n": 1})
+            for _ in range(100):
+                if (await queue.status(job_id)).get("status") == "done":
+                    break
+                await asyncio.sleep(0.1)
+            await asyncio.sleep(1)
+            assert (await queue.status(job_id))["status"] == "done"
+        finally:
+            await queue.stop()
+            await queue.rd.close()
+
+    asyncio.run(main())
+    assert runs == [1]
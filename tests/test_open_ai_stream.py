@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fakes import FakeOpenAI
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    with FakeOpenAI(tokens_per_sec=60, first_token_latency=0.05, completion_tokens=30) as server:
+        monkeypatch.setenv("OPENAI_API_BASE", server.api_base)
+        import open_ai
+        from scheduler import OpenAIScheduler
+
+        monkeypatch.setattr(open_ai, "_openai", lambda: _client(server.api_base))
+        # 요청 하나가 프롬프트 10 + 최대 응답 500 토큰을 잡으므로 TPM 1060 이면 두 스트림만 바로 허가되고,
+        # 세 번째 스트림은 첫 스트림이 끝나 실제 사용량(40)으로 정산될 때까지 스케줄러에서 기다립니다
+        monkeypatch.setattr(open_ai, "scheduler", OpenAIScheduler(3500, 1060, 1, {"chat": 4, "image": 1}))
+        # 스트림 하나가 0.5초쯤 걸리므로 세 번째 스트림은 제한 시간보다 오래 스케줄러에서 기다립니다
+        monkeypatch.setitem(open_ai.CONFIG["OPENAI_RETRY"], "FIRST_TOKEN_TIMEOUT", 0.5)
+        monkeypatch.setitem(open_ai.CONFIG["OPENAI_RETRY"], "MAX_RETRIES", 0)
+        yield open_ai
+
+
+def _client(api_base):
+    import openai
+
+    openai.api_key = "sk-test"
+    openai.api_base = api_base
+    return openai
+
+
+def test_scheduler_wait_does_not_count_against_first_token_deadline(fake_openai):
+    open_ai = fake_openai
+
+    async def consume():
+        chunks = 0
+        async for chunk in open_ai.async_stream_with_retry([{"role": "user", "content": "hi"}], prompt_tokens=10):
+            chunks += 1
+        return chunks
+
+    async def main():
+        return await asyncio.wait_for(asyncio.gather(*[consume() for _ in range(3)], return_exceptions=True), 20)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, int) and result > 0 for result in results), results
+    assert open_ai.scheduler.running == 0
+    assert open_ai.scheduler.streaming == 0
+
+
+def test_open_streams_do_not_hold_concurrency_and_settle_tokens(fake_openai):
+    open_ai = fake_openai
+    scheduler = open_ai.scheduler
+
+    async def main():
+        # 동시 실행 1 이어도 두 스트림이 함께 열립니다
+        first = await open_ai.async_send([{"role": "user", "content": "hi"}], stream=True, prompt_tokens=10)
+        second = await asyncio.wait_for(
+            open_ai.async_send([{"role": "user", "content": "hi"}], stream=True, prompt_tokens=10), 2)
+        assert (scheduler.running, scheduler.streaming) == (0, 2)
+        for response in (first, second):
+            async for chunk in response:
+                pass
+        return first.completion_tokens
+
+    assert asyncio.run(main()) == 30
+    assert scheduler.streaming == 0
+    # 예상치(510 x 2)가 아니라 실제 사용량(40 x 2)만 TPM 버킷에서 빠져 있습니다
+    assert scheduler.tokens.level >= 1060 - 80
+
+
+def test_closing_unread_stream_releases_slot(fake_openai):
+    open_ai = fake_openai
+
+    async def main():
+        response = await open_ai.async_send([{"role": "user", "content": "hi"}], stream=True, prompt_tokens=10)
+        assert open_ai.scheduler.streaming == 1
+        await response.aclose()
+
+    asyncio.run(main())
+    assert open_ai.scheduler.streaming == 0
+    assert open_ai.scheduler.running == 0
+
+
+async def _no_encodings(models=None):
+    pass
+
+
+def test_image_translation_is_scheduled_as_image(fake_openai, monkeypatch):
+    open_ai = fake_openai
+    monkeypatch.setattr(open_ai, "translation_cache", open_ai.ResultCache())
+    # 번역 요청은 prompt_tokens 를 넘기지 않으므로 인코딩을 내려받지 않도록 토큰 수를 고정합니다
+    monkeypatch.setattr(open_ai, "num_tokens_from_messages", lambda messages, model: 10)
+    monkeypatch.setattr(open_ai, "async_load_encodings", _no_encodings)
+    kinds = []
+    acquire, async_acquire = open_ai.scheduler.acquire, open_ai.scheduler.async_acquire
+
+    def spy(kind="chat", tokens=0, owner=None):
+        kinds.append(kind)
+        return acquire(kind, tokens, owner)
+
+    async def async_spy(kind="chat", tokens=0, owner=None):
+        kinds.append(kind)
+        return await async_acquire(kind, tokens, owner)
+
+    monkeypatch.setattr(open_ai.scheduler, "acquire", spy)
+    monkeypatch.setattr(open_ai.scheduler, "async_acquire", async_spy)
+
+    open_ai.translate_to_eng("고양이", kind="image")
+    asyncio.run(open_ai.async_translate_to_eng("강아지", kind="image"))
+    open_ai.translate_to_eng("토끼")
+
+    assert kinds == ["image", "image", "chat"]
@@ -0,0 +1,36 @@
+import time
+import asyncio
+import threading
+
+
+def test_loading_encodings_does_not_block_event_loop(monkeypatch):
+    import open_ai
+
+    monkeypatch.setattr(open_ai, "_encodings", {})
+    locked = threading.Event()
+
+    def slow_prewarm():
+        # prewarm 스레드가 토크나이저를 불러오는 동안 _encoding_lock 을 쥐고 있습니다
+        with open_ai._encoding_lock:
+            locked.set()
+            time.sleep(0.5)
+            open_ai._encodings["gpt-3.5-turbo-0301"] = object()
+
+    threading.Thread(target=slow_prewarm, daemon=True).start()
+    locked.wait()
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.05)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await open_ai.async_load_encodings(["gpt-3.5-turbo-0301"])
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(main()) >= 5
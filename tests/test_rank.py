@@ -0,0 +1,44 @@
+from usage import UsageRollup
+from views import rank_usage_view
+
+
+def buttons(view):
+    return {element["action_id"]: element["value"]
+            for block in view["blocks"] if block["type"] == "actions" for element in block["elements"]}
+
+
+def titles(view):
+    return [block["text"]["text"] for block in view["blocks"] if block["type"] == "section"][1:]
+
+
+def test_leaderboard_pages_by_offset(redis_server):
+    host, port = redis_server
+    rollup = UsageRollup(host=host, port=port, db=0)
+    for i in range(12):
+        rollup.add(f"U{i:02d}", tokens=(i + 1) * 100, process_time=i + 0.5)
+    rollup.add("U00", tokens=50, process_time=1)
+
+    first, total = rollup.leaderboard(0, 9)
+    second, _ = rollup.leaderboard(9, 9)
+
+    assert total == 12
+    assert [entry["user_id"] for entry in first] == [f"U{i:02d}" for i in range(11, 2, -1)]
+    assert [(entry["rank"], entry["user_id"], entry["total_token"], entry["total_process_time"])
+            for entry in second] == [(10, "U02", 300, 2.5), (11, "U01", 200, 1.5), (12, "U00", 150, 1.5)]
+    assert rollup.user_rank("U01") == (11, 200)
+    assert rollup.user_rank("U99") == (None, 0)
+
+
+def test_rank_view_numbers_and_buttons_follow_offset():
+    page = [{"user_id": f"U{i}", "total_token": 100, "total_process_time": 1.0} for i in range(3)]
+
+    first = rank_usage_view(page, offset=0, total=12, page_size=3)
+    middle = rank_usage_view(page, offset=3, total=12, page_size=3)
+    last = rank_usage_view(page, offset=9, total=12, page_size=3)
+
+    assert buttons(first) == {"rank_usage_next": "3"}
+    assert buttons(middle) == {"rank_usage_prev": "0", "rank_usage_next": "6"}
+    assert buttons(last) == {"rank_usage_prev": "6"}
+    # 전체 순위 기준으로 번호를 붙이고, 10위부터는 숫자로 표시합니다
+    assert titles(middle)[0].startswith(":four: *<@U0>")
+    assert titles(last)[0].startswith(":keycap_star: *10위 <@U0>")
@@ -0,0 +1,50 @@
+import time
+import threading
+import unicodedata
+
+from cache import ResultCache
+
+
+def test_normalized_text_shares_an_entry_until_ttl():
+    now = [0.0]
+    cache = ResultCache(maxsize=8, ttl=60)
+    cache.local.clock = lambda: now[0]
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"text": "a cat", "tokens": 12}
+
+    assert cache.get_or_compute(compute, "translate", "고양이  한 마리") == ({"text": "a cat", "tokens": 12}, False)
+    # 공백이 다르거나 NFD 로 입력된 같은 문장은 같은 키입니다
+    assert cache.get_or_compute(compute, "translate", " 고양이 한\n마리 ")[1] is True
+    assert cache.get_or_compute(compute, "translate", "고양이 한 마리")[1] is True
+    assert cache.key("translate", "고양이") != cache.key("image", "고양이")
+
+    now[0] = 61
+    assert cache.get_or_compute(compute, "translate", "고양이 한 마리")[1] is False
+    assert len(calls) == 2
+    assert cache.local.stats["translate"] == {"hits": 2, "misses": 2}
+
+
+def test_concurrent_requests_compute_once():
+    cache = ResultCache()
+    calls = []
+    results = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"text": "a dog", "tokens": 9}
+
+    def worker():
+        results.append(cache.get_or_compute(compute, "translate", "강아지"))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(hit for _, hit in results) == [False, True, True, True]
@@ -0,0 +1,20 @@
+import pytest
+
+from scheduler import OpenAIScheduler
+
+
+@pytest.mark.parametrize("weight", [0, -1])
+def test_rejects_non_positive_weights(weight):
+    with pytest.raises(ValueError):
+        OpenAIScheduler(3500, 90000, 16, {"chat": 4, "image": weight})
+
+
+def test_release_settles_against_actual_tokens():
+    now = [0.0]
+    scheduler = OpenAIScheduler(60, 1000, 1, {"chat": 1}, clock=lambda: now[0])
+    slot = scheduler.acquire("chat", tokens=600, owner="U1")
+    slot.stream_opened()
+    assert (scheduler.running, scheduler.streaming) == (0, 1)
+    slot.release(100)
+    assert scheduler.streaming == 0
+    assert scheduler.tokens.level == 900
@@ -0,0 +1,35 @@
+from stream import StreamBuffer
+
+
+def test_flushes_on_interval_and_size_then_on_finish():
+    now = [0.0]
+    buffer = StreamBuffer(min_interval=1.0, min_chars=10, clock=lambda: now[0])
+
+    buffer.append("짧음")
+    # 첫 flush 라도 새 글자 수가 min_chars 보다 적으면 보내지 않습니다
+    assert buffer.poll() is None
+    buffer.append(" 응답이 길어지는 중입니다")
+    assert buffer.poll() == "짧음 응답이 길어지는 중입니다"
+
+    # 글자는 충분하지만 min_interval 이 지나지 않았습니다
+    now[0] = 0.5
+    buffer.append(" 다음 문장도 충분히 깁니다")
+    assert buffer.poll() is None
+    now[0] = 1.0
+    assert buffer.poll() == "짧음 응답이 길어지는 중입니다 다음 문장도 충분히 깁니다"
+
+    # 마지막 조각은 간격이나 크기와 상관없이 보내고, 새 내용이 없으면 다시 보내지 않습니다
+    now[0] = 1.1
+    buffer.append(".")
+    assert buffer.poll(finish=True).endswith("깁니다.")
+    assert buffer.poll(finish=True) is None
+    assert (buffer.flush_count, buffer.suppressed_count) == (3, 2)
+
+
+def test_whitespace_only_chunks_are_not_flushed():
+    buffer = StreamBuffer(min_interval=0, min_chars=1, clock=lambda: 0.0)
+
+    buffer.append("\n\n")
+    assert buffer.poll() is None
+    buffer.append("안녕")
+    assert buffer.poll() == "안녕"
@@ -0,0 +1,38 @@
+MODEL = "gpt-3.5-turbo-0301"
+
+
+def test_prompt_tokens_match_full_count_and_only_new_text_is_encoded(encoding):
+    import open_ai
+
+    system = {"role": "system", "content": "you are a helpful bot"}
+    context = {"messages": [{"role": "user", "content": "hello there"},
+                            {"role": "assistant", "content": "hi how can I help"}]}
+
+    # 토큰 수 없이 저장된 이전 포맷은 한 번만 계산해서 context 에 붙여둡니다
+    counts = open_ai.context_token_counts(context, MODEL)
+    assert counts == [4 + 1 + 2, 4 + 1 + 5]
+    assert open_ai.num_prompt_tokens(system, counts, MODEL) == \
+        open_ai.num_tokens_from_messages([system] + context["messages"], MODEL)
+
+    encoding.encoded.clear()
+    message = {"role": "user", "content": "tell me a joke"}
+    context["messages"].append(message)
+    context["tokens"].append(open_ai.num_tokens_from_message(message, MODEL))
+    assert open_ai.context_token_counts(context, MODEL) is context["tokens"]
+    open_ai.num_prompt_tokens(system, context["tokens"], MODEL)
+    # 새 턴에서는 새 메시지만 인코딩하고 시스템 메시지는 캐시된 값을 씁니다
+    assert encoding.encoded == ["user", "tell me a joke"]
+
+
+def test_completion_counter_prefers_usage_field(encoding):
+    import open_ai
+
+    counter = open_ai.CompletionTokenCounter(MODEL)
+    for content in ["Why did", " the chicken", None]:
+        delta = {} if content is None else {"content": content}
+        counter.feed({"choices": [{"delta": delta}]})
+    assert counter.completion_tokens == 4
+    assert counter.message_tokens == 4 + open_ai.num_tokens_from_message({"role": "assistant", "content": ""}, MODEL)
+
+    counter.feed({"choices": [{"delta": {}}], "usage": {"completion_tokens": 7}})
+    assert counter.completion_tokens == 7
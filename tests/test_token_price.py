@@ -0,0 +1,79 @@
+import time
+import datetime
+
+import pytest
+
+from benchmarks.fakes import FakeOpenAI
+from utils import now, date_to_str
+from views import total_usage_view
+
+PAST = ["2026-09-01", "2026-09-02", "2026-09-03"]
+
+
+@pytest.fixture
+def usage_server(monkeypatch, tmp_path):
+    today = date_to_str(now())
+    yesterday = date_to_str(now() - datetime.timedelta(days=1))
+    usage = {"2026-09-01": 100, "2026-09-02": 200, "2026-09-03": 300, today: 50, yesterday: 70}
+    with FakeOpenAI(usage=usage) as server:
+        import open_ai
+
+        monkeypatch.setitem(open_ai.CONFIG["OPENAI_USAGE"], "URL", f"{server.api_base}/usage")
+        monkeypatch.setitem(open_ai.CONFIG["OPENAI_USAGE"], "CACHE_FILE", str(tmp_path / "openai_usage.json"))
+        monkeypatch.setitem(open_ai.CONFIG["OPENAI_USAGE"], "RECENT_TTL", 60)
+        monkeypatch.setattr(open_ai, "_usage_cache", None)
+        monkeypatch.setattr(open_ai, "_usage_recent", {})
+        yield open_ai, server, today
+
+
+def test_past_days_come_from_disk_cache(usage_server):
+    open_ai, server, today = usage_server
+
+    assert open_ai.check_token_price(PAST)[0] == 600
+    # 재시작한 것처럼 메모리 캐시를 비워도 지난 날짜는 파일에서 읽습니다
+    open_ai._usage_cache = None
+    assert open_ai.check_token_price(PAST)[0] == 600
+    assert all(server.stats[f"usage:{date}"] == 1 for date in PAST)
+
+
+def test_today_is_refetched_after_ttl(usage_server, monkeypatch):
+    open_ai, server, today = usage_server
+    monkeypatch.setitem(open_ai.CONFIG["OPENAI_USAGE"], "RECENT_TTL", 0.2)
+
+    assert open_ai.check_token_price([today])[0] == 50
+    server.usage[today] = 80
+    assert open_ai.check_token_price([today])[0] == 50
+    assert server.stats[f"usage:{today}"] == 1
+
+    time.sleep(0.3)
+    assert open_ai.check_token_price([today])[0] == 80
+    assert server.stats[f"usage:{today}"] == 2
+
+
+def test_failed_day_does_not_poison_total(usage_server):
+    open_ai, server, today = usage_server
+    server.failing_dates.add("2026-09-02")
+
+    total_stats = open_ai.check_token_price(PAST)
+    assert total_stats[0] == 400
+    assert total_stats[2] == ["2026-09-02"]
+    # 합계가 모자란다는 것을 화면에도 알려줍니다
+    assert "2026-09-02" in str(total_usage_view(total_stats))
+    # 실패한 날은 캐시하지 않았으므로 복구되면 다시 조회합니다
+    server.failing_dates.clear()
+    assert open_ai.check_token_price(PAST) == (600, 600 * 0.0000027, [])
+    assert server.stats["usage:2026-09-01"] == 1
+    assert server.stats["usage:2026-09-02"] == 2
+
+
+def test_yesterday_is_not_frozen_after_midnight(usage_server, monkeypatch):
+    open_ai, server, today = usage_server
+    yesterday = date_to_str(now() - datetime.timedelta(days=1))
+    monkeypatch.setitem(open_ai.CONFIG["OPENAI_USAGE"], "RECENT_TTL", 0.2)
+
+    assert open_ai.check_token_price([yesterday])[0] == 70
+    # 어제 날짜는 디스크 캐시에 영구 저장하지 않고 TTL 이 지나면 다시 조회합니다
+    assert yesterday not in open_ai._load_usage_cache()
+    server.usage[yesterday] = 90
+    time.sleep(0.3)
+    assert open_ai.check_token_price([yesterday])[0] == 90
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from usage_engine import UsageEngine, log_columns
+
+RECORDS = [
+    ("2026-10-01", "U1", 100, 1.0),
+    ("2026-10-01", "U1", 50, 0.5),
+    ("2026-10-03", "U1", 30, 2.0),
+    ("2026-10-02", "U2", 400, 3.0),
+    ("2026-10-02", "U3", 10, 0.25),
+    # 기간 밖의 기록은 집계하지 않습니다
+    ("2026-09-30", "U3", 1000, 9.0),
+]
+
+
+@pytest.fixture
+def log(tmp_path):
+    log = tmp_path / "usage.log"
+    log.write_text("".join(json.dumps({"v": 2, "date": date, "user": user, "tokens": tokens,
+                                       "process_time": process_time}) + "\n"
+                           for date, user, tokens, process_time in RECORDS), encoding="utf-8")
+    return str(log)
+
+
+@pytest.fixture
+def frame(log):
+    return UsageEngine(files=lambda start, end: [log]).frame("2026-10-01", "2026-10-03")
+
+
+def test_log_columns_are_summed_per_user_and_day(log):
+    users, days, tokens, process_time, count = log_columns(log)
+
+    rows = sorted(zip(users.tolist(), days.tolist(), tokens.tolist(), process_time.tolist(), count.tolist()))
+    assert len(rows) == 5
+    assert rows[0][0] == "U1" and rows[0][2:] == (150, 1.5, 2)
+
+
+def test_group_by_user_and_day(frame):
+    tokens, process_time, count = frame.user_totals()
+
+    assert frame.users.tolist() == ["U1", "U2", "U3"]
+    assert tokens.tolist() == [180, 400, 10]
+    assert process_time.tolist() == [3.5, 3.0, 0.25]
+    assert count.tolist() == [3, 1, 1]
+    assert [x.tolist() for x in frame.day_totals()] == [[150, 410, 30], [1.5, 3.25, 2.0]]
+    assert frame.day_totals("U1")[0].tolist() == [150, 0, 30]
+    assert frame.total() == (590, 6.75)
+    assert frame.user_stats("U1") == ([{"date": "2026-10-01", "tokens": 150, "process_time": 1.5},
+                                       {"date": "2026-10-02", "tokens": 0, "process_time": 0.0},
+                                       {"date": "2026-10-03", "tokens": 30, "process_time": 2.0}], 180, 3.5)
+    assert frame.user_stats("U9") == ([], 0, 0)
+
+
+def test_percentiles_and_ranking(frame):
+    # 유저별 합계 [10, 180, 400] 의 선형 보간 백분위
+    assert frame.percentiles() == pytest.approx({50: 180, 90: 356, 99: 395.6})
+
+    assert [x["user_id"] for x in frame.rank_stats()] == ["U2", "U1", "U3"]
+    assert [x["user_id"] for x in frame.rank_stats(by="process_time")] == ["U1", "U2", "U3"]
+    page, total = frame.leaderboard(offset=1, count=2)
+    assert total == 3
+    assert [(x["rank"], x["user_id"], x["total_token"]) for x in page] == [(2, "U1", 180), (3, "U3", 10)]
+    assert frame.user_rank("U3") == (3, 10.0)
+    assert frame.user_rank("U9") == (None, 0)
+
+
+def test_empty_period(log):
+    frame = UsageEngine(files=lambda start, end: [log]).frame("2026-11-01", "2026-11-02")
+
+    assert frame.total() == (0, 0)
+    assert frame.percentiles() == {50: 0, 90: 0, 99: 0}
+    assert frame.leaderboard() == ([], 0)
@@ -0,0 +1,54 @@
+import time
+
+from context import LoggingManager
+from utils import now, date_to_str
+
+
+class FakeStream(list):
+    def close(self):
+        pass
+
+
+def chunk(content=None, finish_reason=None):
+    delta = {"content": content} if content else {}
+    return {"choices": [{"delta": delta, "finish_reason": finish_reason}]}
+
+
+def test_retried_turn_records_retries(monkeypatch):
+    import open_ai
+
+    attempts = []
+
+    def send(messages, **kwargs):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            time.sleep(0.05)
+            raise open_ai.StreamTimeout("first token deadline exceeded")
+        return FakeStream([chunk("hi"), chunk(finish_reason="stop")])
+
+    monkeypatch.setattr(open_ai, "send", send)
+    monkeypatch.setitem(open_ai.CONFIG["OPENAI_RETRY"], "BACKOFF_BASE", 0)
+
+    with LoggingManager("U1") as usage:
+        chunks = list(open_ai.stream_with_retry([{"role": "user", "content": "hi"}], prompt_tokens=10))
+    record = usage.record()
+
+    assert len(chunks) == 2
+    assert record["retries"] == 1
+    assert record["retry_time"] >= 0.05
+
+
+def test_record_omits_retries_without_retry():
+    with LoggingManager("U1") as usage:
+        pass
+    assert "retries" not in usage.record()
+    assert "retry_time" not in usage.record()
+
+
+def test_record_uses_utc_date_and_keeps_zero_latency():
+    with LoggingManager("U1") as usage:
+        usage.first_token_time = 0.0
+    record = usage.record()
+    assert record["date"] == date_to_str(now())
+    assert record["first_token_time"] == 0.0
+    assert "channel" not in record
@@ -0,0 +1,49 @@
+from window import ContextWindow
+
+SYSTEM = {"role": "system", "content": "you are a helpful bot"}
+# system 메시지 4 + 1 + 5 토큰 + reply priming 3
+FIXED = 13
+
+
+def context(tokens):
+    return {"messages": [{"role": "user", "content": f"m{i}"} for i in range(len(tokens))], "tokens": list(tokens)}
+
+
+def test_keeps_newest_messages_within_budget(encoding):
+    window = ContextWindow(budget=FIXED + 20, summarize=False, system_message=SYSTEM)
+    ctx = context([10, 8, 7, 6])
+
+    evicted = window.fit(ctx)
+
+    assert [m["content"] for m in evicted] == ["m0", "m1"]
+    assert [m["content"] for m in ctx["messages"]] == ["m2", "m3"]
+    assert ctx["tokens"] == [7, 6]
+    assert window.saved_tokens == 18
+    assert window.prompt_tokens(ctx) == FIXED + 13
+    assert window.messages(ctx) == [SYSTEM] + ctx["messages"]
+
+
+def test_newest_message_is_kept_even_over_budget(encoding):
+    window = ContextWindow(budget=FIXED + 20, summarize=False, system_message=SYSTEM)
+    ctx = context([5, 50])
+
+    assert len(window.fit(ctx)) == 1
+    assert ctx["tokens"] == [50]
+
+
+def test_summary_counts_against_budget_and_savings(encoding):
+    window = ContextWindow(budget=FIXED + 20, summarize=True, system_message=SYSTEM)
+    ctx = context([10, 8, 7, 6])
+    window.fit(ctx)
+
+    window.fold(ctx, "인사를 나눔")
+
+    # 요약 메시지: 4 + role 1 + "이전 대화 요약: 인사를 나눔" 5 토큰
+    assert ctx["summary"]["tokens"] == 10
+    assert window.saved_tokens == 18 - 10
+    assert window.messages(ctx)[1] == {"role": "system", "content": "이전 대화 요약: 인사를 나눔"}
+    # 요약 없이는 7 + 6 + 5 가 예산 20 안에 들어가지만, 요약이 10 토큰을 차지하므로 최신 메시지만 남습니다
+    ctx["messages"].append({"role": "user", "content": "m4"})
+    ctx["tokens"].append(5)
+    assert [m["content"] for m in window.fit(ctx)] == ["m2", "m3"]
+    assert ctx["tokens"] == [5]
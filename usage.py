@@ -0,0 +1,148 @@
+import redis
+from utils import now, date_to_str, current_year_month
+
+
+class UsageRollup:
+    # 요청 시점에 사용자/일자별 사용량을 Redis hash 에 누적합니다.
+    # usage:day:{YYYY-MM-DD} 해시에 "{user_id}:tokens", "{user_id}:process_time", "{user_id}:count" 필드를 둡니다.
+    # 로그 파일은 감사용으로만 남고, 통계 조회는 이 카운터로 처리합니다.
+    # 월별 순위는 usage:rank:{YYYYMM}:tokens / :process_time sorted set 으로 따로 유지합니다.
+    def __init__(self, host, port, db, prefix="usage:day", rank_prefix="usage:rank", rank_expire=86400 * 62):
+        self.rd = redis.StrictRedis(host=host, port=port, db=db)
+        self.prefix = prefix
+        self.rank_prefix = rank_prefix
+        self.rank_expire = rank_expire
+
+    def _key(self, date):
+        return f"{self.prefix}:{date}"
+
+    def _rank_key(self, month, by="tokens"):
+        return f"{self.rank_prefix}:{month}:{by}"
+
+    def record(self, usage):
+        self.add(usage.user_id, usage.tokens, usage.process_time)
+
+    def add(self, user_id, tokens, process_time, count=1, date=None):
+        date = date or date_to_str(now())
+        month = date[:7].replace('-', '')
+        key = self._key(date)
+        pipe = self.rd.pipeline(transaction=False)
+        pipe.hincrby(key, f"{user_id}:tokens", tokens)
+        pipe.hincrbyfloat(key, f"{user_id}:process_time", process_time)
+        pipe.hincrby(key, f"{user_id}:count", count)
+        pipe.zincrby(self._rank_key(month, "tokens"), tokens, user_id)
+        pipe.zincrby(self._rank_key(month, "process_time"), process_time, user_id)
+        pipe.expire(self._rank_key(month, "tokens"), self.rank_expire)
+        pipe.expire(self._rank_key(month, "process_time"), self.rank_expire)
+        pipe.execute()
+
+    def days(self, dates):
+        """Returns {date: {user_id: {"tokens", "process_time", "count"}}} with one round trip."""
+        pipe = self.rd.pipeline(transaction=False)
+        for date in dates:
+            pipe.hgetall(self._key(date))
+        result = {}
+        for date, fields in zip(dates, pipe.execute()):
+            users = {}
+            for field, value in fields.items():
+                user_id, name = field.decode('utf-8').rsplit(':', 1)
+                stat = users.setdefault(user_id, {"tokens": 0, "process_time": 0, "count": 0})
+                stat[name] = float(value) if name == "process_time" else int(value)
+            result[date] = users
+        return result
+
+    def user_stats(self, user_id, dates):
+        days = self.days(dates)
+        if not any(user_id in users for users in days.values()):
+            return [], 0, 0
+
+        user_date_list = []
+        for date in dates:
+            stat = days[date].get(user_id, {"tokens": 0, "process_time": 0})
+            user_date_list.append({
+                "date": date,
+                "tokens": stat["tokens"],
+                "process_time": round(stat["process_time"], 2),
+            })
+        user_total_token = sum([x['tokens'] for x in user_date_list])
+        user_total_process_time = sum([x['process_time'] for x in user_date_list])
+        return user_date_list, user_total_token, user_total_process_time
+
+    def rank_stats(self, dates):
+        totals = {}
+        for users in self.days(dates).values():
+            for user_id, stat in users.items():
+                total = totals.setdefault(user_id, {"user_id": user_id, "total_token": 0, "total_process_time": 0})
+                total["total_token"] += stat["tokens"]
+                total["total_process_time"] += round(stat["process_time"], 2)
+        new_list = list(totals.values())
+        new_list.sort(key=lambda x: x['total_token'], reverse=True)
+        return new_list
+
+    def leaderboard(self, offset=0, count=10, by="tokens", month=None):
+        """Returns (page, total) for the month's ranking, ordered by `by` descending."""
+        month = month or current_year_month()
+        other = "process_time" if by == "tokens" else "tokens"
+        pipe = self.rd.pipeline(transaction=False)
+        pipe.zrevrange(self._rank_key(month, by), offset, offset + count - 1, withscores=True)
+        pipe.zcard(self._rank_key(month, by))
+        entries, total = pipe.execute()
+
+        pipe = self.rd.pipeline(transaction=False)
+        for user_id, _ in entries:
+            pipe.zscore(self._rank_key(month, other), user_id)
+        others = pipe.execute() if entries else []
+
+        page = []
+        for rank, ((user_id, score), other_score) in enumerate(zip(entries, others), start=offset + 1):
+            scores = {by: score, other: other_score or 0}
+            page.append({
+                "rank": rank,
+                "user_id": user_id.decode('utf-8'),
+                "total_token": int(scores["tokens"]),
+                "total_process_time": round(scores["process_time"], 2),
+            })
+        return page, total
+
+    def user_rank(self, user_id, by="tokens", month=None):
+        """Returns (rank, score) of the user in the month's ranking, or (None, 0) without usage."""
+        month = month or current_year_month()
+        pipe = self.rd.pipeline(transaction=False)
+        pipe.zrevrank(self._rank_key(month, by), user_id)
+        pipe.zscore(self._rank_key(month, by), user_id)
+        rank, score = pipe.execute()
+        if rank is None:
+            return None, 0
+        return rank + 1, score
+
+    def rebuild(self, logs):
+        # 로그 파일(감사 기록)에서 카운터를 다시 만듭니다. logs 는 extract_logs.parse_logs 의 결과입니다.
+        days = {}
+        ranks = {}
+        for log in logs:
+            month = log['timestamp'][:7].replace('-', '')
+            for by in ("tokens", "process_time"):
+                scores = ranks.setdefault(self._rank_key(month, by), {})
+                scores[log['id']] = scores.get(log['id'], 0) + log[by]
+            fields = days.setdefault(log['timestamp'], {})
+            fields[f"{log['id']}:tokens"] = fields.get(f"{log['id']}:tokens", 0) + log['tokens']
+            fields[f"{log['id']}:process_time"] = fields.get(f"{log['id']}:process_time", 0) + log['process_time']
+            fields[f"{log['id']}:count"] = fields.get(f"{log['id']}:count", 0) + 1
+        pipe = self.rd.pipeline(transaction=True)
+        for date, fields in days.items():
+            pipe.delete(self._key(date))
+            pipe.hset(self._key(date), mapping=fields)
+        for key, scores in ranks.items():
+            pipe.delete(key)
+            pipe.zadd(key, scores)
+            pipe.expire(key, self.rank_expire)
+        pipe.execute()
+
+
+if __name__ == "__main__":
+    # python usage.py : 이번 달 로그로 카운터를 다시 만듭니다
+    from config import CONFIG
+    from extract_logs import log_files, parse_logs
+
+    rollup = UsageRollup(host=CONFIG['REDIS']['HOST'], port=CONFIG['REDIS']['PORT'], db=CONFIG['REDIS']['USAGE_DB'])
+    rollup.rebuild(parse_logs(log_files()))
@@ -0,0 +1,272 @@
+import os
+import glob
+import mmap
+import struct
+import threading
+
+import numpy as np
+
+from config import CONFIG
+from extract_logs import log_files_between, parse_logs, user_stats
+from utils import date_range, usage_range
+
+# rollup 파일 (compaction.py 가 rotate 된 로그마다 하나씩 만듭니다): 헤더 뒤에 유저 id 순으로 정렬된 고정 길이 레코드
+# 헤더 = magic, 버전, 레코드 크기, 레코드 수, 원본 로그 크기 (검증용)
+ROLLUP_MAGIC = b"USGR"
+ROLLUP_VERSION = 1
+ROLLUP_HEADER = struct.Struct("<4sHHIQ")
+ROLLUP_DTYPE = np.dtype([("user", "S24"), ("day", "<i4"), ("tokens", "<i8"), ("process_time", "<f8"),
+                         ("count", "<i8")])
+
+
+def _day_numbers(dates):
+    # "YYYY-MM-DD" -> 1970-01-01 부터의 일 수
+    return np.array(dates, dtype="datetime64[D]").astype(np.int64)
+
+
+def _group(users, days, tokens, process_time, count):
+    """Sums the columns per (user, day) pair. users is a str array, the others are aligned numeric arrays."""
+    if not len(users):
+        return users, days, tokens, process_time, count
+    names, user_index = np.unique(users, return_inverse=True)
+    first = days.min()
+    span = days.max() - first + 1
+    keys, inverse = np.unique(user_index * span + (days - first), return_inverse=True)
+    return (names[keys // span], keys % span + first,
+            np.bincount(inverse, weights=tokens, minlength=len(keys)).astype(np.int64),
+            np.bincount(inverse, weights=process_time, minlength=len(keys)),
+            np.bincount(inverse, weights=count, minlength=len(keys)).astype(np.int64))
+
+
+def rollup_path(file):
+    return os.path.join(CONFIG["USAGE_ROLLUP"]["DIR"], os.path.basename(file) + ".rollup")
+
+
+def rollup_files_between(start, end):
+    # usage.log.YYYYMMDD.rollup 처럼 원본 파일 이름을 그대로 쓰므로 log_files_between 과 같은 기준으로 고릅니다
+    first, last = start.replace('-', ''), end.replace('-', '')
+    files = []
+    for file in glob.glob(os.path.join(CONFIG["USAGE_ROLLUP"]["DIR"], "usage*.log.*.rollup")):
+        if first <= file[:-len(".rollup")].rsplit('.', 1)[-1][:8] <= last:
+            files.append(file)
+    return files
+
+
+def usage_sources(start, end):
+    # rollup 이 있는 날짜는 텍스트 대신 rollup 을 읽습니다 (원본은 감사용으로만 남습니다)
+    rollups = rollup_files_between(start, end)
+    compacted = {os.path.basename(file)[:-len(".rollup")] for file in rollups}
+    return [file for file in log_files_between(start, end) if os.path.basename(file) not in compacted] + rollups
+
+
+def rollup_records(columns):
+    """Packs (users, days, tokens, process_time, count) columns into ROLLUP_DTYPE records sorted by user and day."""
+    users, days, tokens, process_time, count = columns
+    encoded = np.char.encode(users.astype(str), 'utf-8')
+    if len(encoded) and max(len(user) for user in encoded) > ROLLUP_DTYPE["user"].itemsize:
+        raise ValueError(f"User id longer than {ROLLUP_DTYPE['user'].itemsize} bytes")
+    records = np.empty(len(users), dtype=ROLLUP_DTYPE)
+    records["user"] = encoded
+    records["day"] = days
+    records["tokens"] = tokens
+    records["process_time"] = process_time
+    records["count"] = count
+    records.sort(order=("user", "day"))
+    return records
+
+
+def write_rollup(path, columns, source_size):
+    records = rollup_records(columns)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 쓰는 도중에 읽히지 않도록 (워커마다 다른) 임시 파일에 쓴 뒤 바꿔치기합니다
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(ROLLUP_HEADER.pack(ROLLUP_MAGIC, ROLLUP_VERSION, ROLLUP_DTYPE.itemsize, len(records), source_size))
+        f.write(records.tobytes())
+    os.replace(tmp, path)
+
+
+def read_rollup(path):
+    """Returns (source_size, records) where records is a read-only ROLLUP_DTYPE array backed by mmap."""
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(buffer) < ROLLUP_HEADER.size:
+        raise ValueError(f"Truncated rollup file: {path}")
+    magic, version, record_size, count, source_size = ROLLUP_HEADER.unpack_from(buffer)
+    if magic != ROLLUP_MAGIC or version != ROLLUP_VERSION or record_size != ROLLUP_DTYPE.itemsize:
+        raise ValueError(f"Unsupported rollup file: {path}")
+    if len(buffer) != ROLLUP_HEADER.size + count * record_size:
+        raise ValueError(f"Truncated rollup file: {path}")
+    return source_size, np.frombuffer(buffer, dtype=ROLLUP_DTYPE, count=count, offset=ROLLUP_HEADER.size)
+
+
+def rollup_columns(path):
+    records = read_rollup(path)[1]
+    return (np.char.decode(records["user"], 'utf-8') if len(records) else np.array([], dtype=str),
+            records["day"].astype(np.int64), records["tokens"].copy(), records["process_time"].copy(),
+            records["count"].copy())
+
+
+def log_columns(file):
+    """Parses a usage log into (users, days, tokens, process_time, count) columns summed per (user, day)."""
+    logs = parse_logs([file])
+    return _group(np.array([log['id'] for log in logs], dtype=str),
+                  _day_numbers([log['timestamp'] for log in logs]),
+                  np.array([log['tokens'] for log in logs], dtype=np.int64),
+                  np.array([log['process_time'] for log in logs], dtype=np.float64),
+                  np.ones(len(logs), dtype=np.int64))
+
+
+class UsageFrame:
+    # 한 기간의 사용량 열(column)들. 유저는 users 배열의 인덱스, 날짜는 start 부터의 일 수로 저장합니다.
+    # UsageRollup 과 같은 형태로 결과를 돌려주므로 화면 코드는 둘 중 어느 쪽이든 그대로 씁니다.
+    def __init__(self, start, end, users, days, tokens, process_time, count):
+        self.start = start
+        self.end = end
+        self.dates = date_range(start, end)
+        first = _day_numbers([start])[0]
+        mask = (days >= first) & (days < first + len(self.dates))
+        self.users, self.user_index = np.unique(users[mask], return_inverse=True)
+        self.day_index = (days[mask] - first).astype(np.int64)
+        self.tokens = tokens[mask]
+        self.process_time = process_time[mask]
+        self.count = count[mask]
+
+    def user_totals(self):
+        """Returns (tokens, process_time, count) arrays aligned with self.users."""
+        n = len(self.users)
+        return (np.bincount(self.user_index, weights=self.tokens, minlength=n).astype(np.int64),
+                np.bincount(self.user_index, weights=self.process_time, minlength=n),
+                np.bincount(self.user_index, weights=self.count, minlength=n).astype(np.int64))
+
+    def day_totals(self, user_id=None):
+        """Returns (tokens, process_time) arrays with one entry per date, for one user or everyone."""
+        mask = slice(None)
+        if user_id is not None:
+            mask = self.user_index == self._index(user_id)
+        n = len(self.dates)
+        return (np.bincount(self.day_index[mask], weights=self.tokens[mask], minlength=n).astype(np.int64),
+                np.bincount(self.day_index[mask], weights=self.process_time[mask], minlength=n))
+
+    def total(self):
+        return int(self.tokens.sum()), round(float(self.process_time.sum()), 2)
+
+    def percentiles(self, q=(50, 90, 99)):
+        """Returns {q: tokens} percentiles of per-user token totals."""
+        tokens = self.user_totals()[0]
+        if not len(tokens):
+            return {p: 0 for p in q}
+        return dict(zip(q, np.percentile(tokens, q).tolist()))
+
+    def _index(self, user_id):
+        index = np.searchsorted(self.users, user_id)
+        if index < len(self.users) and self.users[index] == user_id:
+            return index
+        return -1
+
+    def _order(self, by="tokens"):
+        tokens, process_time, _ = self.user_totals()
+        scores = tokens if by == "tokens" else process_time
+        # 점수가 같으면 유저 id 순서로 고정합니다
+        return np.argsort(-scores, kind="stable"), tokens, process_time
+
+    def user_stats(self, user_id):
+        if self._index(user_id) < 0:
+            return [], 0, 0
+        tokens, process_time = self.day_totals(user_id)
+        user_date_list = [{"date": date, "tokens": int(t), "process_time": round(float(p), 2)}
+                          for date, t, p in zip(self.dates, tokens, process_time)]
+        return user_date_list, int(tokens.sum()), sum(x['process_time'] for x in user_date_list)
+
+    def rank_stats(self, by="tokens"):
+        order, tokens, process_time = self._order(by)
+        return [{
+            "user_id": str(self.users[i]),
+            "total_token": int(tokens[i]),
+            "total_process_time": round(float(process_time[i]), 2),
+        } for i in order]
+
+    def leaderboard(self, offset=0, count=10, by="tokens"):
+        """Returns (page, total) like UsageRollup.leaderboard, for this frame's period."""
+        order, tokens, process_time = self._order(by)
+        page = [{
+            "rank": rank,
+            "user_id": str(self.users[i]),
+            "total_token": int(tokens[i]),
+            "total_process_time": round(float(process_time[i]), 2),
+        } for rank, i in enumerate(order[offset:offset + count], start=offset + 1)]
+        return page, len(self.users)
+
+    def user_rank(self, user_id, by="tokens"):
+        """Returns (rank, score) like UsageRollup.user_rank, or (None, 0) without usage in the period."""
+        index = self._index(user_id)
+        if index < 0:
+            return None, 0
+        order, tokens, process_time = self._order(by)
+        rank = int(np.flatnonzero(order == index)[0]) + 1
+        return rank, float((tokens if by == "tokens" else process_time)[index])
+
+
+class UsageEngine:
+    # 사용량 로그를 열 단위 NumPy 배열로 읽어 기간별 집계를 벡터 연산으로 계산합니다.
+    # 파일마다 (유저, 날짜) 별 합계로 줄여서 캐시하고, rotate 된 파일은 바뀌지 않으므로 한 번만 파싱합니다.
+    # 지금 쓰고 있는 usage.log 는 크기나 수정 시각이 바뀔 때만 다시 읽고, rollup 이 있는 날짜는 텍스트를 파싱하지 않습니다.
+    def __init__(self, files=usage_sources):
+        self.files = files
+        self._columns = {}  # path -> ((st_ino, st_size, st_mtime_ns), columns)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _parse(file):
+        if file.endswith(".rollup"):
+            return rollup_columns(file)
+        return log_columns(file)
+
+    def _file_columns(self, file):
+        try:
+            st = os.stat(file)
+        except FileNotFoundError:
+            with self._lock:
+                self._columns.pop(file, None)
+            return None
+        key = (st.st_ino, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            cached = self._columns.get(file)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        columns = self._parse(file)
+        with self._lock:
+            self._columns[file] = (key, columns)
+        return columns
+
+    def frame(self, start, end):
+        """Returns a UsageFrame of every usage record dated start..end (inclusive, "YYYY-MM-DD")."""
+        parts = [c for c in (self._file_columns(file) for file in self.files(start, end)) if c is not None]
+        if parts:
+            # 여러 파일(워커별 로그 등)에 같은 (유저, 날짜) 가 있어도 UsageFrame 의 bincount 가 합칩니다
+            columns = [np.concatenate(column) for column in zip(*parts)]
+        else:
+            columns = (np.array([], dtype=str), np.array([], dtype=np.int64), np.array([], dtype=np.int64),
+                       np.array([], dtype=np.float64), np.array([], dtype=np.int64))
+        return UsageFrame(start, end, *columns)
+
+
+_engine = UsageEngine()
+
+
+def usage_frame(start, end):
+    return _engine.frame(start, end)
+
+
+def range_user_stats(user_id, range_name, rollup=None):
+    # 이번 달은 기존 경로(rollup 카운터나 증분 파서)로, 다른 기간은 로그를 열 단위로 집계해서 조회합니다
+    if range_name == "this_month":
+        return user_stats(user_id, rollup)
+    return usage_frame(*usage_range(range_name)).user_stats(user_id)
+
+
+def range_leaderboard(user_id, range_name, offset, count, rollup=None):
+    """Returns (page, total, my_rank) of the period's ranking, from rollup's sorted sets for this month."""
+    source = rollup if range_name == "this_month" and rollup is not None else usage_frame(*usage_range(range_name))
+    page, total = source.leaderboard(offset, count)
+    return page, total, source.user_rank(user_id)
@@ -25,6 +25,45 @@ def current_month_range():
     return days_of_month
 
 
+def date_range(start, end):
+    # start ~ end (포함) 날짜 문자열 목록
+    start, end = str_to_date(start), str_to_date(end)
+    return [date_to_str(start + datetime.timedelta(days=x)) for x in range((end - start).days + 1)]
+
+
+# 사용량 화면에서 고를 수 있는 기간 (이름: 표시 문구)
+USAGE_RANGES = {
+    "this_month": "이번 달",
+    "last_7_days": "최근 7일",
+    "last_month": "지난 달",
+    "quarter_to_date": "이번 분기",
+}
+
+
+def usage_range(name):
+    """Returns (start, end) date strings of a USAGE_RANGES period, ending today except for last_month."""
+    today = now().date()
+    if name == "last_7_days":
+        start, end = today - datetime.timedelta(days=6), today
+    elif name == "last_month":
+        end = today.replace(day=1) - datetime.timedelta(days=1)
+        start = end.replace(day=1)
+    elif name == "quarter_to_date":
+        start, end = today.replace(month=(today.month - 1) // 3 * 3 + 1, day=1), today
+    else:
+        start, end = today.replace(day=1), today
+    return date_to_str(start), date_to_str(end)
+
+
+def retry_after(error, default=1, limit=10):
+    # Slack API 오류 (429) 의 Retry-After 헤더 초. 헤더 이름의 대소문자는 HTTP 클라이언트마다 다릅니다
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for name, value in headers.items():
+        if name.lower() == "retry-after":
+            return min(float(value), limit)
+    return default
+
+
 def create_ascii_table(headers, table_data):
     table = []
     table.append("+")
@@ -0,0 +1,404 @@
+import json
+import hashlib
+from config import WATING_MESSAGE
+from utils import USAGE_RANGES
+
+
+def view_digest(view):
+    # views_publish 를 생략할지 판단하기 위한 view 해시
+    return hashlib.sha256(json.dumps(view, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def usage_range_select(action_id, range_name="this_month"):
+    # 사용량 기간 선택 메뉴 (utils.USAGE_RANGES)
+    options = [{"text": {"type": "plain_text", "text": label}, "value": name} for name, label in USAGE_RANGES.items()]
+    return {
+        "type": "static_select",
+        "action_id": action_id,
+        "options": options,
+        "initial_option": next(option for option in options if option["value"] == range_name),
+    }
+
+
+def selected_usage_range(view, action_id="usage_range"):
+    # 모달의 기간 선택 값 (선택 메뉴가 없거나 고르지 않았으면 private_metadata, 그것도 없으면 이번 달)
+    for block in view.get("state", {}).get("values", {}).values():
+        selected = (block.get(action_id) or {}).get("selected_option")
+        if selected:
+            return selected["value"]
+    return view.get("private_metadata") or "this_month"
+
+
+def home_view(user_id, user_table, user_total_token, user_total_process_time, range_name="this_month"):
+    # App Home 화면 구성
+    blocks = [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"안녕하세요 <@{user_id}>님! 사용 가능한 명령어 목록입니다 :smile:"
+            },
+            "accessory": {
+                "type": "image",
+                "image_url": "https://pbs.twimg.com/profile_images/625633822235693056/lNGUneLX_400x400.jpg",
+                "alt_text": "cute cat"
+            }
+        },
+        {
+            "type": "divider"
+        },
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": """ `/대화시작` :  대화를 시작합니다. (_채널에서 사용가능_) \n\n `/대화끝` :  대화를 종료합니다. (_채널에서 사용가능_) \n\n `/대화초기화` :  대화를 처음부터 다시 시작합니다. (_채널에서 사용가능_) """
+            }
+        },
+        {
+            "type": "divider"
+        },
+        {
+            "type": "actions",
+            "elements": [usage_range_select("home_usage_range", range_name)]
+        },
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"• {USAGE_RANGES[range_name]} : 예상 `{user_total_token * 0.0000027}$` (`{user_total_token}토큰`), `{round(user_total_process_time, 2)}초`"
+            }
+        },
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"```{user_table}```"
+            }
+        }
+    ]
+    return {
+        "type": "home",
+        "blocks": blocks
+    }
+
+
+def usage_menu_view(user_id, range_name="this_month"):
+    return {
+        "type": "modal",
+        "close": {
+            "type": "plain_text",
+            "text": "닫기",
+        },
+        "title": {
+            "type": "plain_text",
+            "text": "사용량 확인",
+        },
+        "blocks": [
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"*안녕하세요 <@{user_id}>님!* 원하시는 메뉴를 골라주세요"
+                }
+            },
+            {
+                "type": "divider"
+            },
+            {
+                "type": "actions",
+                "elements": [usage_range_select("usage_range", range_name)]
+            },
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": ":dollar: *전체 사용량*\n선택한 기간의 총 사용량을 확인합니다"
+                },
+                "accessory": {
+                    "type": "button",
+                    "text": {
+                        "type": "plain_text",
+                        "text": "선택",
+                        "emoji": True
+                    },
+                    "style": "primary",
+                    "action_id": "total_usage"
+                }
+            },
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": ":bar_chart: *사용량 순위*\n전체 유저의 사용량 순위를 확인합니다"
+                },
+                "accessory": {
+                    "type": "button",
+                    "text": {
+                        "type": "plain_text",
+                        "text": "선택",
+                        "emoji": True
+                    },
+                    "style": "primary",
+                    "action_id": "rank_usage"
+                }
+            }
+        ]
+    }
+
+
+def draw_image_view(user_id):
+    return {
+        "type": "modal",
+        "callback_id": "draw_image",
+        "title": {
+            "type": "plain_text",
+            "text": "달리 선생님의 미술 교실"
+        },
+        "submit": {
+            "type": "plain_text",
+            "text": "그리기"
+        },
+        "close": {
+            "type": "plain_text",
+            "text": "닫기"
+        },
+        "blocks": [
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"*안녕하세요 <@{user_id}>님!* 원하시는 그림이 있으신가요?"
+                }
+            },
+            {
+                "type": "divider"
+            },
+            {
+                "type": "input",
+                "block_id": "input_check",
+                "label": {
+                    "type": "plain_text",
+                    "text": "원하시는 기능을 선택해주세요:sparkles:",
+                    "emoji": True
+                },
+                "element": {
+                    "type": "checkboxes",
+                    "options": [
+                        {
+                            "text": {
+                                "type": "mrkdwn",
+                                "text": "*번역 기능*"
+                            },
+                            "description": {
+                                "type": "mrkdwn",
+                                "text": "한글로 작성하신 경우 체크해주세요\n(체크 시 토큰이 추가적으로 사용됩니다.)"
+                            },
+                        }
+                    ],
+                    "action_id": "is_translate",
+                },
+                "optional": True
+            },
+            {
+                "type": "divider"
+            },
+            {
+                "type": "input",
+                "block_id": "input_text",
+                "label": {
+                    "type": "plain_text",
+                    "text": "원하시는 그림에 대해서 설명해주세요:pray:",
+                    "emoji": True
+                },
+                "element": {
+                    "type": "plain_text_input",
+                    "action_id": "image_description",
+                    "multiline": True
+                }
+            }
+        ]
+    }
+
+
+def image_result_blocks(description, image_url):
+    return [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"*{description}*"
+            }
+        },
+        {
+            "type": "image",
+            "title": {
+                "type": "plain_text",
+                "text": "그림",
+                "emoji": True
+            },
+            "image_url": image_url,
+            "alt_text": "marg"
+        }
+    ]
+
+
+def waiting_view():
+    return {
+        "type": "modal",
+        "title": {
+            "type": "plain_text",
+            "text": "잠시만 기다려주세요",
+        },
+        "blocks": [
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": WATING_MESSAGE
+                }
+            }
+        ]
+    }
+
+
+def total_usage_view(total_stats, range_name="this_month"):
+    blocks = [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"*{USAGE_RANGES[range_name]} 총 사용량입니다.*"
+            }
+        },
+        {
+            "type": "context",
+            "elements": [
+                {
+                    "type": "plain_text",
+                    "emoji": True,
+                    "text": f"요금 - {total_stats[1]}$ (토큰 :{total_stats[0]}개)"
+                }
+            ]
+        },
+    ]
+    if total_stats[2]:
+        # 조회에 실패한 날짜는 합계에서 빠져 있으므로 함께 알려줍니다
+        blocks.append({
+            "type": "context",
+            "elements": [
+                {
+                    "type": "mrkdwn",
+                    "text": f":warning: {', '.join(total_stats[2])} 사용량을 가져오지 못해 합계에서 빠졌습니다."
+                }
+            ]
+        })
+    return {
+        "type": "modal",
+        "close": {
+            "type": "plain_text",
+            "text": "닫기",
+        },
+        "title": {
+            "type": "plain_text",
+            "text": "전체 사용량 확인",
+        },
+        "blocks": blocks
+    }
+
+
+def rank_usage_view(user_stat_list, offset=0, total=None, my_rank=None, page_size=None, range_name="this_month"):
+    number_to_word = ["one", "two", "three", "four", "five", "six", "seven", "eight", "nine"]
+
+    blocks = [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"*{USAGE_RANGES[range_name]} 사용량 순위입니다.*"
+            }
+        }
+    ]
+    if my_rank is not None:
+        rank, score = my_rank
+        blocks.append({
+            "type": "context",
+            "elements": [
+                {
+                    "type": "mrkdwn",
+                    "text": f"내 순위 - {rank}위 (토큰 : {int(score)}개)" if rank is not None else f"내 순위 - {USAGE_RANGES[range_name]} 사용 기록이 없습니다"
+                }
+            ]
+        })
+
+    for i, user_stat in enumerate(user_stat_list):
+        # 페이지가 넘어가도 전체 순위 기준으로 번호를 붙입니다
+        rank = user_stat.get("rank", offset + i + 1)
+        try:
+            title = f":{number_to_word[rank - 1]}: *<@{user_stat['user_id']}>님 사용량*\n"
+        except IndexError:
+            title = f":keycap_star: *{rank}위 <@{user_stat['user_id']}>님 사용량*\n"
+        blocks += [
+            {
+                "type": "divider"
+            },
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": title
+                },
+            },
+            {
+                "type": "context",
+                "elements": [
+                    {
+                        "type": "plain_text",
+                        "emoji": True,
+                        "text": f"요금 - {round(user_stat['total_token'] * 0.0000027, 4)}$ (토큰 : {user_stat['total_token']}개), 사용 시간 - {user_stat['total_process_time']}초"
+                    }
+                ]
+            }
+        ]
+
+    # 페이지 이동 버튼 (value 에 이동할 offset 을 담습니다)
+    if total is not None and page_size:
+        buttons = []
+        if offset > 0:
+            buttons.append({
+                "type": "button",
+                "text": {"type": "plain_text", "text": "이전", "emoji": True},
+                "value": str(max(offset - page_size, 0)),
+                "action_id": "rank_usage_prev"
+            })
+        if offset + page_size < total:
+            buttons.append({
+                "type": "button",
+                "text": {"type": "plain_text", "text": "다음", "emoji": True},
+                "value": str(offset + page_size),
+                "action_id": "rank_usage_next"
+            })
+        if buttons:
+            blocks += [
+                {
+                    "type": "divider"
+                },
+                {
+                    "type": "actions",
+                    "elements": buttons
+                }
+            ]
+
+    return {
+        "type": "modal",
+        "close": {
+            "type": "plain_text",
+            "text": "닫기",
+        },
+        "title": {
+            "type": "plain_text",
+            "text": "사용량 순위 확인",
+        },
+        # 페이지를 넘길 때 같은 기간으로 다시 조회합니다
+        "private_metadata": range_name,
+        "blocks": blocks
+    }
@@ -0,0 +1,59 @@
+from config import CONFIG, SYSTEM_MESSAGE
+from open_ai import num_tokens_from_message, num_prompt_tokens, context_token_counts
+
+
+class ContextWindow:
+    # 모델별 프롬프트 토큰 예산 안에 들어가는 최신 메시지만 남기는 슬라이딩 윈도우입니다.
+    # SYSTEM_MESSAGE(와 요약)는 항상 유지되며, 밀려난 메시지는 선택적으로 요약(context["summary"])에 합쳐집니다.
+    def __init__(self, model="gpt-3.5-turbo-0301", budget=None, summarize=None, system_message=SYSTEM_MESSAGE):
+        self.model = model
+        self.budget = CONFIG["CONTEXT"]["TOKEN_BUDGET"].get(model, 2000) if budget is None else budget
+        self.summarize = CONFIG["CONTEXT"]["SUMMARY"] if summarize is None else summarize
+        self.system_message = system_message
+        self.saved_tokens = 0
+
+    def _summary_message(self, context):
+        summary = context.get("summary")
+        if not summary:
+            return None
+        return {"role": "system", "content": f"이전 대화 요약: {summary['content']}"}
+
+    def _fixed_tokens(self, context):
+        # system 메시지 + 요약 + reply priming
+        summary = context.get("summary")
+        summary_tokens = summary["tokens"] if summary else 0
+        return num_prompt_tokens(self.system_message, [summary_tokens], self.model)
+
+    def fit(self, context):
+        """Drops the oldest messages that do not fit the budget and returns them (newest message is always kept)."""
+        messages = context["messages"]
+        tokens = context_token_counts(context, self.model)
+        available = self.budget - self._fixed_tokens(context)
+
+        # 뒤에서부터 예산을 채우고, 잘라낼 위치를 한 번에 계산합니다
+        cut = len(messages) - 1
+        used = tokens[cut] if tokens else 0
+        while cut > 0 and used + tokens[cut - 1] <= available:
+            cut -= 1
+            used += tokens[cut]
+
+        evicted = messages[:cut]
+        self.saved_tokens = sum(tokens[:cut])
+        context["messages"] = messages[cut:]
+        context["tokens"] = tokens[cut:]
+        return evicted
+
+    def fold(self, context, summary):
+        # 요약 결과를 context 에 저장합니다 (늘어난 요약 토큰만큼 절감량에서 제외)
+        previous_tokens = context["summary"]["tokens"] if context.get("summary") else 0
+        context["summary"] = {"content": summary, "tokens": 0}
+        context["summary"]["tokens"] = num_tokens_from_message(self._summary_message(context), self.model)
+        self.saved_tokens = max(self.saved_tokens - (context["summary"]["tokens"] - previous_tokens), 0)
+
+    def messages(self, context):
+        summary_message = self._summary_message(context)
+        head = [self.system_message] if summary_message is None else [self.system_message, summary_message]
+        return head + context["messages"]
+
+    def prompt_tokens(self, context):
+        return self._fixed_tokens(context) + sum(context_token_counts(context, self.model))